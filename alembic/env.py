@@ -27,6 +27,7 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 import models.pipeline_test_model
+import models.pipeline_log_model
 import models.repo_model
 import models.user_model
 
@@ -0,0 +1,44 @@
+"""Add pipeline_log_chunks
+
+Revision ID: 3c1f9a7d2b41
+Revises: efdd7634257c
+Create Date: 2026-10-17 10:12:31.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f9a7d2b41'
+down_revision: Union[str, None] = 'efdd7634257c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('pipeline_log_chunks',
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('start_offset', sa.BigInteger(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['pipeline_runs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('run_id', 'seq')
+    )
+    op.create_index('ix_pipeline_log_chunks_run_offset', 'pipeline_log_chunks', ['run_id', 'start_offset'], unique=False)
+    # Existing runs keep their (possibly truncated) log as a single first chunk.
+    op.execute(
+        "INSERT INTO pipeline_log_chunks (run_id, seq, start_offset, content) "
+        "SELECT id, 0, 0, logs FROM pipeline_runs "
+        "WHERE logs IS NOT NULL AND logs <> ''"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pipeline_log_chunks_run_offset', table_name='pipeline_log_chunks')
+    op.drop_table('pipeline_log_chunks')
@@ -0,0 +1,30 @@
+"""Add build platform options to configs
+
+Revision ID: 5a9d03e1f7c2
+Revises: 8e27b5d0c6f3
+Create Date: 2026-10-17 12:20:05.871342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9d03e1f7c2'
+down_revision: Union[str, None] = '8e27b5d0c6f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('configs', sa.Column('build_platforms', sa.String(), server_default='linux/amd64,linux/arm64', nullable=False))
+    op.add_column('configs', sa.Column('split_platform_builds', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('configs', 'split_platform_builds')
+    op.drop_column('configs', 'build_platforms')
@@ -0,0 +1,30 @@
+"""Add checkout options to configs
+
+Revision ID: 8e27b5d0c6f3
+Revises: 3c1f9a7d2b41
+Create Date: 2026-10-17 11:02:47.518930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e27b5d0c6f3'
+down_revision: Union[str, None] = '3c1f9a7d2b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('configs', sa.Column('shallow_checkout', sa.Boolean(), server_default=sa.true(), nullable=False))
+    op.add_column('configs', sa.Column('git_fetch_filter', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('configs', 'git_fetch_filter')
+    op.drop_column('configs', 'shallow_checkout')
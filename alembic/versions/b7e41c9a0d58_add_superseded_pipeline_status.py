@@ -0,0 +1,31 @@
+"""Add SUPERSEDED pipeline status
+
+Revision ID: b7e41c9a0d58
+Revises: 5a9d03e1f7c2
+Create Date: 2026-10-17 13:41:12.204871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e41c9a0d58'
+down_revision: Union[str, None] = '5a9d03e1f7c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        # ALTER TYPE ... ADD VALUE cannot be used inside the migration transaction.
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE pipelinestatusenum ADD VALUE IF NOT EXISTS 'SUPERSEDED'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres cannot drop a value from an enum, the value stays but is unused.
+    op.execute("UPDATE pipeline_runs SET status = 'UNKNOWN' WHERE status = 'SUPERSEDED'")
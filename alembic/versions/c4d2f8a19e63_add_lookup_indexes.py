@@ -0,0 +1,79 @@
+"""Add lookup indexes and repo_user primary key
+
+Revision ID: c4d2f8a19e63
+Revises: b7e41c9a0d58
+Create Date: 2026-10-17 16:02:48.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2f8a19e63'
+down_revision: Union[str, None] = 'b7e41c9a0d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def _create_index(name: str, table: str, columns: list, **kw) -> None:
+    # CONCURRENTLY keeps the tables writable while the indexes are built, it
+    # cannot run inside the migration transaction.
+    if _is_postgres():
+        with op.get_context().autocommit_block():
+            op.create_index(name, table, columns, postgresql_concurrently=True, **kw)
+    else:
+        op.create_index(name, table, columns, **kw)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not op.get_context().as_sql:
+        duplicates = op.get_bind().execute(sa.text(
+            "SELECT repo_url, main_branch, COUNT(*) FROM configs"
+            " GROUP BY repo_url, main_branch HAVING COUNT(*) > 1"
+        )).fetchall()
+        if duplicates:
+            raise RuntimeError(
+                "configs has several rows for the same (repo_url, main_branch),"
+                f" merge or delete them before upgrading: {duplicates}"
+            )
+
+    op.execute("DELETE FROM repo_user WHERE repo_config_id IS NULL OR user_id IS NULL")
+    if _is_postgres():
+        op.execute(
+            "DELETE FROM repo_user a USING repo_user b"
+            " WHERE a.ctid < b.ctid"
+            " AND a.repo_config_id = b.repo_config_id AND a.user_id = b.user_id"
+        )
+    op.alter_column('repo_user', 'repo_config_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('repo_user', 'user_id', existing_type=sa.Integer(), nullable=False)
+    op.create_primary_key('repo_user_pkey', 'repo_user', ['repo_config_id', 'user_id'])
+
+    _create_index(
+        'ux_configs_repo_url_main_branch', 'configs', ['repo_url', 'main_branch'],
+        unique=True, postgresql_include=['id']
+    )
+    _create_index(
+        'ix_pipeline_runs_config_id_trigger_time_id', 'pipeline_runs',
+        ['config_id', sa.text('trigger_time DESC'), sa.text('id DESC')]
+    )
+    _create_index(
+        'ix_repo_user_user_id_repo_config_id', 'repo_user', ['user_id', 'repo_config_id']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_repo_user_user_id_repo_config_id', table_name='repo_user')
+    op.drop_index('ix_pipeline_runs_config_id_trigger_time_id', table_name='pipeline_runs')
+    op.drop_index('ux_configs_repo_url_main_branch', table_name='configs')
+    op.drop_constraint('repo_user_pkey', 'repo_user', type_='primary')
+    op.alter_column('repo_user', 'user_id', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('repo_user', 'repo_config_id', existing_type=sa.Integer(), nullable=True)
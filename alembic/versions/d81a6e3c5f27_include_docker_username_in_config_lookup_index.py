@@ -0,0 +1,44 @@
+"""Include docker_username in the config lookup index
+
+Revision ID: d81a6e3c5f27
+Revises: c4d2f8a19e63
+Create Date: 2026-10-17 19:24:06.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81a6e3c5f27'
+down_revision: Union[str, None] = 'c4d2f8a19e63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX = 'ux_configs_repo_url_main_branch'
+
+
+def _replace_index(include: list) -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        # INCLUDE only exists on Postgres, the index is the same elsewhere.
+        return
+    # The new index is built next to the old one, so (repo_url, main_branch)
+    # stays unique and the lookup stays indexed while it is replaced.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            f'{INDEX}_new', 'configs', ['repo_url', 'main_branch'],
+            unique=True, postgresql_include=include, postgresql_concurrently=True
+        )
+        op.drop_index(INDEX, table_name='configs', postgresql_concurrently=True)
+        op.execute(f"ALTER INDEX {INDEX}_new RENAME TO {INDEX}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _replace_index(['id', 'docker_username'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_index(['id'])
@@ -1,15 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Body
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from api.api_users import get_db, get_current_user
+from auth.user_cache import UserSnapshot
 from models.user_model import User
 from models.repo_model import RepoConfig
 from schemas.schema_repo import RepoConfigSchema
 from pydantic import HttpUrl
+from helper.cache_bus import publish_invalidation
+from helper.config_routes import CONFIG_ROUTES_CACHE
+from helper.workspace_lock import config_lock_name, describe_lock
 import json
 import os
+import redis
 
 CONFIG_FILE = "config"
 
+redis_client = redis.from_url(
+    os.getenv("REDIS_HOST", "redis://localhost:6379/0"),
+    decode_responses=True
+)
+
 router = APIRouter()
 
 
@@ -41,8 +54,8 @@ def load_config(user: str) -> RepoConfig | None:
 @router.put("/api/config/{config_id}")
 async def update_config(
     config_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
     config_data: RepoConfigSchema = Body(...),
 ):
     print(config_data)
@@ -52,10 +65,10 @@ async def update_config(
             detail="Not authenticated"
         )
 
-    config = db.query(RepoConfig).filter(
+    config = await db.scalar(select(RepoConfig).where(
         RepoConfig.id == config_id,
         RepoConfig.users.any(id=user.id)
-    ).first()
+    ))
 
     if not config:
         raise HTTPException(
@@ -63,25 +76,24 @@ async def update_config(
             detail=f"Config with id: {config_id} not found"
         )
 
-    input_data = config_data.model_dump(mode="python")
-    data = {}
+    # Only the fields the client sent: forms that don't know a field (e.g.
+    # shallow_checkout) must not reset it to the schema default.
+    input_data = config_data.model_dump(mode="python", exclude_unset=True)
     for key, value in input_data.items():
         if isinstance(value, HttpUrl):
             value = str(value)
-        if (new_val := getattr(config, key)) != value:
-            data[key] = value
-        else:
-            data[key] = new_val
-
-    for key in RepoConfigSchema.model_fields.keys():
-        if key not in data:
-            data[key] = getattr(config, key)
-
-    for key, value in data.items():
         setattr(config, key, value)
 
-    db.commit()
-    db.refresh(config)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A config for this repository and branch already exists."
+        )
+    await db.refresh(config)
+    await run_in_threadpool(publish_invalidation, redis_client, CONFIG_ROUTES_CACHE)
 
     return config
 
@@ -89,8 +101,8 @@ async def update_config(
 @router.delete("/api/config/{config_id}")
 async def delete_config(
     config_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if not user:
         raise HTTPException(
@@ -98,10 +110,10 @@ async def delete_config(
             detail="Could not identify user."
         )
 
-    config = db.query(RepoConfig).filter(
+    config = await db.scalar(select(RepoConfig).where(
         RepoConfig.id == config_id,
         RepoConfig.users.any(id=user.id)
-    ).first()
+    ))
 
     if not config:
         raise HTTPException(
@@ -110,8 +122,9 @@ async def delete_config(
         )
 
     try:
-        db.delete(config)
-        db.commit()
+        await db.delete(config)
+        await db.commit()
+        await run_in_threadpool(publish_invalidation, redis_client, CONFIG_ROUTES_CACHE)
         return {
             "message": "Config deleted successfully!",
             "config_id": config_id
@@ -123,11 +136,40 @@ async def delete_config(
         )
 
 
+@router.get("/api/config/{config_id}/lock")
+async def get_config_lock(
+    config_id: int,
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Which run holds the workspace lock of the config and which runs wait for it."""
+    config = await db.scalar(select(RepoConfig).where(
+        RepoConfig.id == config_id,
+        RepoConfig.users.any(id=user.id)
+    ))
+
+    if not config:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Config not found or you don't have access."
+        )
+
+    try:
+        return await run_in_threadpool(
+            describe_lock, redis_client, config_lock_name(config_id)
+        )
+    except redis.RedisError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Error: cannot read the lock state: '{e}'"
+        )
+
+
 @router.post("/api/config")
 async def config_repo(
     config_data: RepoConfigSchema,
-    user: User = Depends(get_current_user),
-    db=Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     from helper.data import encrypt_data
 
@@ -162,10 +204,10 @@ async def config_repo(
         f"Main branch: {config_data.main_branch}"
     )
 
-    existing_config = db.query(RepoConfig).filter(
+    existing_config = await db.scalar(select(RepoConfig).where(
         RepoConfig.repo_url == repo_url,
         RepoConfig.main_branch == config_data.main_branch
-    ).first()
+    ))
 
     if existing_config:
         raise HTTPException(
@@ -188,11 +230,15 @@ async def config_repo(
             repo_url=repo_url,
             main_branch=config_data.main_branch,
             platform=config_data.platform,
+            build_platforms=config_data.build_platforms,
+            split_platform_builds=config_data.split_platform_builds,
             installation_id=config_data.installation_id,
             use_ssh_for_clone=config_data.use_ssh_for_clone,
             git_ssh_private_key_encrypted=config_data.git_ssh_private_key_encrypted,
             git_ssh_key_passphrase_encrypted=config_data.git_ssh_key_passphrase_encrypted,
             git_ssh_host_key=config_data.git_ssh_host_key,
+            shallow_checkout=config_data.shallow_checkout,
+            git_fetch_filter=config_data.git_fetch_filter,
             SSH_host=config_data.SSH_host,
             SSH_port=config_data.SSH_port,
             SSH_username=config_data.SSH_username,
@@ -200,11 +246,10 @@ async def config_repo(
             SSH_key_passphrase=config_data.SSH_key_passphrase,
             SSH_for_deploy=config_data.SSH_for_deploy
         )
-        if user not in config.users:
-            config.users.append(user)
+        config.users.append(await db.get(User, user.id))
         db.add(config)
-        db.commit()
-        db.refresh(config)
+        await db.commit()
+        await run_in_threadpool(publish_invalidation, redis_client, CONFIG_ROUTES_CACHE)
         return {
             "message": "Config saved successfuly!",
             "config": config_data,
@@ -219,11 +264,13 @@ async def config_repo(
 
 @router.get("/api/config")
 async def get_config(
-    user: User = Depends(get_current_user),
-    db=Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     try:
-        configs = db.query(RepoConfig).filter(RepoConfig.users.any(id=user.id)).all()
+        configs = (await db.scalars(
+            select(RepoConfig).where(RepoConfig.users.any(id=user.id))
+        )).all()
         if not configs:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,6 +1,12 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from api.api_config import redis_client
 from api.api_users import get_db, get_current_user
-from models.user_model import User
+from auth.user_cache import UserSnapshot
+from helper.cache_bus import publish_invalidation
+from helper.config_routes import CONFIG_ROUTES_CACHE
 from models.repo_model import RepoConfig
 from schemas.schema_repo import DockerConfig
 
@@ -10,27 +16,31 @@ router = APIRouter()
 @router.post("/api/docker")
 async def set_docker(
     docker_config: DockerConfig,
-    user: User = Depends(get_current_user),
-    db=Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     updated = 0
     if not docker_config.specific_repo:
-        configs = db.query(RepoConfig).filter(RepoConfig.users.any(id=user.id)).all()
+        configs = (await db.scalars(
+            select(RepoConfig).where(RepoConfig.users.any(id=user.id))
+        )).all()
         for config in configs:
             config.docker_username = docker_config.docker_username
             updated += 1
     else:
-        config = db.query(RepoConfig).filter(
+        config = await db.scalar(select(RepoConfig).where(
             RepoConfig.users.any(id=user.id),
             RepoConfig.repo_url == docker_config.specific_repo
-        ).first()
+        ))
         if config:
             updated += 1
             config.docker_username = docker_config.docker_username
         else:
             return {"message": "No matching repo found or you don't have access."}
 
-    db.commit()
+    await db.commit()
+    # Cached webhook routes carry the Docker username the image is named after.
+    await run_in_threadpool(publish_invalidation, redis_client, CONFIG_ROUTES_CACHE)
 
     return {
         "message": f"Docker username set for {updated} config(s)"
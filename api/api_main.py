@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 import os
 import string
 import random
 from cryptography.fernet import Fernet
 from api.api_users import get_db, get_current_user
+from auth.user_cache import UserSnapshot
 from models.user_model import User
 from models.repo_model import RepoConfig, Webhook
 from schemas.schema_webhook import WebhookSchema
@@ -25,31 +28,31 @@ fernet = Fernet(FERNET_SECRET_KEY.encode())
 @router.delete("/api/webhook/{webhook_id}")
 async def delete_webhook(
     webhook_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Unauthorized"
         )
-    webhook = db.query(Webhook).filter(Webhook.id == webhook_id).first()
-    db.delete(webhook)
-    db.commit()
+    webhook = await db.scalar(select(Webhook).where(Webhook.id == webhook_id))
+    await db.delete(webhook)
+    await db.commit()
 
 
 @router.get("/api/webhook/generate")
 async def generate_webhook(
     repo_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Unauthorized"
         )
-    webhook = db.query(Webhook).filter(Webhook.repo_id == repo_id).first()
+    webhook = await db.scalar(select(Webhook).where(Webhook.repo_id == repo_id))
 
     if webhook:
         raise HTTPException(
@@ -67,18 +70,17 @@ async def generate_webhook(
 @router.post("/api/webhook/confirm")
 async def confirm_webhook(
     payload: WebhookSchema,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     url = payload.url
     secret = payload.secret
     repo_id = payload.repo_id
     print("PROSAO")
 
-    repo = (
-        db.query(RepoConfig)
-        .filter(RepoConfig.id == repo_id)
-        .first()
+    repo = await db.scalar(
+        select(RepoConfig)
+        .where(RepoConfig.id == repo_id)
     )
     if not repo:
         raise HTTPException(
@@ -94,20 +96,19 @@ async def confirm_webhook(
         encoded_webhook_secret=encrypted_secret
     )
     db.add(webhook)
-    db.commit()
+    await db.commit()
 
 
 @router.get("/api/webhooks")
 async def get_webhooks(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    webhooks = (
-        db.query(Webhook)
+    webhooks = (await db.scalars(
+        select(Webhook)
         .join(RepoConfig.users)
-        .filter(User.id == user.id)
+        .where(User.id == user.id)
         .options(joinedload(Webhook.repo_config))
-        .all()
-    )
+    )).all()
 
     return webhooks
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
+from api.api_users import get_current_user
+from auth.user_cache import UserSnapshot
+from db import pool_metrics
+from helper.db_pool import collect_pool_metrics
+import os
+import redis
+
+redis_client = redis.from_url(
+    os.getenv("REDIS_HOST", "redis://localhost:6379/0"),
+    decode_responses=True
+)
+
+router = APIRouter()
+
+
+@router.get("/api/metrics/db")
+async def get_db_pool_metrics(
+    user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Connection pools of this API process and the latest metrics reported by
+    the worker processes. `open_connections` is their sum, the share of the
+    Postgres max_connections in use.
+    """
+    processes = [pool_metrics()]
+    try:
+        processes += await run_in_threadpool(collect_pool_metrics, redis_client)
+    except redis.RedisError as e:
+        print(f"Error reading worker pool metrics: {e}")
+
+    return {
+        "open_connections": sum(
+            pool["open"]
+            for process in processes
+            for pool in process["pools"].values()
+        ),
+        "processes": processes,
+    }
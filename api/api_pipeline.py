@@ -1,38 +1,146 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+import base64
+import os
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, true, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, load_only, selectinload
 from typing import List
 from api.api_users import get_db, get_current_user
-from models.user_model import User
+from helper.log_store import iter_bytes, iter_chars, iter_tail, load_log_index
+from helper.pipeline_logs import (
+    pipeline_log_size,
+    read_pipeline_logs,
+)
+from auth.user_cache import UserSnapshot
 from models.pipeline_test_model import PipelineRuns
-from models.repo_model import RepoConfig
-from schemas.schema_pipeline import PipelineRunOut
+from models.repo_model import RepoConfig, repo_user
+from schemas.schema_pipeline import PipelineRunSummary, PipelineStatusEnum
 
 router = APIRouter()
 
+PIPELINE_PAGE_SIZE = int(os.getenv("CI_PIPELINE_PAGE_SIZE", "50"))
+PIPELINE_MAX_PAGE_SIZE = 200
+LOG_MEDIA_TYPE = "text/plain; charset=utf-8"
+# What a run listing returns, the logs are fetched per run.
+SUMMARY_COLUMNS = (
+    PipelineRuns.id,
+    PipelineRuns.config_id,
+    PipelineRuns.trigger_time,
+    PipelineRuns.end_time,
+    PipelineRuns.status,
+    PipelineRuns.commit_sha,
+    PipelineRuns.trigger_event_id,
+)
+
+
+def encode_cursor(run: PipelineRuns) -> str:
+    raw = f"{run.trigger_time.isoformat()}|{run.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        trigger_time, run_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(trigger_time), int(run_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-@router.get("/api/pipelines", response_model=List[PipelineRunOut])
+
+@router.get("/api/pipelines", response_model=List[PipelineRunSummary])
 async def get_pipeline(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(PIPELINE_PAGE_SIZE, ge=1, le=PIPELINE_MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    status: List[PipelineStatusEnum] | None = Query(None),
+    config_id: int | None = Query(None),
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None),
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    runs = (
-        db.query(PipelineRuns)
-        .join(PipelineRuns.config)
-        .join(RepoConfig.users)
-        .filter(User.id == user.id)
-        .options(joinedload(PipelineRuns.config))
-        .all()
+    """
+    The user's runs, newest first, without logs. Pages are keyed on
+    (trigger_time, id): pass the X-Next-Cursor header of a page as `cursor`
+    to get the next one; the last page has no such header.
+    """
+    filters = []
+    if config_id is not None:
+        filters.append(PipelineRuns.config_id == config_id)
+    if status:
+        filters.append(PipelineRuns.status.in_(status))
+    if since:
+        filters.append(PipelineRuns.trigger_time >= since)
+    if until:
+        filters.append(PipelineRuns.trigger_time < until)
+    if cursor:
+        filters.append(
+            tuple_(PipelineRuns.trigger_time, PipelineRuns.id) < decode_cursor(cursor)
+        )
+
+    user_configs = select(repo_user.c.repo_config_id).where(
+        repo_user.c.user_id == user.id
     )
+    newest_first = (PipelineRuns.trigger_time.desc(), PipelineRuns.id.desc())
+    if db.get_bind().dialect.name == "postgresql":
+        # One index walk per config, each stopping after a page, then a merge
+        # of those few rows: (trigger_time, id) across several configs can not
+        # be read from a single index, so sorting the user's whole history
+        # would be the alternative.
+        user_configs = user_configs.subquery()
+        per_config = (
+            select(*SUMMARY_COLUMNS)
+            .where(PipelineRuns.config_id == user_configs.c.repo_config_id, *filters)
+            .order_by(*newest_first)
+            .limit(limit + 1)
+            .lateral()
+        )
+        run = aliased(PipelineRuns, per_config)
+        query = (
+            select(run)
+            .options(load_only(*(getattr(run, c.key) for c in SUMMARY_COLUMNS)))
+            .select_from(user_configs)
+            .join(per_config, true())
+            .order_by(run.trigger_time.desc(), run.id.desc())
+        )
+    else:
+        query = (
+            select(PipelineRuns)
+            .options(load_only(*SUMMARY_COLUMNS))
+            .where(PipelineRuns.config_id.in_(user_configs), *filters)
+            .order_by(*newest_first)
+        )
+
+    runs = (await db.scalars(query.limit(limit + 1))).all()
+    if len(runs) > limit:
+        runs = runs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(runs[-1])
     return runs
 
 
+async def load_pipeline_with_owners(
+    db: AsyncSession,
+    pipeline_id: int
+) -> PipelineRuns | None:
+    """The run with its config and the config's users loaded up front."""
+    return await db.get(
+        PipelineRuns,
+        pipeline_id,
+        options=[selectinload(PipelineRuns.config).selectinload(RepoConfig.users)]
+    )
+
+
 @router.get("/api/pipelines/{pipeline_id}")
 async def get_pipelines(
     pipeline_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    pipeline = db.query(PipelineRuns).filter_by(id=pipeline_id).first()
+    pipeline = await load_pipeline_with_owners(db, pipeline_id)
     if not pipeline:
         raise HTTPException(
             status_code=404,
@@ -41,7 +149,7 @@ async def get_pipelines(
     config = pipeline.config
     owners = config.users
 
-    if user not in owners:
+    if user.id not in [owner.id for owner in owners]:
         raise HTTPException(
             status_code=403,
             detail="Not authorized to access this pipeline"
@@ -56,3 +164,118 @@ async def get_pipelines(
         "end_time": pipeline.end_time,
         "commit_sha": pipeline.commit_sha
     }
+
+
+def parse_byte_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """
+    (start, end) of a single `bytes=` range, end exclusive. None when the
+    range cannot be satisfied; a malformed header raises ValueError.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(range_header)
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        suffix = int(last)
+        if suffix <= 0 or size == 0:
+            return None
+        return max(size - suffix, 0), size
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if start >= size or end <= start:
+        return None
+    return start, end
+
+
+@router.get("/api/pipelines/{pipeline_id}/logs", response_class=PlainTextResponse)
+async def get_pipeline_logs(
+    pipeline_id: int,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1),
+    tail: int | None = Query(None, ge=1, description="only the last N lines"),
+    user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    The run's log as text. `offset` and `limit` select characters, `tail`
+    the last lines. Once the run finished its log is served from the
+    compressed archive, which also honours a single HTTP byte Range and
+    decompresses only the segments it has to send.
+    """
+    pipeline = await load_pipeline_with_owners(db, pipeline_id)
+    if not pipeline:
+        raise HTTPException(
+            status_code=404,
+            detail="Pipeline not found"
+        )
+    if user.id not in [owner.id for owner in pipeline.config.users]:
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized to access this pipeline"
+        )
+
+    index = await run_in_threadpool(load_log_index, pipeline_id)
+    if index is None:
+        if tail:
+            logs = await db.run_sync(read_pipeline_logs, pipeline_id)
+            lines = logs.split("\n")
+            if lines and lines[-1] == "":
+                lines = lines[:-1]
+            logs = "".join(line + "\n" for line in lines[-tail:])
+            return PlainTextResponse(logs)
+        logs = await db.run_sync(
+            read_pipeline_logs, pipeline_id, offset=offset, limit=limit
+        )
+        size = await db.run_sync(pipeline_log_size, pipeline_id)
+        return PlainTextResponse(
+            logs,
+            headers={
+                "X-Log-Offset": str(offset),
+                "X-Log-Next-Offset": str(offset + len(logs)),
+                "X-Log-Size": str(size),
+            }
+        )
+
+    range_header = request.headers.get("range")
+    if range_header:
+        try:
+            byte_range = parse_byte_range(range_header, index.size)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Range header")
+        if byte_range is None:
+            return Response(
+                status_code=416,
+                headers={"Content-Range": f"bytes */{index.size}"}
+            )
+        start, end = byte_range
+        return StreamingResponse(
+            iter_bytes(index, start, end),
+            status_code=206,
+            media_type=LOG_MEDIA_TYPE,
+            headers={
+                "Accept-Ranges": "bytes",
+                "Content-Range": f"bytes {start}-{end - 1}/{index.size}",
+                "Content-Length": str(end - start),
+            }
+        )
+
+    if tail:
+        return StreamingResponse(
+            iter_tail(index, tail),
+            media_type=LOG_MEDIA_TYPE,
+            headers={"Accept-Ranges": "bytes"}
+        )
+
+    offset = min(offset, index.chars)
+    end = index.chars if limit is None else min(offset + limit, index.chars)
+    return StreamingResponse(
+        (text.encode("utf-8") for text in iter_chars(index, offset, end - offset)),
+        media_type=LOG_MEDIA_TYPE,
+        headers={
+            "Accept-Ranges": "bytes",
+            "X-Log-Offset": str(offset),
+            "X-Log-Next-Offset": str(end),
+            "X-Log-Size": str(index.chars),
+        }
+    )
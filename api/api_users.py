@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
-from db import SessionLocal
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import AsyncSessionLocal
 from models.user_model import User, hash_password, verify_password
 from auth.jwt_handler import create_token, decode_token
+from auth.user_cache import UserSnapshot, load_user_snapshot, token_users
 from pydantic import BaseModel, EmailStr
+from starlette.concurrency import run_in_threadpool
 
 
 class RegisterRequest(BaseModel):
@@ -20,18 +23,14 @@ class LoginRequest(BaseModel):
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def get_current_user(
+async def get_current_user(
         authorization: str = Header(...),
-        db: Session = Depends(get_db),
-) -> User | None:
+) -> UserSnapshot:
     scheme, _, token = authorization.partition(" ")
     if scheme.lower() != "bearer" or not token:
         raise HTTPException(
@@ -39,6 +38,10 @@ def get_current_user(
             detail="Not valid bearer token",
             headers={"WWW-Authenticate": "Bearer"}
         )
+    user = token_users.get(token)
+    if user is not None:
+        return user
+
     payload = decode_token(token)
     if not payload:
         raise HTTPException(
@@ -53,25 +56,26 @@ def get_current_user(
             detail="Token does not contain sub",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(User).filter(User.username == username).first()
+    user = await load_user_snapshot(username)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found in database",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    token_users.put(token, user, payload.get("exp"))
     return user
 
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
-def register(
+async def register(
     user_data: RegisterRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = db.query(User).filter(
-        User.username == user_data.username or
+    user = await db.scalar(select(User).where(or_(
+        User.username == user_data.username,
         User.email == user_data.email
-    ).first()
+    )))
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -80,28 +84,30 @@ def register(
     new_user = User(
         username=user_data.username,
         email=user_data.email,
-        password_hash=hash_password(user_data.password),
+        password_hash=await run_in_threadpool(hash_password, user_data.password),
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return {
         "message": "User registered successfully!"
     }
 
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-def login(
+async def login(
     form_data: LoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.email == form_data.email).first()
+    user = await db.scalar(select(User).where(User.email == form_data.email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"User with email: '{form_data.email}' doesn't exist"
         )
-    elif not verify_password(form_data.password, user.password_hash):
+    # Password hashing is CPU bound, keep it off the event loop.
+    elif not await run_in_threadpool(
+        verify_password, form_data.password, user.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password is incorrect!"
@@ -0,0 +1,121 @@
+"""
+Cache of verified bearer tokens and the user they belong to, so that
+get_current_user neither decodes the JWT nor queries the database for a
+token it has seen recently.
+
+An entry lives for CI_AUTH_CACHE_TTL_SECONDS but never past the token's
+`exp`. Handlers get a UserSnapshot, a plain immutable copy of the user that
+needs no database session. When a user row is updated or deleted, entries of
+that user are dropped in this process after the commit, and in every other
+process through the cache invalidation bus.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+
+import redis
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from helper.cache_bus import publish_invalidation
+from helper.lru import TTLCache
+from models.user_model import User
+
+AUTH_USERS_CACHE = "auth_users"
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("CI_AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("CI_AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+redis_client = redis.from_url(
+    os.getenv("REDIS_HOST", "redis://localhost:6379/0"),
+    decode_responses=True
+)
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    id: int
+    username: str
+    email: str
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(id=user.id, username=user.username, email=user.email)
+
+
+class TokenUserCache:
+    def __init__(
+        self,
+        max_entries: int = AUTH_CACHE_MAX_ENTRIES,
+        ttl: float = AUTH_CACHE_TTL_SECONDS
+    ):
+        self.ttl = ttl
+        self._entries = TTLCache(max_entries, ttl)
+
+    def get(self, token: str) -> UserSnapshot | None:
+        return self._entries.get(token)
+
+    def put(self, token: str, user: UserSnapshot, expires_at: float | None):
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        if ttl > 0:
+            self._entries.set(token, user, ttl=ttl)
+
+    def invalidate(self, username: str | None = None):
+        """Drops the entries of one user, or all of them."""
+        if username is None:
+            self._entries.clear()
+        else:
+            self._entries.remove_if(lambda user: user.username == username)
+
+
+token_users = TokenUserCache()
+
+
+async def load_user_snapshot(username: str) -> UserSnapshot | None:
+    # Imported here, so the cache can be used without a configured database.
+    from db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(User).where(User.username == username))
+        return UserSnapshot.from_user(user) if user else None
+
+
+def _changed_usernames(session: Session) -> set[str]:
+    return session.info.setdefault("auth_changed_usernames", set())
+
+
+def _remember_user_change(mapper, connection, target: User):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    usernames = _changed_usernames(session)
+    usernames.add(target.username)
+    # A renamed user's tokens still carry the old name.
+    usernames.update(inspect(target).attrs.username.history.deleted or ())
+
+
+def _publish_user_invalidations(usernames: set[str]):
+    for username in usernames:
+        publish_invalidation(redis_client, AUTH_USERS_CACHE, username)
+
+
+def _invalidate_after_commit(session: Session):
+    usernames = session.info.pop("auth_changed_usernames", None)
+    if not usernames:
+        return
+    for username in usernames:
+        token_users.invalidate(username)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _publish_user_invalidations(usernames)
+        return
+    # An AsyncSession commits on the event loop, Redis is called off it.
+    loop.run_in_executor(None, _publish_user_invalidations, usernames)
+
+
+event.listen(User, "after_update", _remember_user_change)
+event.listen(User, "after_delete", _remember_user_change)
+event.listen(Session, "after_commit", _invalidate_after_commit)
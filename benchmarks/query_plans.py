@@ -0,0 +1,270 @@
+"""
+Query plan benchmark for the webhook and dashboard lookups.
+
+Seeds users, configs and pipeline runs (1M by default) into a scratch schema
+of the PostgreSQL database in BENCH_DATABASE_URL (or DATABASE_URL), then runs
+EXPLAIN ANALYZE on the hot queries and fails unless each one uses the
+expected index, index-only where the query allows it, without scanning or
+sorting a whole large table. One extra user owns many configs, to cover the
+dashboard of a busy account. The schema is dropped at the end unless --keep
+is given.
+
+    python benchmarks/query_plans.py --runs 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.base import Base  # noqa: E402
+import models.pipeline_log_model  # noqa: E402,F401
+import models.pipeline_test_model  # noqa: E402,F401
+import models.repo_model  # noqa: E402,F401
+import models.user_model  # noqa: E402,F401
+
+load_dotenv()
+
+SCHEMA = "query_plan_bench"
+PAGE_SIZE = 50
+# Sequential scans of tables up to this many pages are what Postgres should
+# pick, reading a few pages beats walking an index.
+SMALL_TABLE_PAGES = 64
+
+# GET /api/pipelines on Postgres: a page of each config, merged.
+DASHBOARD_SQL = (
+    "SELECT r.* FROM (SELECT repo_config_id FROM repo_user WHERE user_id = {user})"
+    " AS uc JOIN LATERAL (SELECT id, config_id, trigger_time, end_time, status,"
+    " commit_sha, trigger_event_id FROM pipeline_runs"
+    " WHERE config_id = uc.repo_config_id"
+    f" ORDER BY trigger_time DESC, id DESC LIMIT {PAGE_SIZE + 1}) AS r ON true"
+    f" ORDER BY r.trigger_time DESC, r.id DESC LIMIT {PAGE_SIZE + 1}"
+)
+
+# name, sql, index that must be used, whether the scan must be index-only
+CHECKS = [
+    (
+        "webhook config lookup",
+        "SELECT id, repo_url, main_branch, docker_username FROM configs"
+        " WHERE repo_url = :repo_url AND main_branch = 'main'",
+        "ux_configs_repo_url_main_branch",
+        True,
+    ),
+    (
+        "configs of a user",
+        "SELECT repo_config_id FROM repo_user WHERE user_id = :user_id",
+        "ix_repo_user_user_id_repo_config_id",
+        True,
+    ),
+    (
+        "owners of a config",
+        "SELECT user_id FROM repo_user WHERE repo_config_id = :config_id",
+        "repo_user_pkey",
+        True,
+    ),
+    (
+        "first page of a config's runs",
+        "SELECT id, trigger_time FROM pipeline_runs WHERE config_id = :config_id"
+        f" ORDER BY trigger_time DESC, id DESC LIMIT {PAGE_SIZE}",
+        "ix_pipeline_runs_config_id_trigger_time_id",
+        True,
+    ),
+    (
+        "next page of a config's runs",
+        "SELECT id, trigger_time FROM pipeline_runs WHERE config_id = :config_id"
+        " AND (trigger_time, id) < (:cursor_time, :cursor_id)"
+        f" ORDER BY trigger_time DESC, id DESC LIMIT {PAGE_SIZE}",
+        "ix_pipeline_runs_config_id_trigger_time_id",
+        True,
+    ),
+    (
+        "dashboard page of a user",
+        DASHBOARD_SQL.format(user=":user_id"),
+        "ix_pipeline_runs_config_id_trigger_time_id",
+        False,
+    ),
+    (
+        "dashboard page of a user with many configs",
+        DASHBOARD_SQL.format(user=":busy_user_id"),
+        "ix_pipeline_runs_config_id_trigger_time_id",
+        False,
+    ),
+]
+
+
+def seed(conn, users: int, configs: int, runs: int, busy_configs: int):
+    conn.execute(text(
+        "INSERT INTO users (username, email, password_hash)"
+        " SELECT 'bench' || g, 'bench' || g || '@example.com', 'x'"
+        " FROM generate_series(1, :n) g"
+    ), {"n": users})
+    conn.execute(text(
+        "INSERT INTO configs (repo_url, main_branch, platform, use_ssh_for_clone,"
+        " \"SSH_for_deploy\", docker_username)"
+        " SELECT 'https://github.com/bench/repo' || g || '.git', 'main', 'github',"
+        " false, false, 'bench' FROM generate_series(1, :n) g"
+    ), {"n": configs})
+    conn.execute(text(
+        "INSERT INTO repo_user (repo_config_id, user_id)"
+        " SELECT c.id, (c.id - 1) % :users + 1 FROM configs c"
+    ), {"users": users})
+    # The busy user, id users + 1, owns the first busy_configs configs as well.
+    conn.execute(text(
+        "INSERT INTO users (username, email, password_hash)"
+        " VALUES ('bench-busy', 'bench-busy@example.com', 'x')"
+    ))
+    conn.execute(text(
+        "INSERT INTO repo_user (repo_config_id, user_id)"
+        " SELECT id, :user FROM configs WHERE id <= :n"
+    ), {"user": users + 1, "n": busy_configs})
+    conn.execute(text(
+        "INSERT INTO pipeline_runs (config_id, trigger_time, end_time, status,"
+        " commit_sha, trigger_event_id)"
+        " SELECT (g - 1) % :configs + 1,"
+        " now() - make_interval(secs => g),"
+        " now() - make_interval(secs => g) + interval '90 seconds',"
+        " 'SUCCESS', md5(g::text) || substr(md5(g::text), 1, 8), md5(g::text)"
+        " FROM generate_series(1, :n) g"
+    ), {"configs": configs, "n": runs})
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def relation_pages(conn, relation: str) -> int:
+    return conn.execute(
+        text("SELECT relpages FROM pg_class WHERE oid = to_regclass(:relation)"),
+        {"relation": relation}
+    ).scalar()
+
+
+def full_sorts(conn, nodes: list) -> list:
+    """
+    Large tables read in full below a Sort: only a Limit in between (a page
+    per config) keeps the number of sorted rows bounded.
+    """
+    def unbounded_reads(node):
+        if node["Node Type"] == "Limit":
+            return
+        if "Relation Name" in node:
+            yield node["Relation Name"]
+        for child in node.get("Plans", []):
+            yield from unbounded_reads(child)
+
+    return sorted({
+        relation
+        for node in nodes if node["Node Type"] == "Sort"
+        for child in node.get("Plans", [])
+        for relation in unbounded_reads(child)
+        if relation_pages(conn, relation) > SMALL_TABLE_PAGES
+    })
+
+
+def check_plan(conn, name: str, sql: str, params: dict, index: str, index_only: bool):
+    explain = conn.execute(
+        text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params
+    ).scalar()
+    if isinstance(explain, str):
+        explain = json.loads(explain)
+    root = explain[0]
+    nodes = list(plan_nodes(root["Plan"]))
+    scans = [node for node in nodes if node.get("Index Name") == index]
+    seq_scans = [
+        node["Relation Name"] for node in nodes
+        if node["Node Type"] == "Seq Scan"
+        and relation_pages(conn, node["Relation Name"]) > SMALL_TABLE_PAGES
+    ]
+
+    problems = []
+    if not scans:
+        problems.append(f"does not use {index}")
+    elif index_only and not any(node["Node Type"] == "Index Only Scan" for node in scans):
+        problems.append(f"uses {index} but not index-only")
+    if seq_scans:
+        problems.append(f"sequential scan on {', '.join(seq_scans)}")
+    sorted_tables = full_sorts(conn, nodes)
+    if sorted_tables:
+        problems.append(f"sorts all matching rows of {', '.join(sorted_tables)}")
+
+    print(
+        f"{'FAIL' if problems else 'ok  '} {name}: {root['Execution Time']:.3f} ms"
+        f" ({', '.join(sorted({node['Node Type'] for node in scans})) or '-'})"
+    )
+    for problem in problems:
+        print(f"     {problem}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=1_000_000)
+    parser.add_argument("--configs", type=int, default=2_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument(
+        "--busy-configs", type=int, default=100,
+        help="configs owned by the extra busy user"
+    )
+    parser.add_argument("--keep", action="store_true", help="keep the seeded schema")
+    args = parser.parse_args()
+    if args.runs <= args.configs * PAGE_SIZE:
+        parser.error(f"--runs must exceed --configs x {PAGE_SIZE}, to have a second page")
+    if not 1 <= args.busy_configs <= args.configs:
+        parser.error("--busy-configs must be between 1 and --configs")
+
+    url = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not url or not url.startswith("postgresql"):
+        sys.exit("BENCH_DATABASE_URL (or DATABASE_URL) must point to PostgreSQL.")
+
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    try:
+        Base.metadata.create_all(engine)
+        started = time.monotonic()
+        with engine.begin() as conn:
+            seed(conn, args.users, args.configs, args.runs, args.busy_configs)
+        print(f"Seeded {args.runs} runs in {time.monotonic() - started:.1f}s")
+
+        # VACUUM sets the visibility map that index-only scans rely on.
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE users, configs, repo_user, pipeline_runs"))
+
+        with engine.connect() as conn:
+            config_id = args.configs // 2
+            cursor_time, cursor_id = conn.execute(text(
+                "SELECT trigger_time, id FROM pipeline_runs WHERE config_id = :c"
+                " ORDER BY trigger_time DESC, id DESC OFFSET :o LIMIT 1"
+            ), {"c": config_id, "o": PAGE_SIZE}).one()
+            params = {
+                "repo_url": f"https://github.com/bench/repo{config_id}.git",
+                "user_id": args.users // 2,
+                "busy_user_id": args.users + 1,
+                "config_id": config_id,
+                "cursor_time": cursor_time,
+                "cursor_id": cursor_id,
+            }
+            results = [
+                check_plan(conn, name, sql, params, index, index_only)
+                for name, sql, index, index_only in CHECKS
+            ]
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        engine.dispose()
+
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,82 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 
+from helper.db_pool import (
+    TimedAsyncQueuePool,
+    TimedQueuePool,
+    pool_profile,
+    pool_status,
+)
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# "web" for the API server, "worker" for Celery workers and the dispatcher.
+DB_ROLE = os.getenv("CI_DB_ROLE", "web")
+
+# Async drivers for the sync URLs in DATABASE_URL.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL with its driver swapped for the async one of the same database."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return url.render_as_string(hide_password=False)
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
 
-engine = create_engine(DATABASE_URL)
+POOL_PROFILE = pool_profile(DB_ROLE)
+
+# Celery workers and scripts use the sync engine, the FastAPI routers the async one.
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=TimedQueuePool,
+    **POOL_PROFILE.engine_kwargs()
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=TimedAsyncQueuePool,
+    **POOL_PROFILE.engine_kwargs()
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+
+def dispose_engines():
+    """
+    Gives a forked process pools of its own. The connections inherited from
+    the parent are left open for the parent to use and are never touched here.
+    """
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
+def pool_metrics() -> dict:
+    return {
+        "role": DB_ROLE,
+        "pid": os.getpid(),
+        "profile": {
+            **POOL_PROFILE.engine_kwargs(),
+            "max_connections": POOL_PROFILE.max_connections,
+        },
+        "pools": {
+            "sync": pool_status(engine.pool),
+            "async": pool_status(async_engine.sync_engine.pool),
+        },
+    }
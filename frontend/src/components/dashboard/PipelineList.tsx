@@ -8,29 +8,60 @@ const PipelinesList: React.FC = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [searchQuery, setSearchQuery] = useState("");
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  useEffect(() => {
+  const fetchPipelines = async (cursor: string | null) => {
     setLoading(true);
     setError(null);
-    const fetchPipelines = async () => {
+    try {
+      const response = await api.get<BackendPipelineRun[]>("/api/pipelines", {
+        params: cursor ? { cursor } : {},
+      });
+      const runs = response.data.map((run) => ({ ...run, logsExpanded: false }));
+      setPipelineRuns((prevRuns) => (cursor ? [...prevRuns, ...runs] : runs));
+      setNextCursor(response.headers["x-next-cursor"] ?? null);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  useEffect(() => {
+    fetchPipelines(null);
+  }, []);
+
+  const togglePipelineLogs = async (runId: number) => {
+    const run = pipelineRuns.find((r) => r.id === runId);
+    // A run that was still going when it was listed gets the rest of its
+    // log appended every time it is opened, from where the last read ended.
+    if (run && !run.logsExpanded && (run.logs === undefined || !run.end_time)) {
+      const offset = run.logs === undefined ? 0 : run.logsNextOffset ?? run.logs.length;
       try {
-        const response = await api.get<BackendPipelineRun[]>("/api/pipelines");
-        setPipelineRuns(
-          response.data.map((run) => ({ ...run, logsExpanded: false }))
+        const response = await api.get<string>(`/api/pipelines/${runId}/logs`, {
+          params: offset ? { offset } : {},
+          responseType: "text",
+        });
+        setPipelineRuns((prevRuns) =>
+          prevRuns.map((r) =>
+            r.id === runId
+              ? {
+                  ...r,
+                  logs: offset ? (r.logs ?? "") + response.data : response.data,
+                  logsNextOffset: Number(
+                    response.headers["x-log-next-offset"] ?? offset + response.data.length
+                  ),
+                }
+              : r
+          )
         );
       } catch (err) {
         console.error(err);
-      } finally {
-        setLoading(false);
       }
-    };
-    fetchPipelines();
-  }, []);
-
-  const togglePipelineLogs = (runId: number) => {
+    }
     setPipelineRuns((prevRuns) =>
-      prevRuns.map((run) =>
-        run.id === runId ? { ...run, logsExpanded: !run.logsExpanded } : run
+      prevRuns.map((r) =>
+        r.id === runId ? { ...r, logsExpanded: !r.logsExpanded } : r
       )
     );
   };
@@ -56,7 +87,7 @@ const PipelinesList: React.FC = () => {
           onChange={(e) => setSearchQuery(e.target.value)}
         />
       </div>
-      {loading ? (
+      {loading && pipelineRuns.length === 0 ? (
         <p className="text-center text-gray-400">Loading pipeline runs...</p>
       ) : error ? (
         <p className="text-red-400 text-center">{error}</p>
@@ -73,6 +104,17 @@ const PipelinesList: React.FC = () => {
           ))}
         </ul>
       )}
+      {nextCursor && (
+        <div className="mt-4 text-center">
+          <button
+            onClick={() => fetchPipelines(nextCursor)}
+            disabled={loading}
+            className="px-4 py-2 text-sm bg-indigo-600 hover:bg-indigo-500 rounded-lg text-white disabled:opacity-50"
+          >
+            {loading ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
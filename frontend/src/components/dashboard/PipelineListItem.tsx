@@ -29,6 +29,7 @@ const getStatusColor = (status: string) => {
       if (status.includes("SUCCESS")) return "bg-green-500";
       if (status.includes("FAILED")) return "bg-red-500";
       if (status.includes("UNKNOWN")) return "bg-yellow-500";
+      if (status.includes("SUPERSEDED")) return "bg-gray-500";
       return "bg-blue-500";
   };
   
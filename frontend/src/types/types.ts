@@ -45,7 +45,7 @@ export interface PipelineResponse {
     end_time: Date;
     commit_sha: string;
     trigger_event_id: string;
-    logs: string;
+    logs?: string;
     config_id: number;
     logsExpanded: boolean;
 }
@@ -101,7 +101,8 @@ export interface PipelineRun{
   end_time: Date;
   commit_sha: string;
   trigger_event_id: string;
-  logs: string;
+  logs?: string;
+  logsNextOffset?: number;
   config_id: number;
   logsExpanded?: boolean;
 }
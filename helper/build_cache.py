@@ -0,0 +1,144 @@
+"""
+Local BuildKit layer caches, one per config, shared by every build on a host
+(or by every worker when CI_BUILD_CACHE_DIR is on a shared volume).
+
+Each build imports the config's current cache with --cache-from and exports
+into a fresh directory with --cache-to. After a successful build the fresh
+directory replaces the old one, which keeps the local cache from growing
+with every export. Total size is kept under CI_BUILD_CACHE_MAX_BYTES by
+evicting the least recently used caches.
+"""
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+BUILD_CACHE_DIR = os.path.abspath(
+    os.getenv("CI_BUILD_CACHE_DIR", os.path.join("ci_workspace", "buildkit-cache"))
+)
+BUILD_CACHE_MAX_BYTES = int(os.getenv("CI_BUILD_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+
+CURRENT_DIR = "current"
+META_FILE = "meta.json"
+
+
+def config_cache_key(config_id: int) -> str:
+    return f"config-{config_id}"
+
+
+@contextmanager
+def _cache_lock() -> Iterator[None]:
+    os.makedirs(BUILD_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(BUILD_CACHE_DIR, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _read_meta(key_dir: str) -> dict:
+    try:
+        with open(os.path.join(key_dir, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(key_dir: str, meta: dict):
+    tmp_path = os.path.join(key_dir, f".{META_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(key_dir, META_FILE))
+
+
+def prepare_build_cache(key: str) -> tuple[list[str], str]:
+    """
+    Returns the buildx arguments that import and export the cache for `key`,
+    and the directory the new cache is exported into. Pass that directory to
+    commit_build_cache once the build is done.
+    """
+    key_dir = os.path.join(BUILD_CACHE_DIR, key)
+    current = os.path.join(key_dir, CURRENT_DIR)
+    incoming = os.path.join(key_dir, f"incoming-{os.getpid()}-{time.time_ns()}")
+    os.makedirs(key_dir, exist_ok=True)
+
+    args = ["--cache-to", f"type=local,dest={incoming},mode=max"]
+    if os.path.isdir(current):
+        args += ["--cache-from", f"type=local,src={current}"]
+        with _cache_lock():
+            meta = _read_meta(key_dir)
+            meta["last_used"] = time.time()
+            _write_meta(key_dir, meta)
+    return args, incoming
+
+
+def commit_build_cache(key: str, incoming: str, success: bool) -> str:
+    """
+    Makes `incoming` the current cache for `key` if the build succeeded,
+    drops it otherwise, then evicts old caches. Returns a log line.
+    """
+    if not success or not os.path.isdir(incoming):
+        shutil.rmtree(incoming, ignore_errors=True)
+        return f"Build cache for {key} left unchanged.\n"
+
+    key_dir = os.path.join(BUILD_CACHE_DIR, key)
+    current = os.path.join(key_dir, CURRENT_DIR)
+    size = _directory_size(incoming)
+    with _cache_lock():
+        previous = None
+        if os.path.isdir(current):
+            previous = f"{current}-old-{time.time_ns()}"
+            os.rename(current, previous)
+        os.rename(incoming, current)
+        _write_meta(key_dir, {"size": size, "last_used": time.time()})
+    if previous:
+        shutil.rmtree(previous, ignore_errors=True)
+
+    evicted = evict_build_caches()
+    log = f"Build cache for {key} updated ({size // (1024 * 1024)} MiB).\n"
+    if evicted:
+        log += f"Evicted least recently used build caches: {', '.join(evicted)}\n"
+    return log
+
+
+def evict_build_caches(max_bytes: int = BUILD_CACHE_MAX_BYTES) -> list[str]:
+    """Removes least recently used caches until all of them fit in max_bytes."""
+    evicted = []
+    with _cache_lock():
+        entries = []
+        for key in os.listdir(BUILD_CACHE_DIR):
+            key_dir = os.path.join(BUILD_CACHE_DIR, key)
+            if not os.path.isdir(os.path.join(key_dir, CURRENT_DIR)):
+                continue
+            meta = _read_meta(key_dir)
+            if "size" not in meta:
+                meta["size"] = _directory_size(os.path.join(key_dir, CURRENT_DIR))
+            entries.append((meta.get("last_used", 0), meta["size"], key, key_dir))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, key, key_dir in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(os.path.join(key_dir, CURRENT_DIR), ignore_errors=True)
+            try:
+                os.remove(os.path.join(key_dir, META_FILE))
+            except OSError:
+                pass
+            total -= size
+            evicted.append(key)
+    return evicted
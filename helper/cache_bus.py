@@ -0,0 +1,91 @@
+"""
+Invalidation of in-process caches across every web worker through Redis
+pub/sub. Writers call publish_invalidation after changing the database, each
+process runs one CacheInvalidationListener that forwards the messages to the
+callbacks registered for the cache name.
+
+A listener that loses its Redis connection cannot know what it missed, so
+after reconnecting it clears every registered cache.
+"""
+import json
+import threading
+import time
+from typing import Callable
+
+INVALIDATION_CHANNEL = "ci:cache-invalidate"
+RECONNECT_DELAY_SECONDS = 2.0
+
+# callback(key): key is None when the whole cache has to go.
+InvalidationCallback = Callable[[str | None], None]
+
+
+def publish_invalidation(redis_client, cache: str, key: str | None = None) -> bool:
+    try:
+        redis_client.publish(
+            INVALIDATION_CHANNEL, json.dumps({"cache": cache, "key": key})
+        )
+        return True
+    except Exception as e:
+        print(f"Error publishing invalidation of cache '{cache}': {e}")
+        return False
+
+
+class CacheInvalidationListener:
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._callbacks: dict[str, list[InvalidationCallback]] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def register(self, cache: str, callback: InvalidationCallback):
+        self._callbacks.setdefault(cache, []).append(callback)
+
+    def _dispatch(self, cache: str | None, key: str | None):
+        names = [cache] if cache else list(self._callbacks)
+        for name in names:
+            for callback in self._callbacks.get(name, []):
+                try:
+                    callback(key)
+                except Exception as e:
+                    print(f"Error invalidating cache '{name}': {e}")
+
+    def _run(self):
+        connected_before = False
+        while not self._stop.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                if connected_before:
+                    self._dispatch(None, None)
+                connected_before = True
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message:
+                        continue
+                    try:
+                        data = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self._dispatch(data.get("cache"), data.get("key"))
+            except Exception as e:
+                print(f"Cache invalidation listener lost Redis: {e}")
+                time.sleep(RECONNECT_DELAY_SECONDS)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cache-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
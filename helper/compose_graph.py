@@ -0,0 +1,157 @@
+"""
+In-process view of a docker-compose file: services, the images they produce
+and the order they can be built in.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+
+import yaml
+
+_INTERPOLATION_RE = re.compile(
+    r"\$(?:(?P<escaped>\$)|\{(?P<braced>[A-Za-z_][A-Za-z0-9_]*)"
+    r"(?:(?P<op>:?[-?])(?P<default>[^}]*))?\}|(?P<named>[A-Za-z_][A-Za-z0-9_]*))"
+)
+
+
+class ComposeError(ValueError):
+    pass
+
+
+@dataclass
+class ComposeService:
+    name: str
+    image: str | None = None
+    build_context: str | None = None
+    dockerfile: str | None = None
+    depends_on: list[str] = field(default_factory=list)
+
+    @property
+    def build_key(self) -> tuple[str, str] | None:
+        if self.build_context is None:
+            return None
+        return self.build_context, self.dockerfile or "Dockerfile"
+
+
+def read_env_file(path: str) -> dict[str, str]:
+    values = {}
+    if not os.path.isfile(path):
+        return values
+    with open(path, "r", encoding="UTF-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            values[key.strip()] = value.strip().strip("'\"")
+    return values
+
+
+def interpolate(value, env: dict[str, str]):
+    """Applies compose variable substitution to every string in `value`."""
+    if isinstance(value, str):
+        def replace(match: re.Match) -> str:
+            if match.group("escaped"):
+                return "$"
+            name = match.group("braced") or match.group("named")
+            op = match.group("op")
+            current = env.get(name)
+            if op in (":-", ":?") and not current:
+                current = None
+            if current is None:
+                if op and op.endswith("?"):
+                    raise ComposeError(
+                        f"Required variable {name} is missing: {match.group('default')}"
+                    )
+                return (match.group("default") or "") if op else ""
+            return current
+        return _INTERPOLATION_RE.sub(replace, value)
+    if isinstance(value, list):
+        return [interpolate(item, env) for item in value]
+    if isinstance(value, dict):
+        return {key: interpolate(item, env) for key, item in value.items()}
+    return value
+
+
+def load_compose_services(
+    content: str,
+    project_dir: str,
+    env: dict[str, str]
+) -> dict[str, ComposeService]:
+    try:
+        document = yaml.safe_load(content) or {}
+    except yaml.YAMLError as e:
+        raise ComposeError(f"docker-compose file is not valid YAML: {e}") from e
+    services = document.get("services") if isinstance(document, dict) else None
+    if not isinstance(services, dict):
+        raise ComposeError("docker-compose file has no services")
+
+    parsed = {}
+    for name, body in services.items():
+        body = interpolate(body or {}, env)
+        service = ComposeService(name=name, image=body.get("image"))
+
+        build = body.get("build")
+        if isinstance(build, str):
+            build = {"context": build}
+        if isinstance(build, dict):
+            context = build.get("context", ".")
+            service.build_context = os.path.normpath(os.path.join(project_dir, context))
+            service.dockerfile = build.get("dockerfile")
+
+        depends_on = body.get("depends_on") or []
+        if isinstance(depends_on, dict):
+            depends_on = list(depends_on.keys())
+        service.depends_on = [dep for dep in depends_on if dep in services]
+        parsed[name] = service
+    return parsed
+
+
+def build_dependencies(services: dict[str, ComposeService]) -> dict[str, set[str]]:
+    """
+    Returns {service: services that must be built before it} for the services
+    that have a build section. Besides depends_on, services sharing a build
+    context and Dockerfile are chained, so the later ones hit the layer cache
+    instead of building the same context at the same time.
+    """
+    buildable = {name for name, service in services.items() if service.build_key}
+
+    def buildable_deps(name: str, seen: set[str]) -> set[str]:
+        deps = set()
+        for dep in services[name].depends_on:
+            if dep in seen:
+                continue
+            seen.add(dep)
+            if dep in buildable:
+                deps.add(dep)
+            else:
+                deps |= buildable_deps(dep, seen)
+        return deps
+
+    graph = {name: buildable_deps(name, {name}) for name in buildable}
+
+    first_by_key: dict[tuple[str, str], str] = {}
+    for name in topological_order(graph):
+        key = services[name].build_key
+        if key in first_by_key:
+            graph[name].add(first_by_key[key])
+        else:
+            first_by_key[key] = name
+    return graph
+
+
+def topological_order(graph: dict[str, set[str]]) -> list[str]:
+    order = []
+    remaining = {name: set(deps) for name, deps in graph.items()}
+    while remaining:
+        ready = sorted(name for name, deps in remaining.items() if not deps)
+        if not ready:
+            raise ComposeError(
+                f"depends_on forms a cycle between: {', '.join(sorted(remaining))}"
+            )
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+        order += ready
+    return order
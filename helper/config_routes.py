@@ -0,0 +1,93 @@
+"""
+In-process table from (clone url, branch) to the config a push webhook is
+for, so accepted webhooks do not query the database. Lookups that found no
+config are cached too, since pushes to unconfigured branches are the most
+common deliveries. Every config change clears the table in all processes
+through the cache invalidation bus; entries also expire after a TTL in case
+an invalidation message is missed.
+"""
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from helper.lru import TTLCache
+
+CONFIG_ROUTES_CACHE = "config_routes"
+ROUTE_TTL_SECONDS = float(os.getenv("CI_ROUTE_TTL_SECONDS", "300"))
+NEGATIVE_ROUTE_TTL_SECONDS = float(os.getenv("CI_NEGATIVE_ROUTE_TTL_SECONDS", "60"))
+ROUTE_TABLE_MAX_ENTRIES = int(os.getenv("CI_ROUTE_TABLE_MAX_ENTRIES", "10000"))
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class ConfigRoute:
+    config_id: int
+    repo_url: str
+    main_branch: str
+    docker_username: str | None
+
+
+RouteLoader = Callable[[str, str], ConfigRoute | None]
+
+
+class ConfigRouteTable:
+    def __init__(
+        self,
+        max_entries: int = ROUTE_TABLE_MAX_ENTRIES,
+        ttl: float = ROUTE_TTL_SECONDS,
+        negative_ttl: float = NEGATIVE_ROUTE_TTL_SECONDS
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that started before it is
+        # not stored afterwards.
+        self._generation = 0
+
+    def get(self, clone_url: str, branch: str) -> tuple[bool, ConfigRoute | None]:
+        """Returns (found, route); route is None for a cached negative lookup."""
+        route = self._entries.get((clone_url, branch), _MISSING)
+        if route is _MISSING:
+            return False, None
+        return True, route
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(
+        self,
+        clone_url: str,
+        branch: str,
+        route: ConfigRoute | None,
+        generation: int
+    ):
+        ttl = self.ttl if route else self.negative_ttl
+        with self._lock:
+            if generation == self._generation:
+                self._entries.set((clone_url, branch), route, ttl=ttl)
+
+    def lookup(
+        self,
+        clone_url: str,
+        branch: str,
+        loader: RouteLoader
+    ) -> ConfigRoute | None:
+        """Cached route, or the loader's answer which is then cached. Blocking."""
+        found, route = self.get(clone_url, branch)
+        if found:
+            return route
+        generation = self.generation()
+        route = loader(clone_url, branch)
+        self.put(clone_url, branch, route, generation)
+        return route
+
+    def invalidate(self, key: str | None = None):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+config_routes = ConfigRouteTable()
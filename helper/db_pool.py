@@ -0,0 +1,187 @@
+"""
+Connection pool profiles per process role, and pool metrics.
+
+CI_DB_ROLE picks the profile. "web" is the API server, where every request
+shares the process's pools. "worker" is a Celery prefork child or the webhook
+dispatcher. Such a process runs one task at a time, so a couple of
+connections are enough, but Postgres sees processes x (pool size + overflow)
+of them. CI_DB_POOL_SIZE, CI_DB_MAX_OVERFLOW, CI_DB_POOL_TIMEOUT,
+CI_DB_POOL_RECYCLE and CI_DB_POOL_PRE_PING override the profile's values.
+
+The pool classes here time every checkout. pool_status() reports the waits,
+timeouts and connections in use. Workers publish theirs to Redis with
+publish_pool_metrics(), so the API can report every process.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, replace
+
+import redis
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+DB_METRICS_KEY_PREFIX = "ci:db-pool:"
+DB_METRICS_INTERVAL = float(os.getenv("CI_DB_METRICS_INTERVAL", "15"))
+# Upper bounds, in seconds, of the checkout wait histogram buckets.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+@dataclass(frozen=True)
+class PoolProfile:
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float
+    pool_recycle: int
+    pool_pre_ping: bool = True
+
+    @property
+    def max_connections(self) -> int:
+        return self.pool_size + self.max_overflow
+
+    def engine_kwargs(self) -> dict:
+        return asdict(self)
+
+
+POOL_PROFILES = {
+    "web": PoolProfile(
+        pool_size=10, max_overflow=10, pool_timeout=10, pool_recycle=1800
+    ),
+    "worker": PoolProfile(
+        pool_size=2, max_overflow=2, pool_timeout=30, pool_recycle=1800
+    ),
+}
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+_PROFILE_OVERRIDES = (
+    ("pool_size", "CI_DB_POOL_SIZE", int),
+    ("max_overflow", "CI_DB_MAX_OVERFLOW", int),
+    ("pool_timeout", "CI_DB_POOL_TIMEOUT", float),
+    ("pool_recycle", "CI_DB_POOL_RECYCLE", int),
+    ("pool_pre_ping", "CI_DB_POOL_PRE_PING", _flag),
+)
+
+
+def pool_profile(role: str) -> PoolProfile:
+    """The role's profile with the CI_DB_* overrides applied."""
+    if role not in POOL_PROFILES:
+        raise ValueError(
+            f"Unknown CI_DB_ROLE '{role}', expected one of {', '.join(POOL_PROFILES)}"
+        )
+    overrides = {
+        name: cast(os.environ[env])
+        for name, env, cast in _PROFILE_OVERRIDES
+        if os.getenv(env)
+    }
+    return replace(POOL_PROFILES[role], **overrides)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, wait: float, checked_out: int):
+        with self._lock:
+            self.checkouts += 1
+            self._observe_wait(wait)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def observe_timeout(self, wait: float):
+        with self._lock:
+            self.timeouts += 1
+            self._observe_wait(wait)
+
+    def _observe_wait(self, wait: float):
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.wait_buckets[bisect_left(WAIT_BUCKETS, wait)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "peak_checked_out": self.peak_checked_out,
+                "wait_seconds": {
+                    "mean": self.wait_total / waits if waits else 0.0,
+                    "max": self.wait_max,
+                    "buckets": {
+                        str(bound): count
+                        for bound, count in zip(
+                            WAIT_BUCKETS + ("+Inf",), self.wait_buckets
+                        )
+                    },
+                },
+            }
+
+
+class _TimedPoolMixin:
+    """Times connect(), from the request to a usable connection (including pre-ping)."""
+    metrics: PoolMetrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.observe_timeout(time.perf_counter() - started)
+            raise
+        self.metrics.observe(time.perf_counter() - started, self.checkedout())
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(pool: Pool) -> dict:
+    """Connections of the pool right now, and its checkout metrics if it is timed."""
+    status = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+    status["open"] = status["checked_out"] + status["checked_in"]
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
+
+
+def publish_pool_metrics(redis_client: redis.Redis, process: str, metrics: dict):
+    """Stores a process's metrics; they expire unless published again."""
+    redis_client.set(
+        DB_METRICS_KEY_PREFIX + process,
+        json.dumps({**metrics, "process": process, "published_at": time.time()}),
+        ex=int(DB_METRICS_INTERVAL * 4) or 60
+    )
+
+
+def collect_pool_metrics(redis_client: redis.Redis) -> list[dict]:
+    """The latest metrics published by every live process."""
+    keys = sorted(redis_client.scan_iter(match=DB_METRICS_KEY_PREFIX + "*", count=500))
+    if not keys:
+        return []
+    return [json.loads(value) for value in redis_client.mget(keys) if value]
@@ -0,0 +1,57 @@
+"""
+Idempotency of push webhooks by X-GitHub-Delivery. GitHub redelivers on
+timeouts and users redeliver by hand, both with the original delivery id.
+
+The first delivery claims ci:delivery:<id> with SET NX and a TTL covering
+GitHub's redelivery window. The key holds "queued" until process_push has
+created the run, and the run id afterwards. Later deliveries with the same
+id find the key and get the run id back instead of queuing another run.
+"""
+import os
+
+DELIVERY_TTL_SECONDS = int(os.getenv("CI_DELIVERY_TTL_SECONDS", str(3 * 24 * 3600)))
+QUEUED = "queued"
+
+
+def delivery_key(delivery_id: str) -> str:
+    return f"ci:delivery:{delivery_id}"
+
+
+def claim_delivery(redis_client, delivery_id: str | None) -> tuple[bool, int | None]:
+    """
+    Returns (claimed, pipeline id). Not claimed means the delivery was seen
+    before; the pipeline id is None while its run has not been created yet.
+    Without Redis or a delivery id every delivery is claimed.
+    """
+    if redis_client is None or not delivery_id:
+        return True, None
+    key = delivery_key(delivery_id)
+    try:
+        if redis_client.set(key, QUEUED, nx=True, ex=DELIVERY_TTL_SECONDS):
+            return True, None
+        existing = redis_client.get(key)
+    except Exception as e:
+        print(f"Error checking delivery {delivery_id}: {e}")
+        return True, None
+    return False, int(existing) if existing and existing.isdigit() else None
+
+
+def release_delivery(redis_client, delivery_id: str | None):
+    """Forgets a claim whose run could not be queued, so a redelivery can retry."""
+    if redis_client is None or not delivery_id:
+        return
+    try:
+        redis_client.delete(delivery_key(delivery_id))
+    except Exception as e:
+        print(f"Error releasing delivery {delivery_id}: {e}")
+
+
+def record_delivery_run(redis_client, delivery_id: str | None, pipeline_id: int):
+    if redis_client is None or not delivery_id:
+        return
+    try:
+        redis_client.set(
+            delivery_key(delivery_id), pipeline_id, ex=DELIVERY_TTL_SECONDS
+        )
+    except Exception as e:
+        print(f"Error recording run of delivery {delivery_id}: {e}")
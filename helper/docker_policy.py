@@ -0,0 +1,402 @@
+"""
+Safety policy for the Dockerfiles and docker-compose files a pipeline builds.
+
+Rules are compiled once at import. A Dockerfile is split into instructions
+(continuation lines, comments and heredocs are handled) and every instruction
+is matched against a single combined regex for its keyword, so adding rules
+does not add passes over the file. Compose files are parsed with PyYAML and
+every service key is dispatched to the rules registered for that key.
+"""
+import hashlib
+import re
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+import yaml
+
+ERROR = "error"
+WARNING = "warning"
+
+
+@dataclass(frozen=True)
+class Finding:
+    rule_id: str
+    severity: str
+    line: int
+    message: str
+    snippet: str = ""
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def format(self, file_name: str) -> str:
+        text = f"{file_name}:{self.line} [{self.severity}] {self.rule_id}: {self.message}"
+        if self.snippet:
+            text += f"\n    {self.snippet}"
+        return text
+
+
+@dataclass(frozen=True)
+class DockerfileRule:
+    rule_id: str
+    pattern: str
+    message: str
+    severity: str = ERROR
+    # Instruction keywords the rule applies to, None for every instruction.
+    instructions: tuple[str, ...] | None = None
+
+
+DOCKERFILE_RULES = [
+    DockerfileRule(
+        "docker-socket",
+        r"docker\.sock",
+        "Accessing the Docker socket gives the build control of the host."
+    ),
+    DockerfileRule(
+        "privileged",
+        r"privileged",
+        "Privileged mode is not allowed."
+    ),
+    DockerfileRule(
+        "cap-add",
+        r"--cap-add",
+        "Adding kernel capabilities is not allowed."
+    ),
+    DockerfileRule(
+        "insecure-security-mode",
+        r"--security=insecure",
+        "Insecure RUN security mode is not allowed.",
+        instructions=("RUN",)
+    ),
+    DockerfileRule(
+        "add-remote-url",
+        r"^(?:--\S+\s+)*https?://",
+        "ADD from a remote URL is not allowed, download and verify it in RUN.",
+        instructions=("ADD",)
+    ),
+    DockerfileRule(
+        "curl-pipe",
+        r"\bcurl\b[^|]*\|",
+        "Piping downloaded content into another command is not allowed.",
+        instructions=("RUN",)
+    ),
+    DockerfileRule(
+        "wget-pipe",
+        r"\bwget\b[^|]*\|",
+        "Piping downloaded content into another command is not allowed.",
+        instructions=("RUN",)
+    ),
+    DockerfileRule(
+        "chmod-777",
+        r"\bchmod\s+(?:-\w+\s+)*0?777\b",
+        "World-writable permissions (chmod 777) are not allowed."
+    ),
+    DockerfileRule(
+        "chown-root",
+        r"\bchown\s+(?:-\w+\s+)*root\b",
+        "Changing ownership to root is not allowed."
+    ),
+    DockerfileRule(
+        "user-root",
+        r"^root(?::\S+)?\s*$",
+        "The image runs as root, consider a dedicated user.",
+        severity=WARNING,
+        instructions=("USER",)
+    ),
+]
+
+_ANY_INSTRUCTION = "*"
+_INSTRUCTION_RE = re.compile(r"^\s*([A-Za-z]+)\s*(.*)$", re.DOTALL)
+# BuildKit heredocs: a word starting with <<, only on these instructions.
+_HEREDOC_INSTRUCTIONS = ("RUN", "COPY", "ADD")
+_HEREDOC_RE = re.compile(r"(?:^|(?<=\s))\d*<<-?[\"']?(\w+)[\"']?")
+_ARITHMETIC_RE = re.compile(r"\$\(\(.*?\)\)")
+_ESCAPE_DIRECTIVE_RE = re.compile(r"^#\s*escape\s*=\s*([\\`])\s*$", re.IGNORECASE)
+
+
+def _compile_dockerfile_rules(
+    rules: list[DockerfileRule]
+) -> tuple[dict[str, re.Pattern], dict[str, DockerfileRule]]:
+    by_group = {f"r{index}": rule for index, rule in enumerate(rules)}
+    keywords = {_ANY_INSTRUCTION}
+    for rule in rules:
+        keywords.update(rule.instructions or ())
+
+    compiled = {}
+    for keyword in keywords:
+        # Lookaheads keep a long match from hiding a rule that starts inside it.
+        parts = [
+            f"(?=(?P<{group}>{rule.pattern}))"
+            for group, rule in by_group.items()
+            if rule.instructions is None or keyword in rule.instructions
+        ]
+        compiled[keyword] = re.compile("|".join(parts), re.IGNORECASE | re.MULTILINE)
+    return compiled, by_group
+
+
+_DOCKERFILE_MATCHERS, _DOCKERFILE_GROUPS = _compile_dockerfile_rules(DOCKERFILE_RULES)
+
+
+def _heredoc_terminators(text: str) -> list[str]:
+    keyword = text.split(None, 1)[0].upper() if text.strip() else ""
+    if keyword not in _HEREDOC_INSTRUCTIONS:
+        return []
+    return _HEREDOC_RE.findall(_ARITHMETIC_RE.sub("", text))
+
+
+def _dockerfile_instructions(content: str) -> list[tuple[int, str, str]]:
+    """
+    Splits a Dockerfile into (first line number, KEYWORD, arguments).
+    Continuation lines are joined, comment lines are skipped and heredoc
+    bodies are kept with the instruction that opened them.
+    """
+    lines = content.splitlines()
+    escape = "\\"
+    for line in lines:
+        if not line.strip():
+            continue
+        directive = _ESCAPE_DIRECTIVE_RE.match(line.strip())
+        if directive:
+            escape = directive.group(1)
+        if not line.lstrip().startswith("#"):
+            break
+
+    instructions = []
+    index = 0
+    while index < len(lines):
+        stripped = lines[index].strip()
+        if not stripped or stripped.startswith("#"):
+            index += 1
+            continue
+
+        start_line = index + 1
+        parts = []
+        while True:
+            line = lines[index].rstrip()
+            index += 1
+            if line.endswith(escape):
+                parts.append(line[:-1])
+                while index < len(lines) and lines[index].lstrip().startswith("#"):
+                    index += 1
+                if index < len(lines):
+                    continue
+            else:
+                parts.append(line)
+            break
+        text = " ".join(part.strip() for part in parts)
+
+        for terminator in _heredoc_terminators(text):
+            # Without its terminator line it is no heredoc, the lines after
+            # it are instructions again.
+            end = next(
+                (
+                    position for position in range(index, len(lines))
+                    if lines[position].strip() == terminator
+                ),
+                None
+            )
+            if end is None:
+                break
+            text += "\n" + "\n".join(lines[index:end])
+            index = end + 1
+
+        match = _INSTRUCTION_RE.match(text)
+        if match:
+            instructions.append((start_line, match.group(1).upper(), match.group(2)))
+    return instructions
+
+
+def scan_dockerfile(content: str) -> list[Finding]:
+    findings = []
+    for line, keyword, arguments in _dockerfile_instructions(content):
+        matcher = _DOCKERFILE_MATCHERS.get(
+            keyword, _DOCKERFILE_MATCHERS[_ANY_INSTRUCTION]
+        )
+        reported = set()
+        for match in matcher.finditer(arguments):
+            rule = _DOCKERFILE_GROUPS[match.lastgroup]
+            if rule.rule_id in reported:
+                continue
+            reported.add(rule.rule_id)
+            offset = arguments.count("\n", 0, match.start())
+            snippet = f"{keyword} {arguments}".split("\n")[offset].strip()
+            findings.append(Finding(
+                rule.rule_id, rule.severity, line + offset, rule.message, snippet[:200]
+            ))
+    return findings
+
+
+@dataclass(frozen=True)
+class ComposeRule:
+    rule_id: str
+    # Service key the rule looks at, e.g. "privileged" or "volumes".
+    key: str
+    check: Callable[[object], bool]
+    message: str
+    severity: str = ERROR
+
+
+def _is_true(value) -> bool:
+    return value is True or str(value).lower() in ("true", "yes", "on", "1")
+
+
+def _mounts_docker_socket(volumes) -> bool:
+    for volume in volumes or []:
+        source = volume.get("source", "") if isinstance(volume, dict) else str(volume)
+        if "docker.sock" in str(source):
+            return True
+    return False
+
+
+def _contains_unconfined(options) -> bool:
+    return any("unconfined" in str(option) for option in options or [])
+
+
+COMPOSE_RULES = [
+    ComposeRule("privileged", "privileged", _is_true, "Privileged mode is not allowed."),
+    ComposeRule(
+        "docker-socket", "volumes", _mounts_docker_socket,
+        "Mounting the Docker socket gives the service control of the host."
+    ),
+    ComposeRule(
+        "cap-add", "cap_add", bool,
+        "Adding kernel capabilities is not allowed."
+    ),
+    ComposeRule(
+        "host-network", "network_mode", lambda value: str(value) == "host",
+        "Host networking is not allowed."
+    ),
+    ComposeRule(
+        "host-pid", "pid", lambda value: str(value) == "host",
+        "Sharing the host PID namespace is not allowed."
+    ),
+    ComposeRule(
+        "host-ipc", "ipc", lambda value: str(value) == "host",
+        "Sharing the host IPC namespace is not allowed."
+    ),
+    ComposeRule(
+        "unconfined-security-opt", "security_opt", _contains_unconfined,
+        "Disabling seccomp or AppArmor is not allowed."
+    ),
+    ComposeRule(
+        "devices", "devices", bool,
+        "The service gets direct access to host devices.",
+        severity=WARNING
+    ),
+]
+
+_COMPOSE_RULES_BY_KEY: dict[str, list[ComposeRule]] = {}
+for _rule in COMPOSE_RULES:
+    _COMPOSE_RULES_BY_KEY.setdefault(_rule.key, []).append(_rule)
+
+
+def _node_value(node: yaml.Node):
+    loader = yaml.SafeLoader("")
+    try:
+        return loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
+_MERGE_TAG = "tag:yaml.org,2002:merge"
+
+
+def _mapping_items(node: yaml.MappingNode, _merging: frozenset = frozenset()):
+    """
+    (key node, value node) pairs of a mapping with `<<` merge keys expanded,
+    the way a YAML loader resolves them: explicit keys win over merged ones
+    and earlier merged mappings over later ones. Aliases are already the
+    anchored node after composing, so merged keys keep their own line.
+    """
+    seen = set()
+    merged = []
+    for key_node, value_node in node.value:
+        if key_node.tag == _MERGE_TAG:
+            sources = (
+                value_node.value if isinstance(value_node, yaml.SequenceNode)
+                else [value_node]
+            )
+            merged += [
+                source for source in sources
+                if isinstance(source, yaml.MappingNode) and id(source) not in _merging
+            ]
+            continue
+        seen.add(key_node.value)
+        yield key_node, value_node
+    # A mapping can merge itself through an alias, don't follow it twice.
+    _merging = _merging | {id(node)}
+    for source in merged:
+        for key_node, value_node in _mapping_items(source, _merging):
+            if key_node.value not in seen:
+                seen.add(key_node.value)
+                yield key_node, value_node
+
+
+def scan_compose_file(content: str) -> list[Finding]:
+    try:
+        root = yaml.compose(content, Loader=yaml.SafeLoader)
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        return [Finding(
+            "invalid-yaml", ERROR, mark.line + 1 if mark else 1,
+            f"docker-compose file is not valid YAML: {e}"
+        )]
+    if not isinstance(root, yaml.MappingNode):
+        return []
+
+    services = next(
+        (value for key, value in _mapping_items(root) if key.value == "services"),
+        None
+    )
+    if services is None:
+        # Compose v1 files have no services key, every top-level entry is one.
+        services = root
+    if not isinstance(services, yaml.MappingNode):
+        return []
+
+    findings = []
+    for service_node, service_body in _mapping_items(services):
+        if not isinstance(service_body, yaml.MappingNode):
+            continue
+        for option_node, option_value in _mapping_items(service_body):
+            rules = _COMPOSE_RULES_BY_KEY.get(option_node.value)
+            if not rules:
+                continue
+            value = _node_value(option_value)
+            for rule in rules:
+                if rule.check(value):
+                    findings.append(Finding(
+                        rule.rule_id,
+                        rule.severity,
+                        option_node.start_mark.line + 1,
+                        f"Service '{service_node.value}': {rule.message}",
+                        f"{option_node.value}: {value}"[:200]
+                    ))
+    return findings
+
+
+def scan_pipeline_content(file_type: str, content: str) -> list[Finding]:
+    if file_type == "compose":
+        return scan_compose_file(content)
+    return scan_dockerfile(content)
+
+
+def has_blocking_findings(findings: list[Finding]) -> bool:
+    return any(finding.severity == ERROR for finding in findings)
+
+
+# Bump when the scanners change how they read files, e.g. merge key handling,
+# so verdicts cached by an older scanner are not reused.
+SCANNER_VERSION = 4
+
+
+def _rules_version() -> str:
+    spec = str(SCANNER_VERSION) + repr([
+        (rule.rule_id, rule.pattern, rule.severity, rule.instructions)
+        for rule in DOCKERFILE_RULES
+    ]) + repr([(rule.rule_id, rule.key, rule.severity) for rule in COMPOSE_RULES])
+    return hashlib.sha1(spec.encode()).hexdigest()[:12]
+
+
+# Part of the scan cache key, changes whenever a rule changes.
+RULES_VERSION = _rules_version()
@@ -0,0 +1,134 @@
+"""
+Strike counting and IP bans for the firewall middleware.
+
+An IP that makes FIREWALL_MAX_ATTEMPTS suspicious requests within
+FIREWALL_WINDOW_SECONDS is banned for FIREWALL_BLOCK_SECONDS. Two stores:
+
+- memory: per process, in bounded LRU caches whose entries expire, so a scan
+  from many addresses cannot grow memory without limit.
+- redis: a sliding window per IP in a sorted set, updated by one Lua script,
+  so a ban applies to every web worker. Bans already seen are remembered
+  locally until they expire; if Redis fails the store falls back to memory.
+
+CI_FIREWALL_STORE picks the store, memory by default.
+"""
+import os
+import time
+import uuid
+from collections import deque
+
+from helper.lru import TTLCache
+
+FIREWALL_STORE = os.getenv("CI_FIREWALL_STORE", "memory").lower()
+FIREWALL_MAX_ATTEMPTS = int(os.getenv("CI_FIREWALL_MAX_ATTEMPTS", "5"))
+FIREWALL_WINDOW_SECONDS = int(os.getenv("CI_FIREWALL_WINDOW_SECONDS", "60"))
+FIREWALL_BLOCK_SECONDS = int(os.getenv("CI_FIREWALL_BLOCK_SECONDS", "7200"))
+FIREWALL_MAX_TRACKED_IPS = int(os.getenv("CI_FIREWALL_MAX_TRACKED_IPS", "100000"))
+
+# KEYS: strikes, ban. ARGV: now ms, window ms, max attempts, block ms, member
+_STRIKE_SCRIPT = """
+local max_attempts = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[5])
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(max_attempts + 1))
+if redis.call('ZCARD', KEYS[1]) >= max_attempts then
+    redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[4])
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 0
+"""
+
+
+class MemoryFirewallStore:
+    def __init__(
+        self,
+        max_attempts: int = FIREWALL_MAX_ATTEMPTS,
+        window: float = FIREWALL_WINDOW_SECONDS,
+        block_seconds: float = FIREWALL_BLOCK_SECONDS,
+        max_ips: int = FIREWALL_MAX_TRACKED_IPS
+    ):
+        self.max_attempts = max_attempts
+        self.window = window
+        # Only the last max_attempts strikes of an IP matter.
+        self._strikes = TTLCache(max_ips, window)
+        self._banned = TTLCache(max_ips, block_seconds)
+
+    async def is_blocked(self, ip: str) -> bool:
+        return self._banned.get(ip, False)
+
+    async def record_strike(self, ip: str) -> bool:
+        """Counts a suspicious request. Returns True if the IP is now banned."""
+        now = time.monotonic()
+        strikes = self._strikes.get(ip)
+        if strikes is None:
+            strikes = deque(maxlen=self.max_attempts)
+        strikes.append(now)
+        if len(strikes) >= self.max_attempts and now - strikes[0] < self.window:
+            self._strikes.pop(ip)
+            self._banned.set(ip, True)
+            return True
+        self._strikes.set(ip, strikes)
+        return False
+
+
+class RedisFirewallStore:
+    def __init__(
+        self,
+        redis_client,
+        max_attempts: int = FIREWALL_MAX_ATTEMPTS,
+        window: float = FIREWALL_WINDOW_SECONDS,
+        block_seconds: float = FIREWALL_BLOCK_SECONDS,
+        max_ips: int = FIREWALL_MAX_TRACKED_IPS
+    ):
+        """`redis_client` is a redis.asyncio client."""
+        self.redis = redis_client
+        self.max_attempts = max_attempts
+        self.window_ms = int(window * 1000)
+        self.block_ms = int(block_seconds * 1000)
+        self._known_bans = TTLCache(max_ips, block_seconds)
+        self.fallback = MemoryFirewallStore(max_attempts, window, block_seconds, max_ips)
+
+    @staticmethod
+    def _keys(ip: str) -> list[str]:
+        return [f"ci:firewall:strikes:{ip}", f"ci:firewall:ban:{ip}"]
+
+    async def is_blocked(self, ip: str) -> bool:
+        if self._known_bans.get(ip, False):
+            return True
+        try:
+            remaining_ms = await self.redis.pttl(self._keys(ip)[1])
+        except Exception as e:
+            print(f"[FIREWALL] Redis unavailable, using local bans: {e}")
+            return await self.fallback.is_blocked(ip)
+        if remaining_ms > 0:
+            self._known_bans.set(ip, True, ttl=remaining_ms / 1000)
+            return True
+        return False
+
+    async def record_strike(self, ip: str) -> bool:
+        try:
+            banned = await self.redis.eval(
+                _STRIKE_SCRIPT, 2, *self._keys(ip),
+                int(time.time() * 1000), self.window_ms, self.max_attempts,
+                self.block_ms, uuid.uuid4().hex
+            )
+        except Exception as e:
+            print(f"[FIREWALL] Redis unavailable, counting strikes locally: {e}")
+            return await self.fallback.record_strike(ip)
+        if banned:
+            self._known_bans.set(ip, True)
+        return bool(banned)
+
+
+def create_firewall_store(redis_url: str | None = None):
+    if FIREWALL_STORE == "redis":
+        import redis.asyncio as aioredis
+        return RedisFirewallStore(
+            aioredis.from_url(
+                redis_url or os.getenv("REDIS_HOST", "redis://localhost:6379/0"),
+                decode_responses=True
+            )
+        )
+    return MemoryFirewallStore()
@@ -0,0 +1,211 @@
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+MIRRORS_DIR = "mirrors"
+RUNS_DIR = "runs"
+
+RunCommand = Callable[..., tuple[bool, str]]
+
+
+def normalize_repo_url(repo_url: str) -> str:
+    """
+    Reduces the different spellings of a repository URL to one key, so
+    https://github.com/Owner/Repo.git, git@github.com:Owner/Repo and
+    https://user@github.com/Owner/Repo/ all share a mirror.
+    """
+    url = repo_url.strip()
+    scp_like = re.match(r"^[\w.-]+@([^:/]+):(.+)$", url)
+    if scp_like:
+        host, path = scp_like.groups()
+    else:
+        url = re.sub(r"^[a-z+]+://", "", url, flags=re.IGNORECASE)
+        url = url.split("@", 1)[-1]
+        host, _, path = url.partition("/")
+        host = host.split(":", 1)[0]
+    path = path.strip("/")
+    if path.endswith(".git"):
+        path = path[:-4]
+    return f"{host.lower()}/{path}"
+
+
+def mirror_path(workspace_dir: str, repo_url: str) -> str:
+    key = normalize_repo_url(repo_url)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", key.rsplit("/", 1)[-1])
+    return os.path.abspath(
+        os.path.join(workspace_dir, MIRRORS_DIR, f"{name}-{digest}.git")
+    )
+
+
+def run_worktree_path(workspace_dir: str, run_id: int) -> str:
+    return os.path.abspath(os.path.join(workspace_dir, RUNS_DIR, str(run_id)))
+
+
+@contextmanager
+def mirror_lock(mirror_dir: str) -> Iterator[None]:
+    """Serializes fetches and worktree changes on one mirror within this host."""
+    os.makedirs(os.path.dirname(mirror_dir), exist_ok=True)
+    with open(f"{mirror_dir}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def update_mirror(
+    run_command: RunCommand,
+    repo_url: str,
+    mirror_dir: str,
+    env: dict | None = None,
+    on_output: Callable[[str], None] | None = None
+) -> tuple[bool, str]:
+    """
+    Creates the bare mirror of `repo_url` on first use and fetches it afterwards.
+    Only branches and tags are mirrored, not pull request refs.
+    Must be called while holding mirror_lock(mirror_dir).
+    """
+    logs = ""
+    if not os.path.isdir(mirror_dir):
+        success, log = run_command(
+            ["git", "clone", "--bare", repo_url, mirror_dir],
+            env=env,
+            on_output=on_output
+        )
+        logs += log + "\n"
+        if not success:
+            shutil.rmtree(mirror_dir, ignore_errors=True)
+            return False, logs
+        run_command(
+            [
+                "git", "config", "remote.origin.fetch",
+                "+refs/heads/*:refs/heads/*"
+            ],
+            working_dir=mirror_dir
+        )
+    else:
+        # Keep the URL in the form (https or ssh) the current config uses.
+        run_command(
+            ["git", "remote", "set-url", "origin", repo_url],
+            working_dir=mirror_dir
+        )
+
+    success, log = run_command(
+        [
+            "git", "fetch", "--prune", "--tags", "origin",
+            "+refs/heads/*:refs/heads/*"
+        ],
+        working_dir=mirror_dir,
+        env=env,
+        on_output=on_output
+    )
+    logs += log + "\n"
+    return success, logs
+
+
+def add_worktree(
+    run_command: RunCommand,
+    mirror_dir: str,
+    worktree_dir: str,
+    revision: str,
+    env: dict | None = None,
+    on_output: Callable[[str], None] | None = None
+) -> tuple[bool, str]:
+    """
+    Checks `revision` out into a new detached worktree of the mirror.
+    If the commit is not reachable from any branch any more (for example after
+    a force push) it is fetched from origin directly.
+    Must be called while holding mirror_lock(mirror_dir).
+    """
+    logs = ""
+    if os.path.exists(worktree_dir):
+        remove_worktree(run_command, mirror_dir, worktree_dir)
+    os.makedirs(os.path.dirname(worktree_dir), exist_ok=True)
+
+    has_revision, _ = run_command(
+        ["git", "cat-file", "-e", f"{revision}^{{commit}}"],
+        working_dir=mirror_dir
+    )
+    if not has_revision:
+        success, log = run_command(
+            ["git", "fetch", "origin", revision],
+            working_dir=mirror_dir,
+            env=env,
+            on_output=on_output
+        )
+        logs += log + "\n"
+        if not success:
+            return False, logs
+
+    success, log = run_command(
+        ["git", "worktree", "add", "--detach", worktree_dir, revision],
+        working_dir=mirror_dir,
+        on_output=on_output
+    )
+    logs += log + "\n"
+    return success, logs
+
+
+def shallow_fetch(
+    run_command: RunCommand,
+    repo_url: str,
+    checkout_dir: str,
+    revision: str,
+    fetch_filter: str | None = None,
+    env: dict | None = None,
+    on_output: Callable[[str], None] | None = None
+) -> tuple[bool, str]:
+    """
+    Fetches only `revision` at depth 1 into an empty `checkout_dir` and checks
+    it out. `fetch_filter` (e.g. "blob:none") turns the fetch into a partial
+    clone, so blobs are only downloaded when the checkout needs them.
+    """
+    logs = ""
+    if os.path.exists(checkout_dir):
+        shutil.rmtree(checkout_dir, ignore_errors=True)
+    os.makedirs(checkout_dir)
+
+    fetch_command = ["git", "fetch", "--depth", "1", "--no-tags"]
+    if fetch_filter:
+        fetch_command.append(f"--filter={fetch_filter}")
+    fetch_command += ["origin", revision]
+
+    steps = [
+        (["git", "init", "--quiet"], None),
+        (["git", "remote", "add", "origin", repo_url], None),
+        (fetch_command, env),
+        (["git", "checkout", "--quiet", "--detach", "FETCH_HEAD"], env),
+    ]
+    for command, command_env in steps:
+        success, log = run_command(
+            command,
+            working_dir=checkout_dir,
+            env=command_env,
+            on_output=on_output
+        )
+        logs += log + "\n"
+        if not success:
+            return False, logs
+    return True, logs
+
+
+def is_shallow_checkout(checkout_dir: str) -> bool:
+    # Worktrees have a .git file pointing at the mirror, own checkouts a .git dir.
+    return os.path.isdir(os.path.join(checkout_dir, ".git"))
+
+
+def remove_worktree(run_command: RunCommand, mirror_dir: str, worktree_dir: str):
+    if os.path.isdir(mirror_dir):
+        run_command(
+            ["git", "worktree", "remove", "--force", worktree_dir],
+            working_dir=mirror_dir
+        )
+    if os.path.exists(worktree_dir):
+        shutil.rmtree(worktree_dir, ignore_errors=True)
+    if os.path.isdir(mirror_dir):
+        run_command(["git", "worktree", "prune"], working_dir=mirror_dir)
@@ -0,0 +1,227 @@
+"""
+Archive of finished pipeline run logs on disk.
+
+A run's log is split at line boundaries into gzip segments of about
+CI_LOG_SEGMENT_BYTES (uncompressed) under CI_LOG_DIR/<run id / 1000>/<run id>/.
+index.json next to them records where every segment starts in bytes, in
+characters and in lines, so a byte range, a character range or the last N
+lines can be served by decompressing only the segments they overlap, one
+block at a time. The directory is written under a temporary name and renamed
+when complete, so readers never see half an archive.
+"""
+import codecs
+import gzip
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, Iterator
+
+LOG_DIR = os.getenv("CI_LOG_DIR", "pipeline_logs")
+LOG_SEGMENT_BYTES = int(os.getenv("CI_LOG_SEGMENT_BYTES", str(1024 * 1024)))
+LOG_COMPRESSION_LEVEL = int(os.getenv("CI_LOG_COMPRESSION_LEVEL", "6"))
+READ_BLOCK_BYTES = 64 * 1024
+INDEX_FILE = "index.json"
+
+
+@dataclass
+class LogSegment:
+    file: str
+    byte_offset: int
+    size: int
+    char_offset: int
+    chars: int
+    first_line: int
+    lines: int
+
+
+@dataclass
+class LogIndex:
+    run_id: int
+    path: str
+    size: int = 0
+    chars: int = 0
+    lines: int = 0
+    segments: list[LogSegment] = field(default_factory=list)
+
+
+def run_log_dir(run_id: int, base_dir: str = LOG_DIR) -> str:
+    return os.path.join(base_dir, f"{run_id // 1000:06d}", str(run_id))
+
+
+class _SegmentWriter:
+    def __init__(self, index: LogIndex, directory: str):
+        self.index = index
+        self.directory = directory
+        self.segment: LogSegment | None = None
+        self.file = None
+
+    def write_line(self, line: str):
+        if self.segment is None:
+            self._open()
+        data = line.encode("utf-8")
+        self.file.write(data)
+        self.segment.size += len(data)
+        self.segment.chars += len(line)
+        self.segment.lines += 1
+        self.index.size += len(data)
+        self.index.chars += len(line)
+        self.index.lines += 1
+        if self.segment.size >= LOG_SEGMENT_BYTES:
+            self.close()
+
+    def _open(self):
+        name = f"seg-{len(self.index.segments):05d}.log.gz"
+        self.segment = LogSegment(
+            file=name,
+            byte_offset=self.index.size,
+            size=0,
+            char_offset=self.index.chars,
+            chars=0,
+            first_line=self.index.lines,
+            lines=0
+        )
+        self.file = gzip.open(
+            os.path.join(self.directory, name),
+            "wb",
+            compresslevel=LOG_COMPRESSION_LEVEL
+        )
+
+    def close(self):
+        if self.segment is None:
+            return
+        self.file.close()
+        self.index.segments.append(self.segment)
+        self.segment = None
+        self.file = None
+
+
+def write_run_log(
+    run_id: int,
+    pieces: Iterable[str],
+    base_dir: str = LOG_DIR
+) -> LogIndex:
+    """Compresses the log given as consecutive pieces of text, replacing any archive."""
+    final_dir = run_log_dir(run_id, base_dir)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    index = LogIndex(run_id=run_id, path=final_dir)
+    writer = _SegmentWriter(index, tmp_dir)
+    try:
+        pending = ""
+        for piece in pieces:
+            *lines, pending = (pending + piece).split("\n")
+            for line in lines:
+                writer.write_line(line + "\n")
+        if pending:
+            writer.write_line(pending)
+        writer.close()
+
+        with open(os.path.join(tmp_dir, INDEX_FILE), "w", encoding="UTF-8") as f:
+            json.dump({**asdict(index), "path": None}, f)
+        if os.path.isdir(final_dir):
+            shutil.rmtree(final_dir)
+        os.replace(tmp_dir, final_dir)
+    except Exception:
+        if writer.file:
+            writer.file.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return index
+
+
+def load_log_index(run_id: int, base_dir: str = LOG_DIR) -> LogIndex | None:
+    """The run's archive index, or None if its log was not archived."""
+    directory = run_log_dir(run_id, base_dir)
+    try:
+        with open(os.path.join(directory, INDEX_FILE), "r", encoding="UTF-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    data["path"] = directory
+    data["segments"] = [LogSegment(**segment) for segment in data["segments"]]
+    return LogIndex(**data)
+
+
+def remove_run_log(run_id: int, base_dir: str = LOG_DIR):
+    shutil.rmtree(run_log_dir(run_id, base_dir), ignore_errors=True)
+
+
+def _read_segment(
+    index: LogIndex,
+    segment: LogSegment,
+    skip: int = 0
+) -> Iterator[bytes]:
+    """Decompressed blocks of a segment, starting `skip` bytes into it."""
+    with gzip.open(os.path.join(index.path, segment.file), "rb") as f:
+        if skip:
+            f.seek(skip)
+        while block := f.read(READ_BLOCK_BYTES):
+            yield block
+
+
+def iter_bytes(
+    index: LogIndex,
+    start: int = 0,
+    end: int | None = None
+) -> Iterator[bytes]:
+    """Bytes [start, end) of the log."""
+    end = index.size if end is None else min(end, index.size)
+    for segment in index.segments:
+        segment_end = segment.byte_offset + segment.size
+        if segment_end <= start or segment.byte_offset >= end:
+            continue
+        position = max(start, segment.byte_offset)
+        remaining = min(end, segment_end) - position
+        for block in _read_segment(index, segment, position - segment.byte_offset):
+            if remaining <= 0:
+                break
+            yield block[:remaining]
+            remaining -= len(block)
+
+
+def iter_chars(
+    index: LogIndex,
+    offset: int = 0,
+    limit: int | None = None
+) -> Iterator[str]:
+    """`limit` characters of the log starting at character `offset`."""
+    end = index.chars if limit is None else min(offset + limit, index.chars)
+    for segment in index.segments:
+        segment_end = segment.char_offset + segment.chars
+        if segment_end <= offset or segment.char_offset >= end:
+            continue
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        skip = max(offset - segment.char_offset, 0)
+        remaining = min(end, segment_end) - max(offset, segment.char_offset)
+        for block in _read_segment(index, segment):
+            text = decoder.decode(block)
+            if skip:
+                dropped = min(skip, len(text))
+                text = text[dropped:]
+                skip -= dropped
+            if remaining <= 0:
+                break
+            if text:
+                yield text[:remaining]
+                remaining -= len(text)
+
+
+def iter_tail(index: LogIndex, lines: int) -> Iterator[bytes]:
+    """The last `lines` lines of the log."""
+    first_line = max(index.lines - lines, 0)
+    for segment in index.segments:
+        if segment.first_line + segment.lines <= first_line:
+            continue
+        if segment.first_line >= first_line:
+            yield from _read_segment(index, segment)
+            continue
+        # Skip the segment's lines before the tail, then pass the rest through.
+        skip_lines = first_line - segment.first_line
+        with gzip.open(os.path.join(index.path, segment.file), "rb") as f:
+            for _ in range(skip_lines):
+                f.readline()
+            while block := f.read(READ_BLOCK_BYTES):
+                yield block
@@ -0,0 +1,185 @@
+"""
+Publisher of pipeline notifications (pub/sub messages to users and events of
+the run log streams) for the Celery workers.
+
+All commands go through one shared connection pool that connects lazily and
+retries transient errors, so a Redis that is down when a worker starts is
+picked up once it is back. Notifications are buffered and sent in one
+pipeline: at the end of a `batch()` block, at every publish outside of one,
+or with CI_NOTIFY_FLUSH_INTERVAL every that many seconds by a background
+thread. Notifications that could not be sent stay buffered (up to
+CI_NOTIFY_MAX_BUFFER, oldest dropped first) and go out with the next flush
+after a backoff, so they survive a Redis restart.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+
+NOTIFY_MAX_CONNECTIONS = int(os.getenv("CI_NOTIFY_MAX_CONNECTIONS", "20"))
+NOTIFY_RETRIES = int(os.getenv("CI_NOTIFY_RETRIES", "3"))
+NOTIFY_FLUSH_INTERVAL = float(os.getenv("CI_NOTIFY_FLUSH_INTERVAL", "0"))
+NOTIFY_MAX_BUFFER = int(os.getenv("CI_NOTIFY_MAX_BUFFER", "10000"))
+NOTIFY_MAX_BACKOFF_SECONDS = 30.0
+# The background thread is woken early once this many notifications wait.
+NOTIFY_FLUSH_SIZE = 500
+
+# (method of the Redis pipeline, args, kwargs)
+Command = tuple[str, tuple, dict]
+
+
+def create_redis_client(
+    redis_url: str,
+    max_connections: int = NOTIFY_MAX_CONNECTIONS,
+    retries: int = NOTIFY_RETRIES
+) -> redis.Redis:
+    """Client over its own pool; no connection is made until the first command."""
+    pool = redis.ConnectionPool.from_url(
+        redis_url,
+        decode_responses=True,
+        max_connections=max_connections,
+        socket_connect_timeout=5,
+        socket_keepalive=True,
+        health_check_interval=30,
+        retry=Retry(ExponentialBackoff(cap=2.0, base=0.1), retries),
+        retry_on_error=[redis.ConnectionError, redis.TimeoutError]
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+class NotificationPublisher:
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        flush_interval: float = NOTIFY_FLUSH_INTERVAL,
+        max_buffer: int = NOTIFY_MAX_BUFFER
+    ):
+        self.client = redis_client
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer: deque[Command] = deque(maxlen=max_buffer)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._failures = 0
+        self._retry_at = 0.0
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._thread_pid: int | None = None
+        atexit.register(self.flush)
+
+    def publish(self, channel: str, message: dict) -> bool:
+        return self._submit(("publish", (channel, json.dumps(message)), {}))
+
+    def append_stream(
+        self,
+        key: str,
+        fields: dict,
+        maxlen: int,
+        expire_seconds: int | None = None
+    ) -> bool:
+        commands = [("xadd", (key, fields), {"maxlen": maxlen, "approximate": True})]
+        if expire_seconds:
+            commands.append(("expire", (key, expire_seconds), {}))
+        return self._submit(*commands)
+
+    @contextmanager
+    def batch(self):
+        """Sends everything submitted inside the block in one round trip."""
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self._local.depth = depth
+            if depth == 0 and not self.flush_interval:
+                self.flush()
+
+    def _submit(self, *commands: Command) -> bool:
+        with self._lock:
+            overflow = len(self._buffer) + len(commands) - self._buffer.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self._buffer.extend(commands)
+            pending = len(self._buffer)
+        if self.flush_interval:
+            self._ensure_thread()
+            if pending >= NOTIFY_FLUSH_SIZE:
+                self._wake.set()
+            return True
+        if getattr(self._local, "depth", 0):
+            return True
+        return self.flush()
+
+    def flush(self) -> bool:
+        """
+        Sends the buffered notifications. Returns False if Redis could not be
+        reached; they are kept and tried again after a backoff.
+        """
+        with self._flush_lock:
+            if time.monotonic() < self._retry_at:
+                return False
+            with self._lock:
+                commands = list(self._buffer)
+                self._buffer.clear()
+            if not commands:
+                return True
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                for name, args, kwargs in commands:
+                    getattr(pipe, name)(*args, **kwargs)
+                results = pipe.execute(raise_on_error=False)
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                self._requeue(commands)
+                self._failures += 1
+                delay = min(NOTIFY_MAX_BACKOFF_SECONDS, 0.5 * 2 ** self._failures)
+                self._retry_at = time.monotonic() + delay
+                print(
+                    f"Redis unavailable, keeping {len(commands)} notifications"
+                    f" for {delay:.1f}s: {e}"
+                )
+                return False
+            self._failures = 0
+            self._retry_at = 0.0
+            for (name, args, _), result in zip(commands, results):
+                if isinstance(result, Exception):
+                    print(f"Error sending notification {name} {args[0]}: {result}")
+            return True
+
+    def _requeue(self, commands: list[Command]):
+        with self._lock:
+            merged = commands + list(self._buffer)
+            overflow = len(merged) - self._buffer.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self._buffer = deque(merged, maxlen=self._buffer.maxlen)
+
+    def _ensure_thread(self):
+        # A forked worker process inherits the object but not the thread.
+        pid = os.getpid()
+        if self._thread_pid == pid and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread_pid == pid and self._thread and self._thread.is_alive():
+                return
+            self._thread_pid = pid
+            self._thread = threading.Thread(
+                target=self._run, name="notification-flush", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing notifications: {e}")
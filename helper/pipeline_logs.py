@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.pipeline_log_model import PipelineLogChunk
+
+APPEND_RETRIES = 3
+
+
+def log_stream_key(run_id: int) -> str:
+    """Name of the Redis Stream that carries a run's live log."""
+    return f"pipeline-logs-{run_id}"
+
+
+def format_log_entry(text: str) -> str:
+    timestamp = datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+    return f"--- {timestamp} ---\n{text.strip()}\n"
+
+
+def append_pipeline_log(db: Session, run_id: int, text: str) -> PipelineLogChunk:
+    """
+    Appends `text` as a new chunk at the end of the run's log.
+    Only the last chunk is looked at, so the cost does not depend on the log size.
+    The caller is responsible for committing.
+    """
+    content = format_log_entry(text)
+    for attempt in range(APPEND_RETRIES):
+        last = (
+            db.query(
+                PipelineLogChunk.seq,
+                PipelineLogChunk.start_offset,
+                func.char_length(PipelineLogChunk.content)
+            )
+            .filter(PipelineLogChunk.run_id == run_id)
+            .order_by(PipelineLogChunk.seq.desc())
+            .first()
+        )
+        if last:
+            seq = last[0] + 1
+            start_offset = last[1] + last[2]
+        else:
+            seq = 0
+            start_offset = 0
+
+        chunk = PipelineLogChunk(
+            run_id=run_id,
+            seq=seq,
+            start_offset=start_offset,
+            content=content
+        )
+        try:
+            with db.begin_nested():
+                db.add(chunk)
+            return chunk
+        except IntegrityError:
+            # Another writer took this seq first, read the tail again.
+            if attempt == APPEND_RETRIES - 1:
+                raise
+
+
+def pipeline_log_size(db: Session, run_id: int) -> int:
+    last = (
+        db.query(
+            PipelineLogChunk.start_offset,
+            func.char_length(PipelineLogChunk.content)
+        )
+        .filter(PipelineLogChunk.run_id == run_id)
+        .order_by(PipelineLogChunk.seq.desc())
+        .first()
+    )
+    return last[0] + last[1] if last else 0
+
+
+def read_pipeline_logs(
+    db: Session,
+    run_id: int,
+    offset: int = 0,
+    limit: int | None = None
+) -> str:
+    """
+    Returns `limit` characters of the run's log starting at `offset`
+    (the whole log when both are left at their defaults).
+    Only chunks overlapping the requested range are loaded.
+    """
+    offset = max(offset, 0)
+    first_start = (
+        db.query(func.max(PipelineLogChunk.start_offset))
+        .filter(
+            PipelineLogChunk.run_id == run_id,
+            PipelineLogChunk.start_offset <= offset
+        )
+        .scalar()
+    )
+    if first_start is None:
+        return ""
+
+    query = (
+        db.query(PipelineLogChunk.start_offset, PipelineLogChunk.content)
+        .filter(
+            PipelineLogChunk.run_id == run_id,
+            PipelineLogChunk.start_offset >= first_start
+        )
+    )
+    if limit is not None:
+        query = query.filter(PipelineLogChunk.start_offset < offset + limit)
+
+    text = "".join(content for _, content in query.order_by(PipelineLogChunk.seq))
+    text = text[offset - first_start:]
+    return text[:limit] if limit is not None else text
+
+
+def iter_pipeline_log_chunks(db: Session, run_id: int, batch_size: int = 500):
+    """The run's log chunk by chunk, without loading all of it at once."""
+    rows = (
+        db.query(PipelineLogChunk.content)
+        .filter(PipelineLogChunk.run_id == run_id)
+        .order_by(PipelineLogChunk.seq)
+        .yield_per(batch_size)
+    )
+    for (content,) in rows:
+        yield content
+
+
+def delete_pipeline_log_chunks(db: Session, run_id: int) -> int:
+    """Drops the run's chunks once the log is archived. The caller commits."""
+    return (
+        db.query(PipelineLogChunk)
+        .filter(PipelineLogChunk.run_id == run_id)
+        .delete(synchronize_session=False)
+    )
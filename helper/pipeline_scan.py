@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+
+from helper.docker_policy import RULES_VERSION, Finding, scan_pipeline_content
+
+COMPOSE_FILE_NAMES = ["docker-compose.yml", "docker-compose.yaml"]
+DOCKERFILE_NAMES = [
+    "Dockerfile", "dockerfile", "Dockerfile.dev",
+    "Dockerfile.prod", "Dockerfile.test"
+]
+PIPELINE_FILE_NAMES = (
+    [(name, "compose") for name in COMPOSE_FILE_NAMES] +
+    [(name, "dockerfile") for name in DOCKERFILE_NAMES]
+)
+
+SCAN_CACHE_TTL_SECONDS = int(os.getenv("CI_SCAN_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Regular and executable files. The blob of a symlink (120000) is the link
+# text, not the content the scan reads from the worktree.
+CACHEABLE_MODES = ("100644", "100755")
+
+
+def list_tree_blobs(
+    repo_dir: str,
+    revision: str,
+    names: list[str]
+) -> dict[str, str | None]:
+    """
+    Returns {file name: blob sha} for the given top-level names at `revision`,
+    read from the git object database with a single `git ls-tree` call.
+    The sha is None for blobs that are not regular files (symlinks), whose
+    content can't be identified by it.
+    """
+    result = subprocess.run(
+        ["git", "ls-tree", "-z", revision, "--", *names],
+        cwd=repo_dir,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    blobs = {}
+    for entry in result.stdout.split("\0"):
+        if not entry:
+            continue
+        meta, _, name = entry.partition("\t")
+        mode, object_type, sha = meta.split()
+        if object_type == "blob":
+            blobs[name] = sha if mode in CACHEABLE_MODES else None
+    return blobs
+
+
+def discover_pipeline_file(
+    repo_dir: str,
+    revision: str = "HEAD"
+) -> tuple[str | None, str | None, str | None]:
+    """
+    Finds the docker-compose file or Dockerfile of the checked out commit.
+    Returns (path, type, blob sha), type being "compose" or "dockerfile".
+    Compose files win over Dockerfiles, in the order of PIPELINE_FILE_NAMES.
+    """
+    try:
+        blobs = list_tree_blobs(
+            repo_dir, revision, [name for name, _ in PIPELINE_FILE_NAMES]
+        )
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        print(f"git ls-tree failed in {repo_dir}, checking files instead: {e}")
+        for name, file_type in PIPELINE_FILE_NAMES:
+            path = os.path.join(repo_dir, name)
+            if os.path.isfile(path):
+                return path, file_type, None
+        return None, None, None
+
+    for name, file_type in PIPELINE_FILE_NAMES:
+        if name in blobs:
+            blob = blobs[name][:12] if blobs[name] else "not cacheable"
+            print(f"Found {file_type} file: {name} (blob {blob})")
+            return os.path.join(repo_dir, name), file_type, blobs[name]
+    print(f"No Dockerfile or docker-compose.yml found in {repo_dir}")
+    return None, None, None
+
+
+def scan_cache_key(file_type: str, blob_sha: str) -> str:
+    return f"ci:scan:{RULES_VERSION}:{file_type}:{blob_sha}"
+
+
+def scan_pipeline_file(
+    path: str,
+    file_type: str,
+    blob_sha: str | None,
+    redis_client=None
+) -> tuple[list[Finding], bool]:
+    """
+    Checks the pipeline file against the docker policy, caching the findings
+    in Redis by blob sha and rules version. A file whose content was already
+    scanned is neither read nor scanned again.
+    Returns (findings, served from cache).
+    """
+    key = scan_cache_key(file_type, blob_sha) if blob_sha else None
+    if key and redis_client:
+        try:
+            cached = redis_client.get(key)
+            if cached is not None:
+                return [Finding(**item) for item in json.loads(cached)], True
+        except Exception as e:
+            print(f"Error reading scan cache '{key}': {e}")
+
+    with open(path, "r", encoding="UTF-8") as f:
+        content = f.read()
+    findings = scan_pipeline_content(file_type, content)
+
+    if key and redis_client:
+        try:
+            redis_client.set(
+                key,
+                json.dumps([finding.to_dict() for finding in findings]),
+                ex=SCAN_CACHE_TTL_SECONDS
+            )
+        except Exception as e:
+            print(f"Error writing scan cache '{key}': {e}")
+    return findings, False
@@ -0,0 +1,151 @@
+"""
+Signatures of scanners for the firewall middleware: substrings of request
+paths and of user agents, loaded from CI_FIREWALL_SIGNATURES. Each line of the
+file is `path:<text>` or `agent:<text>`; blank lines and lines starting with
+`#` are skipped. Without the file the built-in lists are used.
+
+Each list is compiled into one regex whose alternatives are factored by a
+prefix trie, so a check scans the input once no matter how many signatures
+there are. The file is checked for changes every
+CI_FIREWALL_SIGNATURES_CHECK_SECONDS and recompiled when it changed. Verdicts
+for user agents, which repeat a lot, are kept in an LRU that is dropped on
+every reload.
+"""
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from helper.lru import TTLCache
+
+SIGNATURES_FILE = os.getenv("CI_FIREWALL_SIGNATURES", "firewall_signatures.txt")
+SIGNATURES_CHECK_SECONDS = float(os.getenv("CI_FIREWALL_SIGNATURES_CHECK_SECONDS", "5"))
+AGENT_VERDICT_CACHE_SIZE = int(os.getenv("CI_FIREWALL_AGENT_CACHE_SIZE", "10000"))
+AGENT_VERDICT_TTL_SECONDS = 3600
+
+DEFAULT_PATH_SIGNATURES = [
+    "eval", "phpunit", "call_user_func", "think\\app", "base64",
+    ".env", ".git", "index.php", "pearcmd", "containers/json",
+    "owa", "geoserver", "logon.aspx"
+]
+DEFAULT_AGENT_SIGNATURES = ["python-requests", "curl", "wget", "nmap", "masscan"]
+
+_NEVER = re.compile(r"(?!)")
+
+
+def compile_signatures(signatures: list[str]) -> re.Pattern:
+    """One regex matching any of the (lowercase) signatures as a substring."""
+    trie: dict = {}
+    for signature in signatures:
+        if not signature:
+            continue
+        node = trie
+        for char in signature.lower():
+            node = node.setdefault(char, {})
+        node[""] = {}
+    if not trie:
+        return _NEVER
+    return re.compile(_trie_pattern(trie))
+
+
+def _trie_pattern(node: dict) -> str:
+    # A signature ending here already matches, longer ones need not be tried.
+    if "" in node:
+        return ""
+    alternatives = [
+        re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items())
+    ]
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return "(?:" + "|".join(alternatives) + ")"
+
+
+def parse_signatures(text: str) -> tuple[list[str], list[str]]:
+    paths, agents = [], []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        kind, _, signature = line.partition(":")
+        kind = kind.strip().lower()
+        if kind == "path":
+            paths.append(signature.strip())
+        elif kind == "agent":
+            agents.append(signature.strip())
+        else:
+            print(f"[FIREWALL] Ignoring signature line: {line}")
+    return paths, agents
+
+
+@dataclass(frozen=True)
+class Ruleset:
+    version: float
+    path_pattern: re.Pattern
+    agent_pattern: re.Pattern
+    signature_count: int
+
+
+class SignatureMatcher:
+    def __init__(
+        self,
+        path: str = SIGNATURES_FILE,
+        check_seconds: float = SIGNATURES_CHECK_SECONDS,
+        agent_cache_size: int = AGENT_VERDICT_CACHE_SIZE
+    ):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._agent_verdicts = TTLCache(agent_cache_size, AGENT_VERDICT_TTL_SECONDS)
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self.ruleset = self._build(None)
+
+    def _build(self, mtime: float | None) -> Ruleset:
+        paths, agents = DEFAULT_PATH_SIGNATURES, DEFAULT_AGENT_SIGNATURES
+        if mtime is not None:
+            try:
+                with open(self.path, "r", encoding="UTF-8") as f:
+                    paths, agents = parse_signatures(f.read())
+            except OSError as e:
+                print(f"[FIREWALL] Error reading signatures {self.path}: {e}")
+        return Ruleset(
+            version=mtime or 0.0,
+            path_pattern=compile_signatures(paths),
+            agent_pattern=compile_signatures(agents),
+            signature_count=len(paths) + len(agents)
+        )
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Recompiles the ruleset if the file changed. Returns True if it did."""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        with self._reload_lock:
+            self._next_check = now + self.check_seconds
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if not force and (mtime or 0.0) == self.ruleset.version:
+                return False
+            self.ruleset = self._build(mtime)
+            self._agent_verdicts.clear()
+            print(
+                f"[FIREWALL] Loaded {self.ruleset.signature_count} signatures"
+                f" from {self.path if mtime else 'built-in defaults'}"
+            )
+            return True
+
+    def match_path(self, path: str) -> bool:
+        self.reload_if_changed()
+        return self.ruleset.path_pattern.search(path.lower()) is not None
+
+    def match_agent(self, agent: str) -> bool:
+        self.reload_if_changed()
+        ruleset = self.ruleset
+        key = (ruleset.version, agent)
+        verdict = self._agent_verdicts.get(key)
+        if verdict is None:
+            verdict = ruleset.agent_pattern.search(agent.lower()) is not None
+            self._agent_verdicts.set(key, verdict)
+        return verdict
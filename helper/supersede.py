@@ -0,0 +1,54 @@
+"""
+Commit coalescing: of a burst of pushes to a config only the newest is built.
+
+process_push bumps a per-config sequence number in Redis for every run it
+creates, and the run keeps its number. A run whose number is no longer the
+latest is superseded. It stops before cloning and again before building, and with
+CI_CANCEL_SUPERSEDED_RUNS also while a command is running.
+"""
+import os
+
+CANCEL_SUPERSEDED_RUNS = os.getenv(
+    "CI_CANCEL_SUPERSEDED_RUNS", "false"
+).lower() in ("1", "true", "yes")
+PUSH_SEQUENCE_TTL_SECONDS = int(
+    os.getenv("CI_PUSH_SEQUENCE_TTL_SECONDS", str(30 * 24 * 3600))
+)
+
+
+class PipelineSuperseded(Exception):
+    pass
+
+
+def push_sequence_key(config_id: int) -> str:
+    return f"ci:config:{config_id}:push-seq"
+
+
+def next_push_sequence(redis_client, config_id: int) -> int | None:
+    """Registers a new push for the config and returns its sequence number."""
+    if redis_client is None:
+        return None
+    key = push_sequence_key(config_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, PUSH_SEQUENCE_TTL_SECONDS)
+        return int(pipe.execute()[0])
+    except Exception as e:
+        print(f"Error registering push for config {config_id}: {e}")
+        return None
+
+
+def is_superseded(redis_client, config_id: int, push_seq: int | None) -> bool:
+    """
+    True if a newer push than `push_seq` was registered for the config.
+    Runs without a sequence number (or without Redis) are never superseded.
+    """
+    if push_seq is None or redis_client is None:
+        return False
+    try:
+        latest = redis_client.get(push_sequence_key(config_id))
+    except Exception as e:
+        print(f"Error reading push sequence of config {config_id}: {e}")
+        return False
+    return latest is not None and int(latest) > push_seq
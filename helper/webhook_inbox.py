@@ -0,0 +1,148 @@
+"""
+Durable inbox for GitHub webhooks in a Redis Stream.
+
+With CI_WEBHOOK_INBOX the webhook server only verifies the signature, appends
+the raw delivery to the stream and answers 202, so a slow database or broker
+never times out a GitHub delivery. webhook_dispatcher.py reads the stream in
+batches through a consumer group and queues the Celery tasks. Entries are
+acknowledged once dispatched; entries of a dispatcher that died are claimed by
+another one after CI_INBOX_CLAIM_IDLE_MS, and entries that keep failing are
+moved to a dead-letter stream. The stream keeps the last CI_INBOX_MAXLEN
+deliveries, which can be dispatched again with --replay.
+"""
+import os
+import time
+
+WEBHOOK_INBOX = os.getenv("CI_WEBHOOK_INBOX", "false").lower() in ("1", "true", "yes")
+INBOX_STREAM = os.getenv("CI_INBOX_STREAM", "ci:webhook-inbox")
+DEAD_LETTER_STREAM = f"{INBOX_STREAM}:dead"
+INBOX_GROUP = os.getenv("CI_INBOX_GROUP", "dispatchers")
+INBOX_MAXLEN = int(os.getenv("CI_INBOX_MAXLEN", "100000"))
+INBOX_BATCH_SIZE = int(os.getenv("CI_INBOX_BATCH_SIZE", "100"))
+INBOX_BLOCK_MS = int(os.getenv("CI_INBOX_BLOCK_MS", "5000"))
+INBOX_CLAIM_IDLE_MS = int(os.getenv("CI_INBOX_CLAIM_IDLE_MS", "60000"))
+INBOX_MAX_DELIVERIES = int(os.getenv("CI_INBOX_MAX_DELIVERIES", "5"))
+
+InboxEntry = tuple[str, dict[str, str]]
+
+
+def append_delivery(
+    redis_client,
+    event_type: str | None,
+    delivery_id: str | None,
+    payload: bytes
+) -> str:
+    """Stores a verified delivery and returns its stream entry id."""
+    return redis_client.xadd(
+        INBOX_STREAM,
+        {
+            "event": event_type or "",
+            "delivery": delivery_id or "",
+            "payload": payload.decode("utf-8"),
+            "received_at": f"{time.time():.3f}",
+        },
+        maxlen=INBOX_MAXLEN,
+        approximate=True
+    )
+
+
+def ensure_group(redis_client):
+    """Creates the consumer group (and the stream) unless it exists."""
+    try:
+        redis_client.xgroup_create(INBOX_STREAM, INBOX_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def read_batch(
+    redis_client,
+    consumer: str,
+    count: int = INBOX_BATCH_SIZE,
+    block_ms: int = INBOX_BLOCK_MS
+) -> list[InboxEntry]:
+    """New entries for this consumer, waiting up to `block_ms` for the first."""
+    response = redis_client.xreadgroup(
+        INBOX_GROUP, consumer, {INBOX_STREAM: ">"}, count=count, block=block_ms
+    )
+    if not response:
+        return []
+    return [entry for _, entries in response for entry in entries]
+
+
+def claim_stale(
+    redis_client,
+    consumer: str,
+    count: int = INBOX_BATCH_SIZE,
+    min_idle_ms: int = INBOX_CLAIM_IDLE_MS
+):
+    """
+    Takes over entries another consumer read but did not acknowledge in time,
+    yielding them in batches while XAUTOCLAIM walks the whole pending list.
+    """
+    start_id = "0-0"
+    while True:
+        start_id, entries = redis_client.xautoclaim(
+            INBOX_STREAM, INBOX_GROUP, consumer, min_idle_ms,
+            start_id=start_id, count=count
+        )[:2]
+        # Deleted entries come back as None (or not at all, on Redis 7).
+        entries = [entry for entry in entries if entry and entry[1]]
+        if entries:
+            yield entries
+        if start_id in ("0-0", b"0-0"):
+            return
+
+
+def delivery_counts(redis_client, entry_ids: list[str]) -> dict[str, int]:
+    """How many times each pending entry was handed to a consumer."""
+    if not entry_ids:
+        return {}
+    pipe = redis_client.pipeline(transaction=False)
+    for entry_id in entry_ids:
+        pipe.xpending_range(
+            INBOX_STREAM, INBOX_GROUP, min=entry_id, max=entry_id, count=1
+        )
+    return {
+        item["message_id"]: item["times_delivered"]
+        for pending in pipe.execute()
+        for item in pending
+    }
+
+
+def acknowledge(redis_client, entry_ids: list[str]):
+    if entry_ids:
+        redis_client.xack(INBOX_STREAM, INBOX_GROUP, *entry_ids)
+
+
+def dead_letter(redis_client, entry: InboxEntry, reason: str):
+    """Moves an entry that cannot be dispatched to the dead-letter stream."""
+    entry_id, fields = entry
+    pipe = redis_client.pipeline()
+    pipe.xadd(
+        DEAD_LETTER_STREAM,
+        {**fields, "inbox_id": entry_id, "reason": reason},
+        maxlen=INBOX_MAXLEN,
+        approximate=True
+    )
+    pipe.xack(INBOX_STREAM, INBOX_GROUP, entry_id)
+    pipe.execute()
+
+
+def iter_range(
+    redis_client,
+    start: str = "-",
+    end: str = "+",
+    stream: str = INBOX_STREAM,
+    count: int = INBOX_BATCH_SIZE
+):
+    """Yields batches of stored entries between two ids (or ms timestamps)."""
+    while True:
+        batch = redis_client.xrange(stream, min=start, max=end, count=count)
+        if not batch:
+            return
+        yield batch
+        if len(batch) < count:
+            return
+        start = f"({batch[-1][0]}"
+
@@ -0,0 +1,216 @@
+"""
+Redis lease locks that serialize pipeline runs of one config across workers.
+
+The holder's token is stored under ci:lock:<name> with a TTL (the lease) that a
+heartbeat thread keeps extending, so a crashed worker loses the lock after at
+most one lease. Runs waiting for the lock are queued in a sorted set by
+arrival time and only the head of the queue may take it, which keeps runs in
+FIFO order. A waiter does not block a worker: it tries once, and its task is
+retried later. Every try refreshes a heartbeat key of the waiter; waiters
+whose heartbeat expired are dropped from the queue, and rejoin at their
+original arrival time when they try again.
+"""
+import os
+import threading
+import time
+import uuid
+
+LOCK_LEASE_SECONDS = int(os.getenv("CI_LOCK_LEASE_SECONDS", "60"))
+LOCK_WAIT_SECONDS = int(os.getenv("CI_LOCK_WAIT_SECONDS", "3600"))
+# Delay between two tries of a waiting run; its task is retried meanwhile.
+LOCK_RETRY_SECONDS = float(os.getenv("CI_LOCK_RETRY_SECONDS", "5"))
+# Lease granted while a run waits in a queue between two of its stage tasks.
+LOCK_HANDOFF_SECONDS = int(os.getenv("CI_LOCK_HANDOFF_SECONDS", "1800"))
+# Must cover LOCK_RETRY_SECONDS plus the time a retried task waits in its queue.
+WAITER_TTL_SECONDS = int(os.getenv("CI_LOCK_WAITER_TTL_SECONDS", "120"))
+
+# KEYS: lock, queue, waiter prefix. ARGV: token, lease ms, queued at ms, waiter ttl ms
+_ACQUIRE_SCRIPT = """
+if redis.call('ZSCORE', KEYS[2], ARGV[1]) == false then
+    redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+end
+redis.call('SET', KEYS[3] .. ARGV[1], '1', 'PX', ARGV[4])
+while true do
+    local head = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+    if head == nil or head == ARGV[1] then
+        break
+    end
+    if redis.call('EXISTS', KEYS[3] .. head) == 1 then
+        break
+    end
+    redis.call('ZREM', KEYS[2], head)
+end
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+    return 1
+end
+if holder == false and redis.call('ZRANGE', KEYS[2], 0, 0)[1] == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('DEL', KEYS[3] .. ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# KEYS: lock. ARGV: token, lease ms
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lock, queue, waiter prefix. ARGV: token
+_RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[3] .. ARGV[1])
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def config_lock_name(config_id: int) -> str:
+    return f"config-{config_id}"
+
+
+def _keys(name: str) -> list[str]:
+    return [f"ci:lock:{name}", f"ci:lock:{name}:queue", f"ci:lock:{name}:waiter:"]
+
+
+def _run_id(token: str) -> int | None:
+    run_id = token.split(":", 1)[0]
+    return int(run_id) if run_id.isdigit() else None
+
+
+class LeaseLock:
+    """
+    One run's claim on a lock. `try_acquire` queues the run and takes the lock
+    when it is the run's turn, a daemon thread then renews the lease until
+    `release`. If a renewal finds the lock taken by someone else, `lost` is set.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        name: str,
+        run_id: int,
+        lease_seconds: int = LOCK_LEASE_SECONDS,
+        token: str | None = None
+    ):
+        self.redis = redis_client
+        self.name = name
+        self.token = token or f"{run_id}:{uuid.uuid4().hex[:12]}"
+        self.lease_ms = lease_seconds * 1000
+        self.lost = False
+        self._keys = _keys(name)
+        self._stop = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+
+    def try_acquire(self, queued_at: float | None = None) -> bool:
+        """
+        Takes the lock if it is free and the run is first in the queue,
+        otherwise queues the run (at `queued_at`, a Unix time, if it is not
+        queued yet) and returns False. Call again until it returns True, or
+        `release` to leave the queue.
+        """
+        acquired = self.redis.eval(
+            _ACQUIRE_SCRIPT, 3, *self._keys,
+            self.token, self.lease_ms, int((queued_at or time.time()) * 1000),
+            WAITER_TTL_SECONDS * 1000
+        )
+        if acquired:
+            self._start_heartbeat()
+        return bool(acquired)
+
+    def resume(self) -> bool:
+        """
+        Takes over a lock acquired by an earlier task of the same run (created
+        with its `token`). Returns False, and sets `lost`, if it expired.
+        """
+        if not self._renew(self.lease_ms):
+            self.lost = True
+            return False
+        self._start_heartbeat()
+        return True
+
+    def hand_over(self, lease_seconds: int = LOCK_HANDOFF_SECONDS):
+        """
+        Stops renewing without releasing and extends the lease, so the next
+        task of the run can resume the lock after waiting in its queue.
+        """
+        self._stop_heartbeat()
+        if not self.lost:
+            self._renew(lease_seconds * 1000)
+
+    def _renew(self, lease_ms: int) -> bool:
+        return bool(self.redis.eval(
+            _RENEW_SCRIPT, 1, self._keys[0], self.token, lease_ms
+        ))
+
+    def _start_heartbeat(self):
+        interval = self.lease_ms / 3000
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    renewed = self._renew(self.lease_ms)
+                except Exception as e:
+                    print(f"Error renewing lock {self.name}: {e}")
+                    continue
+                if not renewed:
+                    print(f"Lock {self.name} was lost by {self.token}")
+                    self.lost = True
+                    return
+
+        self._heartbeat = threading.Thread(
+            target=beat, name=f"lock-{self.name}", daemon=True
+        )
+        self._heartbeat.start()
+
+    def _stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat and self._heartbeat is not threading.current_thread():
+            self._heartbeat.join(timeout=5)
+
+    def release(self):
+        self._stop_heartbeat()
+        try:
+            self.redis.eval(_RELEASE_SCRIPT, 3, *self._keys, self.token)
+        except Exception as e:
+            print(f"Error releasing lock {self.name}: {e}")
+
+
+def describe_lock(redis_client, name: str) -> dict:
+    """Current holder, remaining lease and live waiters of a lock, in order."""
+    lock_key, queue_key, waiter_prefix = _keys(name)
+    pipe = redis_client.pipeline()
+    pipe.get(lock_key)
+    pipe.pttl(lock_key)
+    pipe.zrange(queue_key, 0, -1, withscores=True)
+    holder, ttl_ms, queue = pipe.execute()
+
+    pipe = redis_client.pipeline()
+    for token, _ in queue:
+        pipe.exists(f"{waiter_prefix}{token}")
+    alive = pipe.execute() if queue else []
+
+    return {
+        "name": name,
+        "holder": {
+            "token": holder,
+            "run_id": _run_id(holder),
+            "lease_remaining_ms": ttl_ms,
+        } if holder else None,
+        "waiters": [
+            {
+                "token": token,
+                "run_id": _run_id(token),
+                "queued_at": score / 1000,
+            }
+            for (token, score), is_alive in zip(queue, alive)
+            if is_alive
+        ],
+    }
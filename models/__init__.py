@@ -1,4 +1,5 @@
 from .base import Base
 from .pipeline_test_model import PipelineRuns
+from .pipeline_log_model import PipelineLogChunk
 from .repo_model import RepoConfig, Webhook
 from .user_model import User, Test
\ No newline at end of file
@@ -0,0 +1,37 @@
+from .base import Base
+from sqlalchemy import Integer, BigInteger, DateTime, Text, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from datetime import datetime
+
+
+class PipelineLogChunk(Base):
+    """
+    One append-only piece of a pipeline run's log.
+    Chunks are ordered by `seq` and `start_offset` is the position (in characters)
+    of the chunk's first character inside the full log, so a slice of the log
+    can be read without loading the chunks before it.
+    """
+    __tablename__ = "pipeline_log_chunks"
+    __table_args__ = (
+        Index("ix_pipeline_log_chunks_run_offset", "run_id", "start_offset"),
+    )
+
+    run_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("pipeline_runs.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    start_offset: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now()
+    )
+
+    def __repr__(self):
+        return (
+            f"<PipelineLogChunk(run_id={self.run_id}, seq={self.seq}, "
+            f"start_offset={self.start_offset})>"
+        )
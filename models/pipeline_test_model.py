@@ -1,5 +1,5 @@
 from .base import Base
-from sqlalchemy import (Integer, String, DateTime,
+from sqlalchemy import (Integer, String, DateTime, Index,
                         Text, ForeignKey, Enum as SQLAEnum)
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -40,3 +40,12 @@ class PipelineRuns(Base):
             f"<PipelineRun(id={self.id}, config_id={self.config_id}, "
             f"status='{self.status.name}')>"
         )
+
+
+# Listing a config's runs newest first, see GET /api/pipelines.
+Index(
+    "ix_pipeline_runs_config_id_trigger_time_id",
+    PipelineRuns.config_id,
+    PipelineRuns.trigger_time.desc(),
+    PipelineRuns.id.desc()
+)
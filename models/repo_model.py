@@ -1,8 +1,9 @@
 from sqlalchemy import (
     Column, Integer, String,
-    ForeignKey, Table, Boolean,
+    ForeignKey, Table, Boolean, Index,
     BigInteger, Enum as SQLAlchemyEnum
 )
+from sqlalchemy.sql import false, true
 import enum
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from .base import Base
@@ -15,11 +16,15 @@ class GitHostPlatform(enum.Enum):
     GENERIC = "generic"
 
 
+DEFAULT_BUILD_PLATFORMS = "linux/amd64,linux/arm64"
+
+
 repo_user = Table(
     "repo_user",
     Base.metadata,
-    Column("repo_config_id", Integer, ForeignKey("configs.id")),
-    Column("user_id", Integer, ForeignKey("users.id"))
+    Column("repo_config_id", Integer, ForeignKey("configs.id"), primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Index("ix_repo_user_user_id_repo_config_id", "user_id", "repo_config_id")
 )
 
 
@@ -33,6 +38,15 @@ repo_pipeline = Table(
 
 class RepoConfig(Base):
     __tablename__ = "configs"
+    __table_args__ = (
+        Index(
+            "ux_configs_repo_url_main_branch",
+            "repo_url",
+            "main_branch",
+            unique=True,
+            postgresql_include=["id", "docker_username"]
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     repo_url: Mapped[str] = mapped_column(String)
     main_branch: Mapped[str] = mapped_column(String)
@@ -47,6 +61,16 @@ class RepoConfig(Base):
 
     # Docker info
     docker_username: Mapped[str | None] = mapped_column(String, nullable=True)
+    build_platforms: Mapped[str] = mapped_column(
+        String,
+        default=DEFAULT_BUILD_PLATFORMS,
+        server_default=DEFAULT_BUILD_PLATFORMS
+    )
+    split_platform_builds: Mapped[bool] = mapped_column(
+        Boolean,
+        default=False,
+        server_default=false()
+    )
 
     # Installation info
     installation_id: Mapped[BigInteger] = mapped_column(BigInteger, nullable=True)
@@ -63,6 +87,14 @@ class RepoConfig(Base):
     )
     git_ssh_host_key: Mapped[str | None] = mapped_column(String, nullable=True)
 
+    # Checkout configuration
+    shallow_checkout: Mapped[bool] = mapped_column(
+        Boolean,
+        default=True,
+        server_default=true()
+    )
+    git_fetch_filter: Mapped[str | None] = mapped_column(String, nullable=True)
+
     # SSH  for deploy configuration
     SSH_host: Mapped[str | None] = mapped_column(String, nullable=True)
     SSH_port: Mapped[int | None] = mapped_column(Integer, nullable=True)
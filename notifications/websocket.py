@@ -1,10 +1,26 @@
 import asyncio
+import json
 import os
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import time
+from datetime import datetime
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from starlette.concurrency import run_in_threadpool
 import redis.asyncio as redis
 
+from auth.jwt_handler import decode_token
+from db import SessionLocal
+from helper.pipeline_logs import log_stream_key
+from models.pipeline_test_model import PipelineRuns
+from models.user_model import User
+
 router = APIRouter()
 
+LOG_TAIL_BLOCK_MS = 15000
+LOG_TAIL_BATCH = 200
+# A tail that got no entry for this long is closed; the client can reconnect
+# with its last id.
+LOG_TAIL_IDLE_SECONDS = int(os.getenv("CI_LOG_TAIL_IDLE_SECONDS", "600"))
+
 redis_client = redis.from_url(
     os.getenv("REDIS_HOST", "redis://localhost:6379/0"),
     decode_responses=True
@@ -39,3 +55,122 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
     finally:
         await pubsub.unsubscribe(user_channel)
         print(f"Unsubscribed from channel '{user_channel}'")
+
+
+def _load_pipeline_for_user(pipeline_id: int, token: str) -> PipelineRuns | None:
+    payload = decode_token(token) if token else None
+    if not payload or not payload.get("sub"):
+        return None
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == payload["sub"]).first()
+        pipeline = db.query(PipelineRuns).filter_by(id=pipeline_id).first()
+        if not user or not pipeline or user not in pipeline.config.users:
+            return None
+        db.expunge(pipeline)
+        return pipeline
+    finally:
+        db.close()
+
+
+def _load_run_state(pipeline_id: int) -> tuple[datetime | None, str | None]:
+    """(end time, status name) of the run."""
+    db = SessionLocal()
+    try:
+        run = db.get(PipelineRuns, pipeline_id)
+        return (run.end_time, run.status.name) if run else (None, None)
+    finally:
+        db.close()
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    # Nothing is expected from the client; reading is how a close is noticed.
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/pipelines/{pipeline_id}/logs")
+async def pipeline_logs_websocket(
+    websocket: WebSocket,
+    pipeline_id: int,
+    token: str = "",
+    last_id: str = "0",
+):
+    """
+    Tails the live log of a single pipeline run.
+    Every message is one stream entry as JSON with its `id`. A client that
+    reconnects with `last_id` set to the last id it saw only gets newer entries.
+    An entry with type "end" is sent last, after which the socket is closed.
+    If the run ended without one (e.g. its worker died) an "end" entry is made
+    up from the run's status. A tail idle for CI_LOG_TAIL_IDLE_SECONDS is
+    closed as well.
+    """
+    pipeline = await run_in_threadpool(_load_pipeline_for_user, pipeline_id, token)
+    if pipeline is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    stream_key = log_stream_key(pipeline_id)
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        if pipeline.end_time and not await redis_client.exists(stream_key):
+            # The live stream already expired, the full log is served over HTTP.
+            await websocket.send_text(json.dumps({
+                "id": last_id,
+                "type": "end",
+                "status": pipeline.status.name,
+            }))
+            return
+
+        stream_seen = False
+        last_entry_at = time.monotonic()
+        while True:
+            read = asyncio.create_task(redis_client.xread(
+                {stream_key: last_id},
+                count=LOG_TAIL_BATCH,
+                block=LOG_TAIL_BLOCK_MS
+            ))
+            await asyncio.wait({read, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                read.cancel()
+                print(f"Log tail disconnected for pipeline {pipeline_id} at {last_id}")
+                return
+
+            response = read.result()
+            if response:
+                stream_seen = True
+                last_entry_at = time.monotonic()
+                for entry_id, fields in response[0][1]:
+                    last_id = entry_id
+                    await websocket.send_text(json.dumps({"id": entry_id, **fields}))
+                    if fields.get("type") == "end":
+                        return
+                continue
+
+            # A whole block without entries: check the run did not end without
+            # an "end" entry, or lose its stream while we were tailing it.
+            stream_alive = await redis_client.exists(stream_key)
+            end_time, status_name = await run_in_threadpool(_load_run_state, pipeline_id)
+            if end_time or (stream_seen and not stream_alive) or status_name is None:
+                await websocket.send_text(json.dumps({
+                    "id": last_id,
+                    "type": "end",
+                    "status": status_name,
+                }))
+                return
+            stream_seen = stream_seen or bool(stream_alive)
+            if time.monotonic() - last_entry_at >= LOG_TAIL_IDLE_SECONDS:
+                print(f"Log tail for pipeline {pipeline_id} idle, closing at {last_id}")
+                return
+
+    except WebSocketDisconnect:
+        print(f"Log tail disconnected for pipeline {pipeline_id} at {last_id}")
+    except Exception as e:
+        print(f"An error occurred with log tail for pipeline {pipeline_id}: {e}")
+    finally:
+        disconnected.cancel()
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
@@ -14,6 +14,7 @@ class PipelineStatusEnum(enum.Enum):
     FAILED_DOCKER_BUILD = "FAILED_DOCKER_BUILD"
     FAILED_DOCKER_DEPLOY = "FAILED_DOCKER_DEPLOY"
     UNKNOWN = "UNKNOWN"
+    SUPERSEDED = "SUPERSEDED"
 
 
 class PipelineRunOut(BaseModel):
@@ -28,3 +29,16 @@ class PipelineRunOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class PipelineRunSummary(BaseModel):
+    id: int
+    config_id: int
+    trigger_time: datetime
+    end_time: Optional[datetime]
+    status: PipelineStatusEnum
+    commit_sha: Optional[str]
+    trigger_event_id: Optional[str]
+
+    class Config:
+        from_attributes = True
@@ -1,6 +1,10 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, field_validator
 from typing import Optional
 from enum import Enum
+import re
+
+# os/arch[/variant] as buildx takes it, e.g. linux/amd64 or linux/arm/v7.
+BUILD_PLATFORM_RE = re.compile(r"^[a-z0-9_]+/[a-z0-9_]+(?:/[a-z0-9_.]+)?$")
 
 
 class GitHostPlatform(str, Enum):
@@ -14,12 +18,16 @@ class RepoConfigSchema(BaseModel):
     repo_url: HttpUrl
     main_branch: str
     docker_username: Optional[str] = None
+    build_platforms: str = "linux/amd64,linux/arm64"
+    split_platform_builds: bool = False
     platform: GitHostPlatform = GitHostPlatform.GITHUB
     installation_id: Optional[int] = None
     use_ssh_for_clone: bool = False
     git_ssh_private_key_encrypted: Optional[str] = None
     git_ssh_key_passphrase_encrypted: Optional[str] = None
     git_ssh_host_key: Optional[str] = None
+    shallow_checkout: bool = True
+    git_fetch_filter: Optional[str] = None
     SSH_host: Optional[str] = None
     SSH_port: Optional[int] = None
     SSH_username: Optional[str] = None
@@ -27,6 +35,18 @@ class RepoConfigSchema(BaseModel):
     SSH_key_passphrase: Optional[str] = None
     SSH_for_deploy: bool
 
+    @field_validator("build_platforms")
+    @classmethod
+    def check_build_platforms(cls, value: str) -> str:
+        platforms = [item.strip() for item in value.split(",")]
+        invalid = [item for item in platforms if not BUILD_PLATFORM_RE.match(item)]
+        if invalid:
+            raise ValueError(
+                "build_platforms must be a comma separated list of os/arch[/variant],"
+                f" invalid: {', '.join(repr(item) for item in invalid)}"
+            )
+        return ",".join(dict.fromkeys(platforms))
+
     class Config:
         from_attributes = True
 
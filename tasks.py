@@ -1,20 +1,81 @@
 import os
 import subprocess
+from collections import deque
 from datetime import datetime, timezone
+import functools
+import time
 import traceback
-import re
+import shutil
+import socket
 import tempfile
-import redis
-import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator
 
 from sqlalchemy.orm import Session
 
-from models.repo_model import RepoConfig
+from models.repo_model import DEFAULT_BUILD_PLATFORMS, RepoConfig
 from models.pipeline_test_model import PipelineRuns, PipelineStatusEnum
-from db import SessionLocal
-from celery import Celery
-
+from db import SessionLocal, dispose_engines, pool_metrics
+from celery import Celery, chain, chord
+from celery.exceptions import Retry
+from celery.signals import task_postrun, worker_process_init
+from redis import RedisError
+
+from helper.build_cache import (
+    commit_build_cache,
+    config_cache_key,
+    prepare_build_cache,
+)
+from helper.cache_bus import publish_invalidation
+from helper.compose_graph import (
+    ComposeError,
+    ComposeService,
+    build_dependencies,
+    load_compose_services,
+    read_env_file,
+)
+from helper.config_routes import CONFIG_ROUTES_CACHE
 from helper.data import decrypt_data
+from helper.db_pool import DB_METRICS_INTERVAL, publish_pool_metrics
+from helper.git_cache import (
+    add_worktree,
+    is_shallow_checkout,
+    mirror_lock,
+    mirror_path,
+    remove_worktree,
+    run_worktree_path,
+    shallow_fetch,
+    update_mirror,
+)
+from helper.docker_policy import (
+    has_blocking_findings,
+    scan_compose_file,
+    scan_dockerfile,
+)
+from helper.pipeline_scan import discover_pipeline_file, scan_pipeline_file
+from helper.delivery_guard import record_delivery_run
+from helper.notify import NotificationPublisher, create_redis_client
+from helper.supersede import (
+    CANCEL_SUPERSEDED_RUNS,
+    PipelineSuperseded,
+    is_superseded,
+    next_push_sequence,
+)
+from helper.workspace_lock import (
+    LOCK_RETRY_SECONDS,
+    LOCK_WAIT_SECONDS,
+    LeaseLock,
+    config_lock_name,
+)
+from helper.log_store import write_run_log
+from helper.pipeline_logs import (
+    append_pipeline_log,
+    delete_pipeline_log_chunks,
+    iter_pipeline_log_chunks,
+    log_stream_key,
+    pipeline_log_size,
+)
 
 app = Celery(
     "tasks",
@@ -23,34 +84,212 @@ app = Celery(
 )
 
 redis_host = os.getenv('REDIS_HOST')
+LOG_STREAM_MAXLEN = int(os.getenv("CI_LOG_STREAM_MAXLEN", "10000"))
+LOG_STREAM_TTL_SECONDS = int(os.getenv("CI_LOG_STREAM_TTL_SECONDS", "3600"))
+# Drop a run's log chunks from the database once its log is archived on disk.
+LOG_ARCHIVE_PRUNE_DB = os.getenv("CI_LOG_ARCHIVE_PRUNE_DB", "true").lower() in (
+    "1", "true", "yes"
+)
+# Every stage of a run reads the checkout, so all workers consuming the git,
+# build and push queues must share this directory (same host or shared volume).
+WORKSPACE_DIR = "ci_workspace"
+GIT_QUEUE = os.getenv("CI_GIT_QUEUE", "ci.git")
+BUILD_QUEUE = os.getenv("CI_BUILD_QUEUE", "ci.build")
+PUSH_QUEUE = os.getenv("CI_PUSH_QUEUE", "ci.push")
+PUSH_MAX_RETRIES = int(os.getenv("CI_PUSH_MAX_RETRIES", "3"))
+# The build stage pushes to "<repository>:<prefix><run id>", the push stage
+# tags that image as the final one.
+STAGING_TAG_PREFIX = os.getenv("CI_STAGING_TAG_PREFIX", "ci-build-")
+PUSH_RETRY_DELAY_SECONDS = int(os.getenv("CI_PUSH_RETRY_DELAY_SECONDS", "15"))
+# Queues for per-platform builds, e.g. "linux/arm64=build-arm64,linux/amd64=build-amd64",
+# so each architecture is built natively by workers consuming its queue.
+PLATFORM_QUEUES = dict(
+    entry.strip().split("=", 1)
+    for entry in os.getenv("CI_PLATFORM_QUEUES", "").split(",")
+    if "=" in entry
+)
+
+app.conf.task_routes = {
+    "tasks.pipeline_lock": {"queue": GIT_QUEUE},
+    "tasks.pipeline_checkout": {"queue": GIT_QUEUE},
+    "tasks.pipeline_scan": {"queue": GIT_QUEUE},
+    "tasks.pipeline_build": {"queue": BUILD_QUEUE},
+    "tasks.build_platform_image": {"queue": BUILD_QUEUE},
+    "tasks.pipeline_push": {"queue": PUSH_QUEUE},
+}
+
+redis_client = create_redis_client(redis_host)
+notifier = NotificationPublisher(redis_client)
 
-try:
-    redis_client = redis.from_url(redis_host, decode_responses=True)
-    redis_client.ping()
-    print("Super")
-except redis.ConnectionError as e:
-    print(f"Redis connection error: {e}")
-    redis_client = None
+_pool_metrics_published_at = 0.0
 
 
-def save_logs_to_file(run_id: int, logs: str):
+@worker_process_init.connect
+def reset_db_pools(**kwargs):
+    # A prefork child inherits the parent's pools; sharing their sockets
+    # across processes corrupts the connections.
+    dispose_engines()
+
+
+@task_postrun.connect
+def report_db_pool_metrics(**kwargs):
+    """Publishes this process's pool metrics, at most every CI_DB_METRICS_INTERVAL."""
+    global _pool_metrics_published_at
+    now = time.monotonic()
+    if now - _pool_metrics_published_at < DB_METRICS_INTERVAL:
+        return
+    _pool_metrics_published_at = now
+    try:
+        publish_pool_metrics(
+            redis_client, f"{socket.gethostname()}:{os.getpid()}", pool_metrics()
+        )
+    except RedisError as e:
+        print(f"Error publishing database pool metrics: {e}")
+
+
+def archive_pipeline_log(db: Session, run_id: int):
+    """
+    Writes the finished run's log to the compressed log archive, served by
+    GET /api/pipelines/{id}/logs, and then drops it from the database.
+    """
     try:
-        filename = f"pipeline_logs_{run_id}.txt"
-        with open(filename, "w", encoding="UTF-8") as f:
-            f.write(logs.strip())
-        print(f"Logs for PipelineRun ID={run_id} saved to {filename}")
+        size = pipeline_log_size(db, run_id)
+        if not size:
+            return
+        index = write_run_log(run_id, iter_pipeline_log_chunks(db, run_id))
+        print(
+            f"Logs for PipelineRun ID={run_id} archived to {index.path}"
+            f" ({index.size} bytes in {len(index.segments)} segments)"
+        )
+        if LOG_ARCHIVE_PRUNE_DB and index.chars == size:
+            delete_pipeline_log_chunks(db, run_id)
+            db.commit()
     except Exception as e:
-        print(f"Failed to save logs for run {run_id}: {e}")
+        db.rollback()
+        print(f"Failed to archive logs for run {run_id}: {e}")
 
 
-def run_command(
+COMPOSE_MAX_PARALLEL = int(os.getenv("CI_COMPOSE_MAX_PARALLEL", "4"))
+STREAM_CHUNK_SIZE = 8192
+STREAM_TAIL_LINES = 50
+
+
+def stream_command(
     command: list[str],
     working_dir: str | None = None,
     env: dict | None = None
+) -> Iterator[str]:
+    """
+    Runs a command and yields its output as it is produced, one line at a time.
+    Stderr is merged into stdout and lines longer than STREAM_CHUNK_SIZE are
+    yielded in chunks, so memory use does not depend on how much the command
+    prints. The exit code is the generator's return value.
+    """
+    process_env = os.environ.copy()
+    if env:
+        process_env.update(env)
+
+    process = subprocess.Popen(
+        command,
+        cwd=working_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        env=process_env
+    )
+    finished = False
+    try:
+        for line in iter(lambda: process.stdout.readline(STREAM_CHUNK_SIZE), ""):
+            yield line.rstrip("\n")
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+    return returncode
+
+
+def _run_command_streaming(
+    command: list[str],
+    working_dir: str | None,
+    env: dict | None,
+    on_output: Callable[[str], None],
+    command_output: str
+) -> tuple[bool, str]:
+    tail = deque(maxlen=STREAM_TAIL_LINES)
+    line_count = 0
+    success = True
+    try:
+        stream = stream_command(command, working_dir=working_dir, env=env)
+        while True:
+            try:
+                line = next(stream)
+            except StopIteration as stop:
+                returncode = stop.value
+                break
+            line_count += 1
+            tail.append(line)
+            try:
+                on_output(line)
+            except PipelineSuperseded:
+                # Closing the generator kills the command.
+                stream.close()
+                raise
+
+        if line_count > len(tail):
+            command_output += (
+                f"--- OUTPUT (last {len(tail)} of {line_count} lines,"
+                " full output was streamed) ---\n"
+            )
+        elif tail:
+            command_output += "--- OUTPUT ---\n"
+        if tail:
+            command_output += "\n".join(tail) + "\n"
+        if returncode != 0:
+            command_output += f"Error: command failed (exit code {returncode}).\n"
+            success = False
+        else:
+            command_output += "Command successfully executed"
+            command_output += f" (exit code {returncode}).\n"
+    except PipelineSuperseded:
+        raise
+    except FileNotFoundError:
+        print(f"Error: command '{command[0]}' not found")
+        command_output += f"Error: command '{command[0]}' not found. "
+        command_output += "Is tool installed or inside PATH?"
+        success = False
+    except Exception as e:
+        print(f"Error: Unexpected error: {e}")
+        command_output += f"Error: Unexpected error running command: {e}\n"
+        command_output += traceback.format_exc() + "\n"
+        success = False
+    print(f"Command {'succeeded' if success else 'failed'}.")
+    return success, command_output.strip()
+
+
+def run_command(
+    command: list[str],
+    working_dir: str | None = None,
+    env: dict | None = None,
+    on_output: Callable[[str], None] | None = None
 ) -> tuple[bool, str]:
+    """
+    Runs a command and returns (success, output).
+    When on_output is given the command is streamed: every line is passed to
+    on_output as soon as it is printed and only the last STREAM_TAIL_LINES
+    lines are kept in the returned output.
+    """
     command_output = ""
     command_output += f"Running command {' '.join(command)}"
     command_output += f" in directory: {working_dir if working_dir else ''}\n"
+    if on_output is not None:
+        return _run_command_streaming(
+            command, working_dir, env, on_output, command_output
+        )
+
     success = True
     process_env = os.environ.copy()
     if env:
@@ -105,192 +344,180 @@ def send_redis_message(
     channel: str,
     message: dict,
 ) -> bool:
-    if not redis_client:
-        print("Redis client not initialized, cannot send message.")
-        return False
-    try:
-        payload = json.dumps(message)
-        redis_client.publish(channel, payload)
-        print(f"Message sent to Redis channel '{channel}': {payload}")
-    except Exception as e:
-        print(f"Error sending message to Redis channel '{channel}': {e}")
-        return False
+    sent = notifier.publish(channel, message)
+    print(f"Message {'sent' if sent else 'queued'} for Redis channel '{channel}'")
+    return sent
 
 
-def find_pipeline_file(repo_dir: str) -> tuple[str | None, str | None]:
+def send_redis_log_event(run_id: int, event: dict, finished: bool = False) -> bool:
     """
-    Finds dockerfile or docker-compose file in the given repository dir.
-    Returns a tuple of (path, type), where type is either "dockerfile" or "compose".
+    Appends an event to the run's log stream, read by /ws/pipelines/{id}/logs.
+    The stream is capped at LOG_STREAM_MAXLEN entries and expires
+    LOG_STREAM_TTL_SECONDS after the run finishes.
     """
-    compose_names = ["docker-compose.yml", "docker-compose.yaml"]
-    for name in compose_names:
-        compose_path = os.path.join(repo_dir, name)
-        if os.path.isfile(compose_path):
-            print(f"Found docker-compose file: {compose_path}")
-            return compose_path, "compose"
+    fields = {k: str(v) for k, v in event.items() if v is not None}
+    return notifier.append_stream(
+        log_stream_key(run_id),
+        fields,
+        LOG_STREAM_MAXLEN,
+        LOG_STREAM_TTL_SECONDS if finished else None
+    )
 
-    dockerfile_names = [
-        "Dockerfile", "dockerfile", "Dockerfile.dev",
-        "Dockerfile.prod", "Dockerfile.test"
-    ]
-    for name in dockerfile_names:
-        dockerfile_path = os.path.join(repo_dir, name)
-        if os.path.isfile(dockerfile_path):
-            print(f"Found Dockerfile: {dockerfile_path}")
-            return dockerfile_path, "dockerfile"
 
-    print(f"No Dockerfile or docker-compose.yml found in {repo_dir}")
-    return None, None
+def _build_push_compose_service(
+    service: ComposeService,
+    repo_dir: str,
+    compose_file_path: str,
+    build_env: dict,
+    on_output: Callable[[str], None] | None,
+    steps: tuple[str, ...] = ("build", "push"),
+    pipeline_id: int | None = None
+) -> tuple[bool, str, float]:
+    started = time.monotonic()
+    logs = f"\n--- Service {service.name} ---\n"
+    success = True
+    staged = (
+        staging_ref(service.image, pipeline_id, service.name)
+        if service.image and steps != ("build", "push") else None
+    )
+    if "build" in steps:
+        success, build_log = run_command(
+            ["docker-compose", "-f", compose_file_path, "build", service.name],
+            working_dir=repo_dir,
+            env=build_env,
+            on_output=on_output
+        )
+        logs += build_log + "\n"
+        if success and staged:
+            for command in (
+                ["docker", "tag", service.image, staged],
+                ["docker", "push", staged],
+            ):
+                success, stage_log = run_command(command, on_output=on_output)
+                logs += stage_log + "\n"
+                if not success:
+                    break
+    if success and "push" in steps and staged:
+        success, push_log = promote_image(staged, service.image, on_output)
+        logs += push_log + "\n"
+    elif success and "push" in steps and service.image:
+        success, push_log = run_command(
+            ["docker-compose", "-f", compose_file_path, "push", service.name],
+            working_dir=repo_dir,
+            env=build_env,
+            on_output=on_output
+        )
+        logs += push_log + "\n"
+    elif success and "push" in steps:
+        logs += f"Service {service.name} has no image: directive, not pushing.\n"
+    return success, logs, time.monotonic() - started
 
 
 def build_push_compose_services(
     repo_dir: str,
     compose_file_path: str,
     username: str,
-    base_image_name: str,
     commit_sha: str,
     build_date: str,
-    main_branch: str
+    main_branch: str,
+    on_output: Callable[[str], None] | None = None,
+    steps: tuple[str, ...] = ("build", "push"),
+    pipeline_id: int | None = None
 ) -> tuple[bool, str]:
+    """
+    Builds and pushes every service of the compose file that has a build
+    section. The file is parsed once; services are built as soon as the
+    services they depend on are done, at most COMPOSE_MAX_PARALLEL at a time,
+    and each one is pushed right after its own build.
+    `steps` limits the run to ("build",) or ("push",) when the two happen in
+    separate pipeline stages: the build then pushes each image to the
+    staging_ref of run `pipeline_id`, and the push tags it as the final one.
+    """
     all_logs = ""
-    all_logs += f"Starting Docker Compose build for {compose_file_path}\n"
-
-    with open(compose_file_path, "r") as f:
-        compose_content = f.read()
-    if not is_compose_file_safe(compose_content):
-        all_logs += "Docker Compose file is not safe\n"
-        return False, all_logs
-
-    success, build_log = run_command(
-        ["docker-compose", "-f", compose_file_path, "build"],
-        working_dir=repo_dir
-    )
-    all_logs += "\n--- Docker Compose Build Logs ---\n" + build_log
-    if not success:
-        all_logs += "Error: Docker Compose build failed.\n"
-        return False, all_logs
-    all_logs += "Docker Compose build completed successfully.\n"
-
-    # Ovde uzimam imena servisa iz compose fajla
-    try:
-        result = subprocess.run(
-            ["docker-compose", "-f", compose_file_path, "config", "--services"],
-            capture_output=True, text=True, check=True, cwd=repo_dir
-        )
-        services = [s.strip() for s in result.stdout.splitlines() if s.strip()]
+    all_logs += f"Starting Docker Compose {' and '.join(steps)} for {compose_file_path}\n"
 
-    except Exception as e:
-        all_logs += f"\nError getting services from docker-compose: {e}"
-        return False, all_logs
-
-    all_logs += f"Found services: {', '.join(services)}\n"
-
-    build_env = os.environ.copy()
+    build_env = read_env_file(os.path.join(repo_dir, ".env"))
+    build_env.update(os.environ)
     build_env["DOCKER_USERNAME"] = username
-
     default_tag = f"{main_branch}-{commit_sha[:7]}"
     build_env["IMAGE_TAG"] = default_tag
-
+    build_env["BUILD_DATE"] = build_date
     all_logs += f"Using DOCKER_USERNAME={username} and IMAGE_TAG={default_tag}"
-    all_logs += "(can be overridden by compose file)\n"
-
-    success, build_log = run_command(
-        ["docker-compose", "-f", compose_file_path, "build"],
-        working_dir=repo_dir,
-        env=build_env
-    )
-    all_logs += "\n--- Docker Compose Build Logs ---\n" + build_log
-
-    if not success:
-        all_logs += "\nError: Docker Compose build failed.\n"
-        return False, all_logs
-
-    all_logs += "\nDocker Compose build successful.\n"
+    all_logs += " (can be overridden by compose file)\n"
 
     try:
-        result = subprocess.run(
-            ["docker-compose", "-f", compose_file_path, "config", "--images"],
-            capture_output=True, text=True, check=True, cwd=repo_dir, env=build_env
-        )
-        image_names_from_compose = [
-            img.strip() for img in result.stdout.splitlines()
-            if img.strip()
-        ]
-        all_logs += "\nImages listed by 'docker-compose config --images':"
-        all_logs += f" {', '.join(image_names_from_compose)}\n"
-    except Exception as e:
-        all_logs += "\nError getting image names from"
-        all_logs += f" 'docker-compose config --images': {e}\n"
-        all_logs += "This might happen if services do not have an"
-        all_logs += "'image' or 'build' directive properly set.\n"
+        with open(compose_file_path, "r", encoding="UTF-8") as f:
+            services = load_compose_services(f.read(), repo_dir, build_env)
+        dependencies = build_dependencies(services)
+    except (OSError, ComposeError) as e:
+        all_logs += f"Error reading docker-compose file: {e}\n"
         return False, all_logs
-    if not image_names_from_compose:
-        all_logs += "\nNo images found by 'docker-compose config --images'"
-        all_logs += ". Nothing to push.\n"
-        return True, all_logs
-
-    all_logs += "\nAttempting to push images using 'docker-compose push'...\n"
-    all_logs += "This relies on 'image:' directives in the compose file being correctly"
-    all_logs += "formatted for a remote registry (e.g., 'username/imagename:tag').\n"
 
-    success_push_all, push_all_log = run_command(
-        ["docker-compose", "-f", compose_file_path, "push"],
-        working_dir=repo_dir,
-        env=build_env
-    )
-    all_logs += "\n--- Docker Compose Push All Logs ---\n" + push_all_log
-    if not success_push_all:
-        all_logs += "\nWarning: 'docker-compose push' (all services) reported an issue.\n"
+    if not dependencies:
+        all_logs += "No services with a build section. Nothing to build or push.\n"
+        return True, all_logs
+    all_logs += f"Services to build: {', '.join(sorted(dependencies))}\n"
+
+    output_lock = threading.Lock()
+
+    def service_output(name: str) -> Callable[[str], None] | None:
+        if on_output is None:
+            return None
+
+        def forward(line: str):
+            with output_lock:
+                on_output(f"[{name}] {line}")
+        return forward
+
+    results: dict[str, tuple[bool, str, float]] = {}
+    pending = {name: set(deps) for name, deps in dependencies.items()}
+    running = {}
+    with ThreadPoolExecutor(max_workers=COMPOSE_MAX_PARALLEL) as pool:
+        while pending or running:
+            failed = {name for name, result in results.items() if not result[0]}
+            for name in sorted(pending):
+                if pending[name] & failed:
+                    skipped = f"\nSkipped {name}: a dependency failed.\n"
+                    results[name] = (False, skipped, 0.0)
+                    del pending[name]
+                elif not pending[name] - results.keys():
+                    running[pool.submit(
+                        _build_push_compose_service,
+                        services[name],
+                        repo_dir,
+                        compose_file_path,
+                        build_env,
+                        service_output(name),
+                        steps,
+                        pipeline_id
+                    )] = name
+                    del pending[name]
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except PipelineSuperseded:
+                    raise
+                except Exception as e:
+                    results[name] = (False, f"\nError building {name}: {e}\n", 0.0)
+
+    all_logs += "".join(results[name][1] for name in sorted(results))
+    all_logs += "\n--- Compose service summary ---\n"
+    for name in sorted(results):
+        success, _, seconds = results[name]
+        all_logs += f"{name}: {'ok' if success else 'FAILED'} ({seconds:.1f}s)\n"
+
+    if not all(result[0] for result in results.values()):
+        all_logs += "\nError: Docker Compose build or push failed.\n"
         all_logs += "Please ensure image: directives in your docker-compose.yml are like"
-        all_logs += "'${DOCKER_USERNAME}/myimage:${IMAGE_TAG}' and that you are logged"
-        all_logs += "into the Docker registry.\n"
+        all_logs += " '${DOCKER_USERNAME}/myimage:${IMAGE_TAG}' and that you are logged"
+        all_logs += " into the Docker registry.\n"
         return False, all_logs
-    all_logs += "\nManually tagging and pushing images if necessary...\n"
-    # push_failed_for_some = False
-    # for image_name in image_names_from_compose:
-    #     # npr: image_name moze biti "myproject" ili "myuser/myproject:latest"
-    #     # Treba da osiguramo da je tagovano za pravog korisnika i sa pravim tagom
-    #     target_image_name = ""
-    #     image_parts = image_name.split('/')
-    #     image_tag_parts = image_parts[-1].split(':')
-    #     base_img_name_from_compose = image_tag_parts[0]
-    #
-    #     if len(image_parts) > 1 and image_parts[0] == username:
-    #
-    #         target_image_name = f"{username}/{base_img_name_from_compose}:{default_tag}"
-    #     else:
-    #         # Nema username, ili je pogresan, npr. imagename:tag or imagename
-    #         # Koristi username iz CI konfiguracije.
-    #         # base_image_name_from_compose je samo 'imagename' deo
-    #         target_image_name = f"{username}/{base_img_name_from_compose}:{default_tag}"
-    #
-    #     if image_name != target_image_name:
-    #         all_logs += f"Tagging '{image_name}' as '{target_image_name}'\n"
-    #         tag_success, tag_log = run_command(
-    #               ["docker", "tag", image_name, target_image_name]
-    #         )
-    #         all_logs += tag_log + "\n"
-    #         if not tag_success:
-    #           all_logs += f"Error tagging {image_name}. Skipping push for this image.\n"
-    #             push_failed_for_some = True
-    #             continue
-    #     else:
-    #         all_logs += f"Image '{image_name}' is already correctly"
-    #         all_logs += "named/tagged for push.\n"
-    #         target_image_name = image_name
-    #
-    #     all_logs += f"Pushing {target_image_name}...\n"
-    #     push_success, individual_push_log = run_command(
-    #           ["docker", "push", target_image_name]
-    #      )
-    #     all_logs += individual_push_log + "\n"
-    #     if not push_success:
-    #         all_logs += f"Error pushing {target_image_name}.\n"
-    #         push_failed_for_some = True
-    #
-    # if push_failed_for_some:
-    #     all_logs += "\nError: One or more images failed to push.\n"
-    #     return False, all_logs #
+    all_logs += f"\nDocker Compose {' and '.join(steps)} successful.\n"
+    return True, all_logs
 
 
 def update_pipeline_status(
@@ -308,31 +535,23 @@ def update_pipeline_status(
                 PipelineStatusEnum.FAILED_GIT,
                 PipelineStatusEnum.FAILED_DOCKER_BUILD,
                 PipelineStatusEnum.FAILED_DOCKER_DEPLOY,
-                PipelineStatusEnum.UNKNOWN
+                PipelineStatusEnum.UNKNOWN,
+                PipelineStatusEnum.SUPERSEDED
             ]
             if is_final_status and not pipeline_run.end_time:
                 pipeline_run.end_time = datetime.now(tz=timezone.utc)
 
+            chunk = None
             if logs_to_append:
-                timestamp = datetime.now(
-                    tz=timezone.utc
-                ).strftime("%Y-%m-%d %H:%M:%S UTC")
-                new_log_entry = (
-                    f"\n--- {timestamp} ---\n{logs_to_append.strip()}\n"
-                )
-                pipeline_run.logs = (
-                    pipeline_run.logs + new_log_entry
-                    if pipeline_run.logs
-                    else new_log_entry.strip()
-                )
-                max_log_length = 20000
-                if len(pipeline_run.logs) > max_log_length:
-                    pipeline_run.logs = (
-                        "... (logs truncated)\n"
-                        + pipeline_run.logs[-max_log_length:]
-                    )
-
-                db.commit()
+                chunk = append_pipeline_log(db, run_id, logs_to_append)
+
+            db.commit()
+            send_redis_log_event(run_id, {
+                "type": "log" if chunk else "status",
+                "status": status.name,
+                "offset": chunk.start_offset if chunk else None,
+                "logs": chunk.content if chunk else None,
+            })
             print(f"PipelineRun ID={run_id} status updated to {status.name}")
         else:
             print(f"ERROR: PipelineRun with ID={run_id} not found for status update.")
@@ -342,172 +561,381 @@ def update_pipeline_status(
         traceback.print_exc()
 
 
+class PipelineLogForwarder:
+    """
+    Receives streamed command output line by line and forwards it in small
+    batches to the pipeline run logs (and with them to the run's log stream).
+    Batches are flushed every `flush_lines` lines or `flush_interval` seconds.
+    When `cancel_check` returns True at a flush, PipelineSuperseded is raised
+    to stop the running command.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        run_id: int,
+        status: PipelineStatusEnum,
+        flush_lines: int = 100,
+        flush_interval: float = 2.0,
+        prefix: str = "",
+        cancel_check: Callable[[], bool] | None = None
+    ):
+        self.db = db
+        self.run_id = run_id
+        self.status = status
+        self.prefix = prefix
+        self.cancel_check = cancel_check
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self._buffer: list[str] = []
+        self._last_flush = time.monotonic()
+
+    def __call__(self, line: str):
+        self._buffer.append(self.prefix + line)
+        if (
+            len(self._buffer) >= self.flush_lines
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+            if self.cancel_check and self.cancel_check():
+                raise PipelineSuperseded()
+
+    def set_status(self, status: PipelineStatusEnum):
+        self.flush()
+        self.status = status
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        chunk = "\n".join(self._buffer)
+        self._buffer = []
+        update_pipeline_status(self.db, self.run_id, self.status, chunk)
+
+
+def prepare_git_auth(config: RepoConfig) -> tuple[str, dict, str | None, str]:
+    """
+    Returns (repo url, git env, ssh key path, logs) for cloning the config's
+    repository. With an SSH key the URL is converted to SSH form and the key is
+    written to a temporary file the caller has to remove.
+    """
+    logs = ""
+    git_command_env = os.environ.copy()
+    actual_repo_url = config.repo_url
+    ssh_key_path = None
+    if not (config.use_ssh_for_clone and config.git_ssh_private_key_encrypted):
+        return actual_repo_url, git_command_env, ssh_key_path, logs
+
+    logs += "\nAttempting to use SSH for cloning...\n"
+    try:
+        private_key = decrypt_data(config.git_ssh_private_key_encrypted)
+
+        if actual_repo_url.startswith("https://"):
+            actual_repo_url = actual_repo_url.replace(
+                "https://",
+                "git@"
+            ).replace(
+                "/",
+                ":",
+                1
+            )
+            if not actual_repo_url.endswith(".git"):
+                actual_repo_url += ".git"
+            logs += f"\nConverted repo URL to SSH format: {actual_repo_url}"
+
+        with tempfile.NamedTemporaryFile(
+            delete=False,
+            mode='w',
+            prefix='ssh_key_'
+        ) as tmp_key_file:
+            os.chmod(tmp_key_file.name, 0o600)
+            tmp_key_file.write(private_key)
+            ssh_key_path = tmp_key_file.name
+
+        git_command_env["GIT_SSH_COMMAND"] = (
+            f"ssh -i {ssh_key_path} "
+            "-o IdentitiesOnly=yes "
+            "-o StrictHostKeyChecking=no "
+            "-o UserKnownHostsFile=/dev/null"
+        )
+        logs += f"\nUsing temporary SSH key: {ssh_key_path}"
+    except Exception as e:
+        logs += f"\nError setting up SSH key: {e}."
+        logs += "Falling back to default git auth.\n"
+    return actual_repo_url, git_command_env, ssh_key_path, logs
+
+
 def handle_git_update(
-    config_id: int,
     repo_url: str,
     main_branch: str,
-    workspace_dir: str
-) -> bool:
-    repo_path = os.path.join(workspace_dir, f"{config_id}")
-    if not os.path.exists(workspace_dir):
-        try:
-            os.makedirs(workspace_dir)
-            print(f"Created directory: {workspace_dir}")
-        except OSError as e:
-            print(f"Error: cannot create directory {workspace_dir}: {e}")
-            return False
-
-    if os.path.exists(repo_path):
-        print(f"Repo exists in {repo_path}. Trying git pull...")
-        if not run_command(
-            ["git", "checkout", main_branch],
-            working_dir=repo_path
-        ):
-            print(f"Error: cannot switch to branch {main_branch}")
-            return False
-        if not run_command(
-            ["git", "pull", "origin", main_branch],
-            working_dir=repo_path
-        ):
-            print("Error git pull didnt work")
-            return False
-    else:
-        print(f"Repo doesn't exist in {repo_path}. Trying git clone")
-        if not run_command(
-            [
-                "git", "clone", "--branch",
-                main_branch,
-                repo_url,
-                repo_path
-            ]
-        ):
-            print("Error: git clone failed.")
-            return False
+    commit_sha: str | None,
+    workspace_dir: str,
+    run_id: int | str,
+    env: dict | None = None,
+    on_output: Callable[[str], None] | None = None,
+    shallow: bool = False,
+    fetch_filter: str | None = None
+) -> tuple[bool, str, str]:
+    """
+    Prepares the checkout for one pipeline run. Returns (success, logs, path).
+    With `shallow` only the pushed commit is fetched, at depth 1, into an empty
+    directory. Otherwise (or when the server refuses to serve a single commit)
+    the repository is fetched into a bare mirror shared by every config that
+    points at it and the commit is checked out into a worktree of that mirror.
+    """
+    mirror_dir = mirror_path(workspace_dir, repo_url)
+    worktree_dir = run_worktree_path(workspace_dir, run_id)
+    revision = commit_sha or f"refs/heads/{main_branch}"
+    git_logs = ""
+
+    if shallow:
+        git_logs += f"Fetching {revision} at depth 1\n"
+        success, log = shallow_fetch(
+            run_command, repo_url, worktree_dir, revision,
+            fetch_filter=fetch_filter, env=env, on_output=on_output
+        )
+        git_logs += log
+        if success:
+            print(f"Commit {revision} of {repo_url} fetched into {worktree_dir}")
+            return True, git_logs, worktree_dir
+        shutil.rmtree(worktree_dir, ignore_errors=True)
+        git_logs += "Shallow fetch failed, falling back to the repository mirror.\n"
+
+    git_logs += f"Using repository mirror {mirror_dir}\n"
+
+    with mirror_lock(mirror_dir):
+        success, log = update_mirror(
+            run_command, repo_url, mirror_dir, env=env, on_output=on_output
+        )
+        git_logs += log
+        if not success:
+            print(f"Error: cannot update mirror for {repo_url}")
+            return False, git_logs, worktree_dir
+
+        success, log = add_worktree(
+            run_command, mirror_dir, worktree_dir, revision,
+            env=env, on_output=on_output
+        )
+        git_logs += log
+        if not success:
+            print(f"Error: cannot check out {revision} from {mirror_dir}")
+            return False, git_logs, worktree_dir
 
     print(
-        f"Code for repo {repo_url} on branch {main_branch}",
-        f" is updated in {repo_path}"
+        f"Code for repo {repo_url} at {revision}",
+        f" is checked out in {worktree_dir}"
     )
-    return True
+    return True, git_logs, worktree_dir
+
+
+def cleanup_git_checkout(repo_url: str, workspace_dir: str, run_id: int | str):
+    mirror_dir = mirror_path(workspace_dir, repo_url)
+    worktree_dir = run_worktree_path(workspace_dir, run_id)
+    if not os.path.exists(worktree_dir):
+        return
+    if is_shallow_checkout(worktree_dir):
+        shutil.rmtree(worktree_dir, ignore_errors=True)
+        print(f"Removed checkout {worktree_dir}")
+        return
+    with mirror_lock(mirror_dir):
+        remove_worktree(run_command, mirror_dir, worktree_dir)
+    print(f"Removed worktree {worktree_dir}")
 
 
 def is_compose_file_safe(compose_content: str) -> bool:
-    if 'privileged: true' in compose_content:
-        print("Warning: docker-compose file contains 'privileged: true'")
-        return False
-    return True
+    findings = scan_compose_file(compose_content)
+    for finding in findings:
+        print(f"Warning: {finding.format('docker-compose')}")
+    return not has_blocking_findings(findings)
 
 
 def is_dockerfile_safe(dockerfile_content: str) -> bool:
-    banned_patterns = [
-        'docker.sock',
-        'privileged',
-        'ADD http',
-        'ADD https',
-        'curl .*\\|',
-        'wget .*\\|',
-        'chmod 777',
-        'chown root',
-        '--cap-add',
-    ]
-    for pattern in banned_patterns:
-        if re.search(pattern, dockerfile_content, re.IGNORECASE):
-            return False
-    return True
-
-
-def find_dockerfile(repo_dir: str) -> str | None:
-    possible_names = [
-        "Dockerfile",
-        "dockerfile",
-        "Dockerfile.dev",
-        "Dockerfile.prod",
-        "Dockerfile.test"
-    ]
-    print(repo_dir)
-    for name in possible_names:
-        dockerfile_path = os.path.join(repo_dir, name)
-        if os.path.isfile(dockerfile_path):
-            return dockerfile_path
-
-    return None
-
-
-def build_deploy_docker(
-        repo_dir: str,
-        image_name: str,
-        container_name: str,
-        username: str) -> tuple[bool, str]:
-    all_logs = ""
-    build_date = datetime.utcnow().isoformat()
-    try:
-        commit_sha = subprocess.getoutput("git rev-parse --short HEAD")
-    except Exception:
-        commit_sha = "Unknown"
+    findings = scan_dockerfile(dockerfile_content)
+    for finding in findings:
+        print(f"Warning: {finding.format('Dockerfile')}")
+    return not has_blocking_findings(findings)
 
-    all_logs += f"Starting Build and Deploy for {image_name}\n"
-    all_logs += "Target platforms: linux/amd64, linux/arm64\n"
-    all_logs += f"Commit: {commit_sha}\nBuild date: {build_date}\n"
 
-    all_logs += "Building Docker image...\n"
-    print("Building Multiplatform Docker image...")
-    dockerfile_loc = find_dockerfile(repo_dir)
-    if dockerfile_loc is None:
-        all_logs += "Docker image not found\n"
-        return False, all_logs
+def parse_build_platforms(value: str | None) -> list[str]:
+    platforms = [item.strip() for item in (value or "").split(",") if item.strip()]
+    return platforms or DEFAULT_BUILD_PLATFORMS.split(",")
 
-    all_logs += f"Docker image found at {dockerfile_loc}\n"
-    with open(dockerfile_loc, "r") as f:
-        dockerfile = f.read()
 
-    if not is_dockerfile_safe(dockerfile):
-        all_logs += "Docker image is not safe\n"
-        return False, all_logs
+def platform_tag(image_ref: str, platform: str) -> str:
+    """Tag the single-platform image of `platform` is pushed under."""
+    return f"{image_ref}:{platform.replace('/', '-')}"
 
-    all_logs += "Docker image is safe...\n"
-    success, build_log = run_command([
-        "docker", "buildx", "build",
-        "--platform", "linux/amd64,linux/arm64",
-        "-t", f"{username}/{image_name}",
-        "--build-arg", f"BUILD_DATE={build_date}",
-        "--build-arg", f"COMMIT_SHA={commit_sha}",
-        "--label", f"org.opencontainers.image.created={build_date}",
-        "--label", f"org.opencontainers.image.revision={commit_sha}",
-        ".", "--push"
-    ], working_dir=repo_dir)
-    all_logs += build_log
-
-    if not success:
-        print("Error: Docker build failed. Tests or linting might have failed")
-        all_logs += "Error: Docker build failed.\n"
-        return False, all_logs
 
-    old_container_parts = container_name.split("-")
-    old_id = int(old_container_parts[-1])-1
-    old_container_name = "-".join(old_container_parts[:-1] + [str(old_id)])
-    print("Stopping and removing existing container")
-    _, rm_log = run_command([
-        "docker", "rm", "-f", old_container_name
-    ])
-    all_logs += "\n--- Removing Container Logs ---\n"
-    all_logs += rm_log + "\n"
-
-    # print("Running tests inside temporary container...")
-    # run_success, run_log = run_command([
-    #     "docker", "run", "-d",
-    #     "--name", container_name,
-    #     "-p", "8080:80",
-    #     f"{username}/{image_name}"
-    # ])
-    # all_logs += "\n--- Run container log---\n" + run_log + "\n"
-    # if not run_success:
-    #     print("Error: Failed to run Docker container")
-    #     run_command(["docker", "rm", "-f", container_name])
-    #     return False, all_logs
-    # all_logs += f"Docker container '{container_name}' successfully started.\n"
-    # all_logs += f"--- Docker Build & Deploy finished for image: {image_name} ---\n"
-    all_logs += "Skipped deploy due to security reasons.\n"
-    return True, all_logs
+def staging_ref(image_ref: str, pipeline_id: int, service: str | None = None) -> str:
+    """
+    Where the build stage pushes the run's image, in the image's repository,
+    for the push stage to copy under the final tag.
+    """
+    name = image_ref.split("@", 1)[0]
+    repository, _, tag = name.rpartition(":")
+    if repository and "/" not in tag:
+        name = repository
+    suffix = f"-{service}" if service else ""
+    return f"{name}:{STAGING_TAG_PREFIX}{pipeline_id}{suffix}"
+
+
+def promote_image(
+    staged_ref: str,
+    image_ref: str,
+    on_output: Callable[[str], None] | None = None
+) -> tuple[bool, str]:
+    """
+    Tags the staged image as `image_ref` in the registry. Only the manifest is
+    written, so any host can do it without the image or the build cache.
+    """
+    return run_command(
+        ["docker", "buildx", "imagetools", "create", "-t", image_ref, staged_ref],
+        on_output=on_output
+    )
+
+
+def buildx_build_push(
+    repo_dir: str,
+    image_ref: str,
+    platforms: list[str],
+    dockerfile_path: str,
+    commit_sha: str,
+    build_date: str,
+    cache_key: str | None = None,
+    on_output: Callable[[str], None] | None = None
+) -> tuple[bool, str]:
+    """Builds `platforms` with `docker buildx build` and pushes them as `image_ref`."""
+    logs = f"Using Dockerfile {dockerfile_path}\n"
+    cache_args, cache_incoming = [], None
+    if cache_key:
+        cache_args, cache_incoming = prepare_build_cache(cache_key)
+        logs += f"Using build cache {cache_key}\n"
+    try:
+        success, build_log = run_command([
+            "docker", "buildx", "build",
+            "--progress", "plain",
+            *cache_args,
+            "--platform", ",".join(platforms),
+            "-t", image_ref,
+            "--build-arg", f"BUILD_DATE={build_date}",
+            "--build-arg", f"COMMIT_SHA={commit_sha}",
+            "--label", f"org.opencontainers.image.created={build_date}",
+            "--label", f"org.opencontainers.image.revision={commit_sha}",
+            "-f", dockerfile_path,
+            ".", "--push"
+        ], working_dir=repo_dir, on_output=on_output)
+    except PipelineSuperseded:
+        if cache_incoming:
+            commit_build_cache(cache_key, cache_incoming, False)
+        raise
+    logs += build_log
+    if cache_incoming:
+        logs += commit_build_cache(cache_key, cache_incoming, success)
+    return success, logs
+
+
+def finish_pipeline_run(db: Session, run_id: int):
+    """Closes the run's log stream and archives its logs."""
+    final_run = db.get(PipelineRuns, run_id)
+    send_redis_log_event(run_id, {
+        "type": "end",
+        "status": final_run.status.name if final_run else None,
+    }, finished=True)
+    archive_pipeline_log(db, run_id)
+
+
+def end_run(
+    db: Session,
+    ctx: dict,
+    status: PipelineStatusEnum,
+    logs: str,
+    user_status: str
+):
+    """Gives the run its final status and tells the user; later stages skip."""
+    with notifier.batch():
+        update_pipeline_status(db, ctx["pipeline_id"], status, logs)
+        ctx["status"] = status.name
+        ctx["message"]["status"] = user_status
+        send_redis_message(ctx["user_channel"], ctx["message"])
+
+
+def stage_log_forwarder(
+    db: Session,
+    ctx: dict,
+    status: PipelineStatusEnum
+) -> PipelineLogForwarder:
+    return PipelineLogForwarder(
+        db,
+        ctx["pipeline_id"],
+        status,
+        cancel_check=(
+            (lambda: is_superseded(redis_client, ctx["config_id"], ctx["push_seq"]))
+            if CANCEL_SUPERSEDED_RUNS else None
+        )
+    )
+
+
+def pipeline_stage(name: str, check_superseded: bool = False, **task_options):
+    """
+    Turns `func(task, db, ctx)` into the Celery task tasks.pipeline_<name>.
+    The task receives the run context from the previous stage and returns it
+    to the next one. It does nothing once the run has ended, resumes the
+    run's workspace lock for its duration and turns a superseded run or an
+    unexpected error into the final status of the run. With
+    `check_superseded` it first stops a run a newer push superseded.
+    """
+    def decorator(func):
+        @app.task(name=f"tasks.pipeline_{name}", bind=True, **task_options)
+        @functools.wraps(func)
+        def stage(self, ctx: dict) -> dict:
+            if ctx.get("status") or ctx.get("handed_off"):
+                return ctx
+            db_task = SessionLocal()
+            workspace_lock = None
+            try:
+                if ctx.get("lock_token") and redis_client is not None:
+                    workspace_lock = LeaseLock(
+                        redis_client,
+                        config_lock_name(ctx["config_id"]),
+                        ctx["pipeline_id"],
+                        token=ctx["lock_token"]
+                    )
+                    if not workspace_lock.resume():
+                        raise RuntimeError(
+                            "Lost the workspace lock to another run of this config."
+                        )
+                if check_superseded and is_superseded(
+                    redis_client, ctx["config_id"], ctx["push_seq"]
+                ):
+                    raise PipelineSuperseded()
+                func(self, db_task, ctx)
+            except Retry:
+                raise
+            except PipelineSuperseded:
+                print(f"PipelineRun ID={ctx['pipeline_id']} superseded by a newer push")
+                end_run(
+                    db_task, ctx, PipelineStatusEnum.SUPERSEDED,
+                    "A newer push was queued for this config, stopped this run.",
+                    "Superseded by a newer push."
+                )
+            except Exception as e:
+                error_message = (
+                    f"Unhandled exception in stage {name} for PipelineRun "
+                    f"ID={ctx['pipeline_id']}: {e}\n{traceback.format_exc()}"
+                )
+                print(error_message)
+                end_run(
+                    db_task, ctx, PipelineStatusEnum.UNKNOWN,
+                    f"\n--- ERROR ---\n{error_message}",
+                    "Unknown error has occured. Check logs."
+                )
+            finally:
+                if workspace_lock:
+                    workspace_lock.hand_over()
+                db_task.close()
+            return ctx
+        return stage
+    return decorator
 
 
 @app.task(name="tasks.process_push")
@@ -520,12 +948,13 @@ def process_push(
     main_branch: str,
     docker_username: str
 ):
+    """
+    Creates the pipeline run, registers it as the config's newest push,
+    queues it for the config's workspace lock and starts the stage chain:
+    lock, checkout, scan, build, push and finalize. Returns the pipeline run id.
+    """
     db_task = SessionLocal()
     pipeline_id = None
-    status_log = initial_logs
-    WORKSPACE_DIR = "ci_workspace"
-    ssh_key_path = None
-
     try:
         config = (
             db_task.query(RepoConfig)
@@ -534,307 +963,676 @@ def process_push(
         if not config:
             print(f"Config ID: {config_id} not found in Celery Task!")
             return
+        if github_delivery_id:
+            existing_run = (
+                db_task.query(PipelineRuns.id)
+                .filter(PipelineRuns.trigger_event_id == github_delivery_id)
+                .first()
+            )
+            if existing_run:
+                print(
+                    f"Delivery {github_delivery_id} already has"
+                    f" PipelineRun ID={existing_run.id}, not starting another one."
+                )
+                record_delivery_run(redis_client, github_delivery_id, existing_run.id)
+                return existing_run.id
         pipeline_run = PipelineRuns(
             status=PipelineStatusEnum.PENDING,
             commit_sha=commit_sha,
-            trigger_event_id=github_delivery_id,
-            logs=status_log.strip()
+            trigger_event_id=github_delivery_id
         )
         pipeline_run.config = config
         db_task.add(pipeline_run)
+        db_task.flush()
+        append_pipeline_log(db_task, pipeline_run.id, initial_logs)
         db_task.commit()
         db_task.refresh(pipeline_run)
         pipeline_id = pipeline_run.id
         print(f"Celery task started for PipelineRun ID={pipeline_id}")
-        update_pipeline_status(
-            db_task,
-            pipeline_id,
-            PipelineStatusEnum.RUNNING_GIT,
-            "Starting Git operations..."
-        )
+        record_delivery_run(redis_client, github_delivery_id, pipeline_id)
+        # Only a new run supersedes the config's earlier ones, a replayed
+        # delivery that found its run above does not.
+        push_seq = next_push_sequence(redis_client, config_id)
+
         user_id = config.users[0].id if config.users else None
-        message = {
-            "config_id": config_id,
+        ctx = {
             "pipeline_id": pipeline_id,
-            "status": "",
-            "user_id": user_id,
+            "config_id": config_id,
+            "commit_sha": commit_sha,
+            "push_seq": push_seq,
+            "main_branch": main_branch,
+            "docker_username": docker_username,
+            "user_channel": f"user-notifications-{user_id}",
+            "message": {
+                "config_id": config_id,
+                "pipeline_id": pipeline_id,
+                "status": "",
+                "user_id": user_id,
+            },
+            "lock_token": None,
+            "status": None,
         }
-        user_channel = f"user-notifications-{user_id}"
-        repo_path_celery = os.path.join(WORKSPACE_DIR, str(config_id))
-        if not os.path.exists(WORKSPACE_DIR):
-            try:
-                os.makedirs(WORKSPACE_DIR)
-            except OSError as e:
-                status_log += f"\nError: cannot create directory {WORKSPACE_DIR}: {e}"
-                update_pipeline_status(
-                    db_task,
-                    pipeline_id,
-                    PipelineStatusEnum.FAILED_GIT,
-                    status_log
-                )
-                # save_logs_to_file(pipeline_id, status_log)
-                db_task.close()
-                return
-
-        git_command_env = os.environ.copy()
-        actual_repo_url = config.repo_url
 
-        if config.use_ssh_for_clone and config.git_ssh_private_key_encrypted:
-            status_log += "\nAttempting to use SSH for cloning...\n"
-            try:
-                private_key = decrypt_data(config.git_ssh_private_key_encrypted)
-
-                if actual_repo_url.startswith("https://"):
-                    actual_repo_url = actual_repo_url.replace(
-                        "https://",
-                        "git@"
-                    ).replace(
-                        "/",
-                        ":",
-                        1
-                    )
-                    if not actual_repo_url.endswith(".git"):
-                        actual_repo_url += ".git"
-                    status_log += f"\nConverted repo URL to SSH format: {actual_repo_url}"
-
-                with tempfile.NamedTemporaryFile(
-                    delete=False,
-                    mode='w',
-                    prefix='ssh_key_'
-                ) as tmp_key_file:
-                    os.chmod(tmp_key_file.name, 0o600)
-                    tmp_key_file.write(private_key)
-                    ssh_key_path = tmp_key_file.name
-
-                git_command_env["GIT_SSH_COMMAND"] = (
-                    f"ssh -i {ssh_key_path} "
-                    "-o IdentitiesOnly=yes "
-                    "-o StrictHostKeyChecking=no "
-                    "-o UserKnownHostsFile=/dev/null"
-                )
-                status_log += f"\nUsing temporary SSH key: {ssh_key_path}"
-            except Exception as e:
-                status_log += f"\nError setting up SSH key: {e}."
-                status_log += "Falling back to default git auth.\n"
-
-        git_success_flag = True
-        git_log_output = ""
-        if os.path.exists(repo_path_celery):
-            success_checkout, log_checkout = run_command(
-                ["git", "checkout", main_branch],
-                working_dir=repo_path_celery,
-                env=git_command_env
+        if is_superseded(redis_client, config_id, push_seq):
+            update_pipeline_status(
+                db_task,
+                pipeline_id,
+                PipelineStatusEnum.SUPERSEDED,
+                "A newer push was queued for this config, skipping this commit."
+            )
+            ctx["status"] = PipelineStatusEnum.SUPERSEDED.name
+        elif redis_client is not None:
+            # Joins the config's queue now, so runs keep the order of their pushes.
+            workspace_lock = LeaseLock(
+                redis_client, config_lock_name(config_id), pipeline_id
             )
-            git_log_output += log_checkout + "\n"
-            if not success_checkout:
-                git_success_flag = False
+            ctx["lock_waiter"] = {
+                "token": workspace_lock.token,
+                "queued_at": time.time(),
+            }
+            if workspace_lock.try_acquire(ctx["lock_waiter"]["queued_at"]):
+                ctx["lock_token"] = workspace_lock.token
+                workspace_lock.hand_over()
             else:
-                success_pull, log_pull = run_command(
-                    ["git", "pull", "origin", main_branch],
-                    working_dir=repo_path_celery,
-                    env=git_command_env
+                update_pipeline_status(
+                    db_task,
+                    pipeline_id,
+                    PipelineStatusEnum.PENDING,
+                    f"Waiting for the workspace lock of config {config_id}..."
                 )
-                git_log_output += log_pull
-                if not success_pull:
-                    git_success_flag = False
-        else:
-            success_clone, log_clone = run_command(
-                [
-                    "git",
-                    "clone",
-                    "--branch",
-                    main_branch,
-                    actual_repo_url,
-                    repo_path_celery
-                ],
-                env=git_command_env
-            )
-            git_log_output += log_clone
-            if not success_clone:
-                git_success_flag = False
-
-        status_log += "\n--- Git Logs ---\n" + git_log_output
-        if not git_success_flag:
+    except Exception as e:
+        error_message = (
+            "Unhandled exception in Celery task for PipelineRun" +
+            f"ID={pipeline_id}: {e}\n{traceback.format_exc()}"
+        )
+        print(error_message)
+        if pipeline_id:
             update_pipeline_status(
                 db_task,
                 pipeline_id,
-                PipelineStatusEnum.FAILED_GIT,
-                status_log
+                PipelineStatusEnum.UNKNOWN,
+                f"\n--- ERROR ---\n{error_message}"
+            )
+            finish_pipeline_run(db_task, pipeline_id)
+        return pipeline_id
+    finally:
+        db_task.close()
+
+    chain(
+        pipeline_lock.s(ctx),
+        pipeline_checkout.s(),
+        pipeline_scan.s(),
+        pipeline_build.s(),
+        pipeline_push.s(),
+        pipeline_finalize.s()
+    ).apply_async()
+    return pipeline_id
+
+
+@pipeline_stage("lock", check_superseded=True, max_retries=None)
+def pipeline_lock(task, db_task: Session, ctx: dict):
+    """
+    Waits for the config's workspace lock without keeping a worker busy:
+    while an earlier run holds it, the task is retried every
+    CI_LOCK_RETRY_SECONDS, up to CI_LOCK_WAIT_SECONDS after the push.
+    """
+    waiter = ctx.get("lock_waiter")
+    if ctx.get("lock_token") or not waiter or redis_client is None:
+        return
+    workspace_lock = LeaseLock(
+        redis_client,
+        config_lock_name(ctx["config_id"]),
+        ctx["pipeline_id"],
+        token=waiter["token"]
+    )
+    if workspace_lock.try_acquire(waiter["queued_at"]):
+        ctx["lock_token"] = workspace_lock.token
+        workspace_lock.hand_over()
+        return
+    if time.time() - waiter["queued_at"] >= LOCK_WAIT_SECONDS:
+        workspace_lock.release()
+        end_run(
+            db_task, ctx, PipelineStatusEnum.FAILED_GIT,
+            "Timed out waiting for the workspace lock.",
+            "Timed out waiting for an earlier run of this config."
+        )
+        return
+    raise task.retry(args=(ctx,), countdown=LOCK_RETRY_SECONDS)
+
+
+@pipeline_stage("checkout", check_superseded=True)
+def pipeline_checkout(task, db_task: Session, ctx: dict):
+    pipeline_id = ctx["pipeline_id"]
+    config = db_task.get(RepoConfig, ctx["config_id"])
+    update_pipeline_status(
+        db_task,
+        pipeline_id,
+        PipelineStatusEnum.RUNNING_GIT,
+        "Starting Git operations..."
+    )
+    if not os.path.exists(WORKSPACE_DIR):
+        try:
+            os.makedirs(WORKSPACE_DIR)
+        except OSError as e:
+            end_run(
+                db_task, ctx, PipelineStatusEnum.FAILED_GIT,
+                f"\nError: cannot create directory {WORKSPACE_DIR}: {e}",
+                "Failed Git, see logs for more..."
             )
-            message["status"] = "Failed Git, see logs for more..."
-            send_redis_message(user_channel, message)
-            # save_logs_to_file(pipeline_id, status_log)
-            db_task.close()
             return
-        update_pipeline_status(
-            db_task,
-            pipeline_id,
-            PipelineStatusEnum.RUNNING_DOCKER_BUILD,
-            "Git operations successful. Starting Docker build..."
+
+    log_forwarder = stage_log_forwarder(db_task, ctx, PipelineStatusEnum.RUNNING_GIT)
+    actual_repo_url, git_command_env, ssh_key_path, auth_log = prepare_git_auth(config)
+    ctx["repo_url"] = actual_repo_url
+    try:
+        git_success_flag, git_log_output, repo_path_celery = handle_git_update(
+            repo_url=actual_repo_url,
+            main_branch=ctx["main_branch"],
+            commit_sha=ctx["commit_sha"],
+            workspace_dir=WORKSPACE_DIR,
+            run_id=pipeline_id,
+            env=git_command_env,
+            on_output=log_forwarder,
+            shallow=config.shallow_checkout,
+            fetch_filter=config.git_fetch_filter
+        )
+    finally:
+        if ssh_key_path and os.path.exists(ssh_key_path):
+            os.remove(ssh_key_path)
+            print(f"Removed temporary SSH key: {ssh_key_path}")
+    log_forwarder.flush()
+    status_log = auth_log + "\n--- Git Logs ---\n" + git_log_output
+    if not git_success_flag:
+        end_run(
+            db_task, ctx, PipelineStatusEnum.FAILED_GIT, status_log,
+            "Failed Git, see logs for more..."
+        )
+        return
+    ctx["repo_dir"] = repo_path_celery
+    update_pipeline_status(
+        db_task,
+        pipeline_id,
+        PipelineStatusEnum.RUNNING_GIT,
+        status_log + "\nGit operations successful."
+    )
+
+
+@pipeline_stage("scan")
+def pipeline_scan(task, db_task: Session, ctx: dict):
+    pipeline_id = ctx["pipeline_id"]
+    config = db_task.get(RepoConfig, ctx["config_id"])
+    repo_path_celery = ctx["repo_dir"]
+    (
+        pipeline_file_path,
+        pipeline_file_type,
+        pipeline_file_blob
+    ) = discover_pipeline_file(repo_path_celery)
+    if not pipeline_file_path:
+        end_run(
+            db_task, ctx, PipelineStatusEnum.FAILED_DOCKER_BUILD,
+            "No dockerfile or dockercompose file found in the repository.\n",
+            "Failed during docker build phase. "
+            "No dockerfile or docker compose found in the repo."
+        )
+        return
+
+    if not config.docker_username:
+        end_run(
+            db_task, ctx, PipelineStatusEnum.FAILED_DOCKER_BUILD,
+            "Docker username not configured for this repository.",
+            "Failed during docker build phase. "
+            "Docker username not configured for this repo."
+        )
+        return
+
+    file_label = "Dockerfile" if pipeline_file_type == "dockerfile" else "Compose file"
+    scan_logs = f"{file_label} found at {pipeline_file_path}\n"
+    try:
+        findings, scan_cached = scan_pipeline_file(
+            pipeline_file_path,
+            pipeline_file_type,
+            pipeline_file_blob,
+            redis_client
+        )
+    except Exception as e:
+        end_run(
+            db_task, ctx, PipelineStatusEnum.FAILED_DOCKER_BUILD,
+            f"Error reading {file_label} {pipeline_file_path}: {e}",
+            "Failed during docker build phase. "
+            f"Error reading {file_label} in {pipeline_file_path}."
+            " Check if the file really inside that path."
         )
-        pipeline_file_path, pipeline_file_type = find_pipeline_file(repo_path_celery)
-        if not pipeline_file_path:
-            status_log += "No dockerfile or dockercompose file found in the repository.\n"
+        return
+    if scan_cached:
+        scan_logs += "Scan result reused for unchanged file"
+        scan_logs += f" (blob {pipeline_file_blob[:12]})\n"
+    file_name = os.path.basename(pipeline_file_path)
+    for finding in findings:
+        scan_logs += finding.format(file_name) + "\n"
+    if has_blocking_findings(findings):
+        end_run(
+            db_task, ctx, PipelineStatusEnum.FAILED_DOCKER_BUILD,
+            scan_logs + f"{file_label} is not safe\n",
+            f"Failed during docker build phase. {file_label} is not safe. "
+            "See the logs for the offending lines."
+        )
+        return
+
+    try:
+        commit_sha_short = subprocess.getoutput(
+            f"git -C {repo_path_celery} rev-parse --short HEAD"
+        ).strip()
+    except Exception:
+        commit_sha_short = "Unknown"
+    ctx.update({
+        "file_path": pipeline_file_path,
+        "file_type": pipeline_file_type,
+        "commit_sha_short": commit_sha_short,
+        "build_date": datetime.utcnow().isoformat(),
+        "platforms": parse_build_platforms(config.build_platforms),
+        "split_platform_builds": config.split_platform_builds,
+    })
+    if pipeline_file_type == "dockerfile":
+        scan_logs += "Dockerfile is safe...\n"
+        repo_name_part = config.repo_url.split('/')[-1].replace('.git', '')
+        safe_branch_name = ctx["main_branch"].replace('/', '-')
+        generated_image_name = f"ci-{repo_name_part}-{safe_branch_name}-"
+        generated_image_name += f"{ctx['config_id']}-{commit_sha_short}"
+        ctx["image_ref"] = f"{ctx['docker_username']}/{generated_image_name}"
+        scan_logs += f"Generated image name: {ctx['image_ref']}\n"
+    update_pipeline_status(
+        db_task,
+        pipeline_id,
+        PipelineStatusEnum.RUNNING_DOCKER_BUILD,
+        scan_logs
+    )
+
+
+@pipeline_stage("build", check_superseded=True)
+def pipeline_build(task, db_task: Session, ctx: dict):
+    pipeline_id = ctx["pipeline_id"]
+    log_forwarder = stage_log_forwarder(
+        db_task, ctx, PipelineStatusEnum.RUNNING_DOCKER_BUILD
+    )
+    if ctx["file_type"] == "dockerfile":
+        platforms = ctx["platforms"]
+        if ctx["split_platform_builds"] and len(platforms) > 1:
             update_pipeline_status(
                 db_task,
                 pipeline_id,
-                PipelineStatusEnum.FAILED_DOCKER_BUILD,
-                status_log
+                PipelineStatusEnum.RUNNING_DOCKER_BUILD,
+                f"Building {', '.join(platforms)} as separate jobs\n"
             )
-            message["status"] = "Failed during docker build phase. "
-            message["status"] += "No dockerfile or docker compose found in the repo."
-
-            send_redis_message(user_channel, message)
-            db_task.close()
+            dispatch_platform_builds(
+                pipeline_id=pipeline_id,
+                config_id=ctx["config_id"],
+                commit_sha=ctx["commit_sha"],
+                platforms=platforms,
+                image_ref=ctx["image_ref"],
+                dockerfile_name=os.path.relpath(ctx["file_path"], ctx["repo_dir"]),
+                build_date=ctx["build_date"],
+                user_channel=ctx["user_channel"],
+                message=ctx["message"],
+                lock_token=ctx["lock_token"],
+                push_seq=ctx["push_seq"]
+            )
+            ctx["handed_off"] = True
             return
-        all_deploy_logs = ""
-        build_date = datetime.utcnow().isoformat()
-        try:
-            commit_sha_short = subprocess.getoutput(
-                f"git -C {repo_path_celery} rev-parse --short HEAD"
-            ).strip()
-        except Exception:
-            commit_sha_short = "Unknown"
-
-        current_docker_username = config.docker_username
-        if not current_docker_username:
-            error_msg = "Docker username not configured for this repository."
-            status_log += f"\n{error_msg}\n"
+        build_logs = f"Starting Build for {ctx['image_ref']}\n"
+        build_logs += f"Target platforms: {', '.join(platforms)}\n"
+        build_logs += f"Commit: {ctx['commit_sha_short']}\n"
+        build_logs += f"Build date: {ctx['build_date']}\n"
+        print("Building Multiplatform Docker image...")
+        build_success, build_log_output = buildx_build_push(
+            ctx["repo_dir"],
+            staging_ref(ctx["image_ref"], pipeline_id),
+            platforms,
+            ctx["file_path"],
+            ctx["commit_sha_short"],
+            ctx["build_date"],
+            cache_key=config_cache_key(ctx["config_id"]),
+            on_output=log_forwarder
+        )
+        build_logs += build_log_output
+    else:
+        build_success, build_logs = build_push_compose_services(
+            repo_dir=ctx["repo_dir"],
+            compose_file_path=ctx["file_path"],
+            username=ctx["docker_username"],
+            commit_sha=ctx["commit_sha_short"],
+            build_date=ctx["build_date"],
+            main_branch=ctx["main_branch"],
+            on_output=log_forwarder,
+            steps=("build",),
+            pipeline_id=pipeline_id
+        )
+    log_forwarder.flush()
+    build_logs = "\n--- Docker Build Logs ---\n" + build_logs
+    if not build_success:
+        end_run(
+            db_task, ctx, PipelineStatusEnum.FAILED_DOCKER_BUILD,
+            build_logs + "Error: Docker build failed.\n",
+            "Failed during docker build phase. Check the logs for errors."
+        )
+        return
+    update_pipeline_status(
+        db_task,
+        pipeline_id,
+        PipelineStatusEnum.RUNNING_DOCKER_BUILD,
+        build_logs
+    )
+
+
+@pipeline_stage("push")
+def pipeline_push(task, db_task: Session, ctx: dict):
+    """
+    Tags the images the build stage pushed to their staging tags with their
+    final tags. That only writes manifests to the registry, so any push
+    worker can do it. A failed push is retried on its own, up to
+    PUSH_MAX_RETRIES times with a growing delay.
+    """
+    pipeline_id = ctx["pipeline_id"]
+    log_forwarder = stage_log_forwarder(
+        db_task, ctx, PipelineStatusEnum.RUNNING_DOCKER_BUILD
+    )
+    if ctx["file_type"] == "dockerfile":
+        push_success, push_logs = promote_image(
+            staging_ref(ctx["image_ref"], pipeline_id), ctx["image_ref"], log_forwarder
+        )
+    else:
+        push_success, push_logs = build_push_compose_services(
+            repo_dir=ctx["repo_dir"],
+            compose_file_path=ctx["file_path"],
+            username=ctx["docker_username"],
+            commit_sha=ctx["commit_sha_short"],
+            build_date=ctx["build_date"],
+            main_branch=ctx["main_branch"],
+            on_output=log_forwarder,
+            steps=("push",),
+            pipeline_id=pipeline_id
+        )
+    log_forwarder.flush()
+    push_logs = "\n--- Docker Push Logs ---\n" + push_logs
+    if not push_success:
+        if task.request.retries < PUSH_MAX_RETRIES:
+            countdown = PUSH_RETRY_DELAY_SECONDS * 2 ** task.request.retries
             update_pipeline_status(
                 db_task,
                 pipeline_id,
-                PipelineStatusEnum.FAILED_DOCKER_BUILD,
-                error_msg
+                PipelineStatusEnum.RUNNING_DOCKER_BUILD,
+                push_logs + f"Push failed, retrying in {countdown}s.\n"
             )
-            message["status"] = "Failed during docker build phase. "
-            message["status"] += "Docker username not configured for this repo."
-            send_redis_message(user_channel, message)
-            return
+            raise task.retry(countdown=countdown)
+        end_run(
+            db_task, ctx, PipelineStatusEnum.FAILED_DOCKER_BUILD,
+            push_logs + "Error: Docker push failed.\n",
+            "Failed during docker build phase. Check the logs for errors."
+        )
+        return
+    end_run(
+        db_task, ctx, PipelineStatusEnum.SUCCESS,
+        push_logs + "\nSkipped deploy due to security reasons (in Celery task).\n"
+        "Pipeline finished successfully.",
+        "Success!"
+    )
+
 
-        if (pipeline_file_type == "dockerfile"):
-            all_deploy_logs += f"Docker image found at {pipeline_file_path}\n"
+@app.task(name="tasks.pipeline_finalize")
+def pipeline_finalize(ctx: dict):
+    """
+    Last stage, runs for every run: removes the checkout, releases the
+    workspace lock and closes the run's log stream.
+    """
+    pipeline_id = ctx["pipeline_id"]
+    db_task = SessionLocal()
+    try:
+        if ctx.get("repo_url"):
             try:
-                with open(pipeline_file_path, "r", encoding="UTF-8") as f:
-                    dockerfile_content = f.read()
+                cleanup_git_checkout(ctx["repo_url"], WORKSPACE_DIR, pipeline_id)
             except Exception as e:
-                error_msg = f"Error reading Dockerfile {pipeline_file_path}: {e}"
-                status_log += f"\n{error_msg}\n"
-                update_pipeline_status(
-                    db_task,
-                    pipeline_id,
-                    PipelineStatusEnum.FAILED_DOCKER_BUILD,
-                    error_msg
-                )
-                message["status"] = "Failed during docker build phase. "
-                message["status"] += f"Error reading dockerfile in {pipeline_file_path}."
-                message["status"] += " Check if the file really inside that path."
-                send_redis_message(user_channel, message)
-                return
-            if not is_dockerfile_safe(dockerfile_content):
-                all_deploy_logs += "Dockerfile is not safe\n"
+                print(f"Failed to remove worktree for run {pipeline_id}: {e}")
+        # A run that ended while still queued for the lock leaves the queue.
+        # A run handed off to platform builds keeps it, the manifest job
+        # releases it.
+        lock_token = ctx.get("lock_token") or (ctx.get("lock_waiter") or {}).get("token")
+        if lock_token and redis_client is not None and not ctx.get("handed_off"):
+            LeaseLock(
+                redis_client,
+                config_lock_name(ctx["config_id"]),
+                pipeline_id,
+                token=lock_token
+            ).release()
+        if not ctx.get("handed_off"):
+            if not ctx.get("status"):
                 update_pipeline_status(
                     db_task,
                     pipeline_id,
-                    PipelineStatusEnum.FAILED_DOCKER_BUILD,
-                    status_log + "\n" + all_deploy_logs
+                    PipelineStatusEnum.UNKNOWN,
+                    "Pipeline stopped without a final status."
                 )
-                message["status"] = "Failed during docker build phase. "
-                message["status"] += "Dockerfile is not safe. "
-                message["status"] += "Check if the file contains harmful commands."
-                send_redis_message(user_channel, message)
-                return
-            all_deploy_logs += "Dockerfile is safe...\n"
-            repo_name_part = config.repo_url.split('/')[-1].replace('.git', '')
-            safe_branch_name = main_branch.replace('/', '-')
-            generated_image_name = f"ci-{repo_name_part}-{safe_branch_name}-"
-            generated_image_name += f"{config_id}-{commit_sha_short}"
-            generated_container_name = f"ci-container-{config_id}-{commit_sha_short}"
-            all_deploy_logs += "Generated image name:"
-            all_deploy_logs += f" {current_docker_username}/{generated_image_name}\n"
-            build_success, build_log_output = build_deploy_docker(
-                repo_dir=repo_path_celery,
-                image_name=generated_image_name,
-                container_name=generated_container_name,
-                username=docker_username
-            )
-            all_deploy_logs += build_log_output
-        elif (pipeline_file_type == "compose"):
-            update_pipeline_status(
-                db_task,
-                pipeline_id,
-                PipelineStatusEnum.RUNNING_DOCKER_BUILD,
-                "Starting Docker Compose operations..."
-            )
-            build_success, compose_log_output = build_push_compose_services(
-                repo_dir=repo_path_celery,
-                compose_file_path=pipeline_file_path,
-                username=current_docker_username,
-                commit_sha=commit_sha_short,
-                build_date=build_date,
-                main_branch=main_branch
-            )
-            all_deploy_logs += compose_log_output
+            finish_pipeline_run(db_task, pipeline_id)
+    finally:
+        db_task.close()
+    return ctx
 
-        status_log += "\n--- Docker Operations Logs ---\n" + all_deploy_logs
 
-        if not build_success:
-            update_pipeline_status(
-                db_task,
-                pipeline_id,
-                PipelineStatusEnum.FAILED_DOCKER_BUILD,
-                status_log
-            )
-            message["status"] = "Failed during docker build phase. "
-            message["status"] += "Check the logs for errors."
-            send_redis_message(user_channel, message)
-            return
+def dispatch_platform_builds(
+    pipeline_id: int,
+    config_id: int,
+    commit_sha: str,
+    platforms: list[str],
+    image_ref: str,
+    dockerfile_name: str,
+    build_date: str,
+    user_channel: str,
+    message: dict,
+    lock_token: str | None = None,
+    push_seq: int | None = None
+):
+    """
+    Starts one build_platform_image job per platform and, once all of them are
+    done, assemble_platform_manifest. Platforms listed in CI_PLATFORM_QUEUES
+    go to their own queue, the rest to the default one. The jobs hold the
+    run's workspace lock (`lock_token`) until the manifest job releases it.
+    """
+    jobs = []
+    for platform in platforms:
+        job = build_platform_image.s(
+            pipeline_id, config_id, commit_sha, platform,
+            image_ref, dockerfile_name, build_date, lock_token, push_seq
+        )
+        if platform in PLATFORM_QUEUES:
+            job = job.set(queue=PLATFORM_QUEUES[platform])
+        jobs.append(job)
+    chord(jobs)(assemble_platform_manifest.s(
+        pipeline_id, image_ref, user_channel, message, config_id, lock_token, push_seq
+    ))
 
-        status_log += "\nSkipped deploy due to security reasons (in Celery task).\n"
-        update_pipeline_status(
+
+@app.task(name="tasks.build_platform_image")
+def build_platform_image(
+    pipeline_id: int,
+    config_id: int,
+    commit_sha: str,
+    platform: str,
+    image_ref: str,
+    dockerfile_name: str,
+    build_date: str,
+    lock_token: str | None = None,
+    push_seq: int | None = None
+) -> dict:
+    """
+    Builds and pushes the image of a single platform from its own checkout,
+    tagged with platform_tag, holding the run's workspace lock. Never raises,
+    so the manifest job always runs.
+    """
+    db_task = SessionLocal()
+    tag = platform_tag(image_ref, platform)
+    checkout_id = f"{pipeline_id}-{platform.replace('/', '-')}"
+    result = {"platform": platform, "tag": tag, "success": False, "seconds": 0.0}
+    started = time.monotonic()
+    ssh_key_path = None
+    actual_repo_url = None
+    workspace_lock = None
+    try:
+        if lock_token and redis_client is not None:
+            workspace_lock = LeaseLock(
+                redis_client, config_lock_name(config_id), pipeline_id, token=lock_token
+            )
+            if not workspace_lock.resume():
+                result["error"] = "Lost the workspace lock to another run of this config."
+                return result
+        if is_superseded(redis_client, config_id, push_seq):
+            raise PipelineSuperseded()
+        config = db_task.get(RepoConfig, config_id)
+        if not config:
+            result["error"] = f"Config ID: {config_id} not found"
+            return result
+        log_forwarder = PipelineLogForwarder(
             db_task,
             pipeline_id,
-            PipelineStatusEnum.SUCCESS,
-            "Pipeline finished successfully."
+            PipelineStatusEnum.RUNNING_DOCKER_BUILD,
+            prefix=f"[{platform}] ",
+            cancel_check=(
+                (lambda: is_superseded(redis_client, config_id, push_seq))
+                if CANCEL_SUPERSEDED_RUNS else None
+            )
         )
-        message["status"] = "Success!"
-        send_redis_message(user_channel, message)
-
-    except Exception as e:
-        tb_str = traceback.format_exc()
-        error_message = (
-            "Unhandled exception in Celery task for PipelineRun" +
-            f"ID={pipeline_id}: {e}\n{tb_str}"
+        actual_repo_url, git_command_env, ssh_key_path, _ = prepare_git_auth(config)
+        git_success_flag, _, repo_dir = handle_git_update(
+            repo_url=actual_repo_url,
+            main_branch=config.main_branch,
+            commit_sha=commit_sha,
+            workspace_dir=WORKSPACE_DIR,
+            run_id=checkout_id,
+            env=git_command_env,
+            on_output=log_forwarder,
+            shallow=config.shallow_checkout,
+            fetch_filter=config.git_fetch_filter
         )
-        print(error_message)
-        status_log += f"\n--- ERROR ---\n{error_message}"
-        if pipeline_id:
-            update_pipeline_status(
-                db_task,
-                pipeline_id,
-                PipelineStatusEnum.UNKNOWN,
-                status_log
-            )
-            message["status"] = "Unknown error has occured. Check logs."
-            send_redis_message(user_channel, message)
-            # save_logs_to_file(pipeline_id, status_log)
+        if not git_success_flag:
+            log_forwarder.flush()
+            result["error"] = "Git checkout failed"
+            return result
+
+        if is_superseded(redis_client, config_id, push_seq):
+            raise PipelineSuperseded()
+        commit_sha_short = subprocess.getoutput(
+            f"git -C {repo_dir} rev-parse --short HEAD"
+        ).strip()
+        success, _ = buildx_build_push(
+            repo_dir,
+            tag,
+            [platform],
+            os.path.join(repo_dir, dockerfile_name),
+            commit_sha_short,
+            build_date,
+            cache_key=f"{config_cache_key(config_id)}-{platform.replace('/', '-')}",
+            on_output=log_forwarder
+        )
+        log_forwarder.flush()
+        result["success"] = success
+        if not success:
+            result["error"] = "docker buildx build failed"
+    except PipelineSuperseded:
+        print(f"Platform build {platform} of run {pipeline_id} superseded")
+        result["superseded"] = True
+        result["error"] = "A newer push was queued for this config."
+    except Exception as e:
+        print(f"Platform build {platform} of run {pipeline_id} failed: {e}")
+        result["error"] = f"{e}\n{traceback.format_exc()}"
     finally:
+        if workspace_lock:
+            workspace_lock.hand_over()
+        if actual_repo_url:
+            try:
+                cleanup_git_checkout(actual_repo_url, WORKSPACE_DIR, checkout_id)
+            except Exception as e:
+                print(f"Failed to remove checkout {checkout_id}: {e}")
         if ssh_key_path and os.path.exists(ssh_key_path):
             os.remove(ssh_key_path)
-            print(f"Removed temporary SSH key: {ssh_key_path}")
-        if pipeline_id:
-            final_run = (
-                db_task.query(PipelineRuns).
-                filter(PipelineRuns.id == pipeline_id).
-                first()
-            )
-            if final_run and final_run.logs:
-                save_logs_to_file(pipeline_id, final_run.logs)
+        result["seconds"] = round(time.monotonic() - started, 1)
+        db_task.close()
+    return result
+
+
+@app.task(name="tasks.assemble_platform_manifest")
+def assemble_platform_manifest(
+    results: list[dict],
+    pipeline_id: int,
+    image_ref: str,
+    user_channel: str,
+    message: dict,
+    config_id: int | None = None,
+    lock_token: str | None = None,
+    push_seq: int | None = None
+):
+    """
+    Merges the single-platform images pushed by build_platform_image into one
+    multi-platform manifest list under `image_ref`, finishes the run and
+    releases its workspace lock.
+    """
+    db_task = SessionLocal()
+    try:
+        logs = "\n--- Platform builds ---\n"
+        for result in results:
+            state = "ok" if result["success"] else "failed"
+            logs += f"{result['platform']:<16} {state:<7} {result['seconds']:>7.1f}s"
+            logs += f"  {result['tag']}\n"
+            if result.get("error"):
+                logs += f"    {result['error']}\n"
+
+        superseded = any(result.get("superseded") for result in results) or (
+            is_superseded(redis_client, config_id, push_seq)
+        )
+        success = not superseded and bool(results) and all(
+            result["success"] for result in results
+        )
+        if success:
+            manifest_success, manifest_log = run_command([
+                "docker", "buildx", "imagetools", "create",
+                "-t", image_ref,
+                *[result["tag"] for result in results]
+            ])
+            logs += "\n--- Manifest Logs ---\n" + manifest_log + "\n"
+            success = manifest_success
+
+        if success:
+            logs += "Skipped deploy due to security reasons.\n"
+            logs += "Pipeline finished successfully."
+            status = PipelineStatusEnum.SUCCESS
+            message["status"] = "Success!"
+        elif superseded:
+            logs += "A newer push was queued for this config, stopped this run."
+            status = PipelineStatusEnum.SUPERSEDED
+            message["status"] = "Superseded by a newer push."
+        else:
+            logs += "Error: Docker build failed.\n"
+            status = PipelineStatusEnum.FAILED_DOCKER_BUILD
+            message["status"] = "Failed during docker build phase. See the logs."
+        update_pipeline_status(db_task, pipeline_id, status, logs)
+        send_redis_message(user_channel, message)
+    except Exception as e:
+        print(f"Assembling manifest for run {pipeline_id} failed: {e}")
+        update_pipeline_status(
+            db_task,
+            pipeline_id,
+            PipelineStatusEnum.UNKNOWN,
+            f"\n--- ERROR ---\n{e}\n{traceback.format_exc()}"
+        )
+    finally:
+        if lock_token and redis_client is not None:
+            LeaseLock(
+                redis_client, config_lock_name(config_id), pipeline_id, token=lock_token
+            ).release()
+        finish_pipeline_run(db_task, pipeline_id)
         db_task.close()
 
 
 @app.task(name="tasks.handle_installation")
 def handle_installation(payload_json: dict, installation_id: int):
     db_task = SessionLocal()
+    created = 0
     try:
         repositories = payload_json.get("repositories", [])
         for repo in repositories:
@@ -854,7 +1652,11 @@ def handle_installation(payload_json: dict, installation_id: int):
                     SSH_for_deploy=False
                 )
                 db_task.add(new_config)
+                created += 1
         db_task.commit()
+        if created:
+            # The webhook processes cached "no config" for these repos.
+            publish_invalidation(redis_client, CONFIG_ROUTES_CACHE)
         print(
             "Celery task: Installation info saved for installation ID ",
             f"{installation_id}"
@@ -869,6 +1671,7 @@ def handle_installation(payload_json: dict, installation_id: int):
 @app.task(name="tasks.handle_repos")
 def handle_repos(payload_json: dict, installation_id: int):
     db_task = SessionLocal()
+    created = 0
     try:
         repos_added = payload_json.get("repositories_added", [])
         for repo in repos_added:
@@ -895,7 +1698,10 @@ def handle_repos(payload_json: dict, installation_id: int):
                     SSH_for_deploy=False
                 )
                 db_task.add(new_config)
+                created += 1
         db_task.commit()
+        if created:
+            publish_invalidation(redis_client, CONFIG_ROUTES_CACHE)
         print(
             "Celery task: Repositories added to installation ID",
             f"{installation_id}"
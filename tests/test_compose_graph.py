@@ -0,0 +1,80 @@
+import pytest
+
+try:
+    from helper.compose_graph import (
+        ComposeError,
+        build_dependencies,
+        interpolate,
+        load_compose_services,
+    )
+except ImportError:
+    import sys
+    import os
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from helper.compose_graph import (
+        ComposeError,
+        build_dependencies,
+        interpolate,
+        load_compose_services,
+    )
+
+COMPOSE = """
+services:
+  api:
+    build: ./api
+    image: ${DOCKER_USERNAME}/api:${IMAGE_TAG:-latest}
+    depends_on:
+      base:
+        condition: service_started
+  worker:
+    build:
+      context: ./api
+    image: $DOCKER_USERNAME/worker
+  base:
+    build: .
+  db:
+    image: postgres
+  web:
+    build: ./web
+    depends_on: [db]
+"""
+
+
+def test_interpolation_supports_defaults_and_escapes():
+    env = {"USER": "me", "EMPTY": ""}
+    assert interpolate("${USER}/$USER:$${TAG}", env) == "me/me:${TAG}"
+    assert interpolate("${EMPTY:-fallback} ${EMPTY-kept}", env) == "fallback "
+    with pytest.raises(ComposeError):
+        interpolate("${MISSING:?needs a value}", env)
+
+
+def test_services_are_parsed_once_with_interpolated_images():
+    services = load_compose_services(COMPOSE, "/repo", {"DOCKER_USERNAME": "me"})
+    assert services["api"].image == "me/api:latest"
+    assert services["api"].build_context == "/repo/api"
+    assert services["api"].depends_on == ["base"]
+    assert services["db"].build_key is None
+
+
+def test_dependencies_follow_depends_on_and_shared_contexts():
+    services = load_compose_services(COMPOSE, "/repo", {"DOCKER_USERNAME": "me"})
+    assert build_dependencies(services) == {
+        "base": set(),
+        "worker": set(),
+        "api": {"base", "worker"},
+        "web": set(),
+    }
+
+
+def test_dependency_cycles_are_rejected():
+    compose = (
+        "services:\n"
+        "  a: {build: ./a, depends_on: [b]}\n"
+        "  b: {build: ./b, depends_on: [a]}\n"
+    )
+    services = load_compose_services(compose, "/repo", {})
+    with pytest.raises(ComposeError):
+        build_dependencies(services)
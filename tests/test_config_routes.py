@@ -0,0 +1,41 @@
+try:
+    from helper.config_routes import ConfigRoute, ConfigRouteTable
+except ImportError:
+    import sys
+    import os
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from helper.config_routes import ConfigRoute, ConfigRouteTable
+
+URL = "https://github.com/owner/repo.git"
+ROUTE = ConfigRoute(1, URL, "main", "user")
+
+
+def test_lookup_caches_routes_and_misses():
+    table = ConfigRouteTable()
+    calls = []
+
+    def loader(clone_url, branch):
+        calls.append((clone_url, branch))
+        return ROUTE if branch == "main" else None
+
+    assert table.lookup(URL, "main", loader) == ROUTE
+    assert table.lookup(URL, "main", loader) == ROUTE
+    assert table.lookup(URL, "dev", loader) is None
+    assert table.lookup(URL, "dev", loader) is None
+    assert calls == [(URL, "main"), (URL, "dev")]
+
+
+def test_invalidate_drops_entries_and_stale_loads():
+    table = ConfigRouteTable()
+    generation = table.generation()
+    table.invalidate()
+    table.put(URL, "main", ROUTE, generation)
+    assert table.get(URL, "main") == (False, None)
+
+    table.put(URL, "main", None, table.generation())
+    assert table.get(URL, "main") == (True, None)
+    table.invalidate()
+    assert table.get(URL, "main") == (False, None)
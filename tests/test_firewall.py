@@ -0,0 +1,34 @@
+import asyncio
+
+try:
+    from helper.firewall import MemoryFirewallStore
+except ImportError:
+    import sys
+    import os
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from helper.firewall import MemoryFirewallStore
+
+
+def test_ip_is_banned_after_max_attempts():
+    store = MemoryFirewallStore(max_attempts=3, window=60, block_seconds=60)
+
+    async def scan():
+        return [await store.record_strike("1.2.3.4") for _ in range(3)]
+
+    assert asyncio.run(scan()) == [False, False, True]
+    assert asyncio.run(store.is_blocked("1.2.3.4"))
+    assert not asyncio.run(store.is_blocked("5.6.7.8"))
+
+
+def test_tracked_ips_are_bounded():
+    store = MemoryFirewallStore(max_attempts=3, window=60, block_seconds=60, max_ips=10)
+
+    async def scan():
+        for i in range(100):
+            await store.record_strike(f"10.0.0.{i}")
+
+    asyncio.run(scan())
+    assert len(store._strikes) == 10
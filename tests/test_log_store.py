@@ -0,0 +1,39 @@
+try:
+    from helper import log_store
+except ImportError:
+    import sys
+    import os
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from helper import log_store
+
+LOG = "".join(f"step {i}: résultat ✓\n" for i in range(500)) + "done"
+
+
+def write(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_store, "LOG_SEGMENT_BYTES", 1000)
+    pieces = [LOG[i:i + 333] for i in range(0, len(LOG), 333)]
+    log_store.write_run_log(7, pieces, base_dir=str(tmp_path))
+    return log_store.load_log_index(7, base_dir=str(tmp_path))
+
+
+def test_archive_round_trips_bytes_and_chars(tmp_path, monkeypatch):
+    index = write(tmp_path, monkeypatch)
+    data = LOG.encode("utf-8")
+
+    assert len(index.segments) > 5
+    assert (index.size, index.chars, index.lines) == (len(data), len(LOG), 501)
+    assert b"".join(log_store.iter_bytes(index)) == data
+    assert b"".join(log_store.iter_bytes(index, 995, 2345)) == data[995:2345]
+    assert "".join(log_store.iter_chars(index, 1200, 900)) == LOG[1200:2100]
+    assert log_store.load_log_index(8, base_dir=str(tmp_path)) is None
+
+
+def test_tail_returns_last_lines(tmp_path, monkeypatch):
+    index = write(tmp_path, monkeypatch)
+
+    tail = b"".join(log_store.iter_tail(index, 3)).decode("utf-8")
+    assert tail == "step 498: résultat ✓\nstep 499: résultat ✓\ndone"
+    assert b"".join(log_store.iter_tail(index, 10_000)) == LOG.encode("utf-8")
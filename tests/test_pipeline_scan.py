@@ -0,0 +1,40 @@
+import os
+import subprocess
+
+try:
+    from helper.pipeline_scan import discover_pipeline_file
+except ImportError:
+    import sys
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from helper.pipeline_scan import discover_pipeline_file
+
+
+def _git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=ci", "-c", "user.email=ci@example.com", *args],
+        cwd=repo, check=True, capture_output=True
+    )
+
+
+def test_symlinked_pipeline_file_has_no_cacheable_blob(tmp_path):
+    repo = str(tmp_path)
+    _git(repo, "init", "-q")
+    with open(os.path.join(repo, "Dockerfile.real"), "w") as f:
+        f.write("FROM alpine\n")
+    with open(os.path.join(repo, "Dockerfile.dev"), "w") as f:
+        f.write("FROM alpine\n")
+    os.symlink("Dockerfile.real", os.path.join(repo, "Dockerfile"))
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "init")
+
+    path, file_type, blob_sha = discover_pipeline_file(repo)
+    assert os.path.basename(path) == "Dockerfile" and file_type == "dockerfile"
+    assert blob_sha is None
+
+    os.remove(os.path.join(repo, "Dockerfile"))
+    _git(repo, "commit", "-q", "-am", "drop link")
+    path, _, blob_sha = discover_pipeline_file(repo)
+    assert os.path.basename(path) == "Dockerfile.dev" and len(blob_sha) == 40
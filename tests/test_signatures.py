@@ -0,0 +1,41 @@
+import os
+import time
+
+try:
+    from helper.signatures import SignatureMatcher, compile_signatures
+except ImportError:
+    import sys
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from helper.signatures import SignatureMatcher, compile_signatures
+
+
+def test_compiled_signatures_match_substrings():
+    pattern = compile_signatures(["wp-admin", "wp-login.php", ".env", "think\\app"])
+
+    assert pattern.search("/blog/wp-admin/setup")
+    assert pattern.search("/wp-login.php")
+    assert pattern.search("/app/.env.backup")
+    assert pattern.search("/index/think\\app/invokefunction")
+    assert not pattern.search("/wp-content/logo.png")
+    assert not compile_signatures([]).search("anything")
+
+
+def test_matcher_reloads_changed_file(tmp_path):
+    signatures_file = tmp_path / "signatures.txt"
+    signatures_file.write_text("path:/secret\nagent:evilbot\n")
+    matcher = SignatureMatcher(str(signatures_file), check_seconds=0)
+
+    assert matcher.match_path("/secret/x")
+    assert matcher.match_agent("EvilBot/1.0")
+    assert not matcher.match_agent("curl/8.0")
+
+    signatures_file.write_text("agent:curl\n")
+    mtime = time.time() + 10
+    os.utime(signatures_file, (mtime, mtime))
+
+    assert not matcher.match_path("/secret/x")
+    assert not matcher.match_agent("EvilBot/1.0")
+    assert matcher.match_agent("curl/8.0")
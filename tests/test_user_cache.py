@@ -0,0 +1,40 @@
+import time
+
+try:
+    from auth.user_cache import TokenUserCache, UserSnapshot
+except ImportError:
+    import sys
+    import os
+    sys.path.insert(
+        0, os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), '..')))
+    from auth.user_cache import TokenUserCache, UserSnapshot
+
+ALICE = UserSnapshot(id=1, username="alice", email="alice@example.com")
+BOB = UserSnapshot(id=2, username="bob", email="bob@example.com")
+
+
+def test_entries_never_outlive_the_token():
+    cache = TokenUserCache(max_entries=10, ttl=60)
+    cache.put("fresh", ALICE, time.time() + 3600)
+    cache.put("expired", ALICE, time.time() - 1)
+    cache.put("no-exp", BOB, None)
+
+    assert cache.get("fresh") == ALICE
+    assert cache.get("expired") is None
+    assert cache.get("no-exp") == BOB
+
+
+def test_invalidate_drops_only_that_users_tokens():
+    cache = TokenUserCache(max_entries=10, ttl=60)
+    cache.put("a1", ALICE, None)
+    cache.put("a2", ALICE, None)
+    cache.put("b1", BOB, None)
+
+    cache.invalidate("alice")
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b1") == BOB
+
+    cache.invalidate()
+    assert cache.get("b1") is None
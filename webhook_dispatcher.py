@@ -0,0 +1,270 @@
+"""
+Turns GitHub webhook deliveries into Celery tasks.
+
+The webhook server calls dispatch_event directly, or with CI_WEBHOOK_INBOX
+only stores the delivery in the inbox stream; this module then runs as its
+own process and drains the stream:
+
+    python webhook_dispatcher.py                      # consume the inbox
+    python webhook_dispatcher.py --replay --start 1718000000000
+    python webhook_dispatcher.py --replay --delivery <X-GitHub-Delivery>
+    python webhook_dispatcher.py --replay --dead-letter
+
+Replaying is safe for pushes that already got a run, since deliveries are
+deduplicated by their X-GitHub-Delivery id.
+"""
+import argparse
+import json
+import os
+import socket
+
+import redis
+from dotenv import load_dotenv
+
+from db import SessionLocal
+from models.repo_model import RepoConfig
+from helper.cache_bus import CacheInvalidationListener
+from helper.config_routes import CONFIG_ROUTES_CACHE, ConfigRoute, config_routes
+from helper.delivery_guard import claim_delivery, release_delivery
+from helper import webhook_inbox
+from helper.webhook_inbox import InboxEntry
+
+from tasks import (
+    process_push,
+    handle_installation,
+    handle_repos,
+    redis_client
+)
+
+load_dotenv()
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis://localhost:6379/0")
+# Entries are claimed back from dead consumers every this many batches.
+CLAIM_EVERY_BATCHES = 10
+
+
+def load_config_route(clone_url: str, branch: str) -> ConfigRoute | None:
+    db = SessionLocal()
+    try:
+        # Only the columns of ux_configs_repo_url_main_branch, so Postgres
+        # answers the lookup with an index-only scan.
+        config = db.query(
+            RepoConfig.id,
+            RepoConfig.repo_url,
+            RepoConfig.main_branch,
+            RepoConfig.docker_username
+        ).filter(
+            RepoConfig.repo_url == clone_url,
+            RepoConfig.main_branch == branch
+        ).first()
+        if not config:
+            return None
+        return ConfigRoute(
+            config_id=config.id,
+            repo_url=str(config.repo_url),
+            main_branch=config.main_branch,
+            docker_username=config.docker_username
+        )
+    finally:
+        db.close()
+
+
+def enqueue_push(
+    route: ConfigRoute,
+    commit_sha: str,
+    github_delivery_id: str,
+    initial_log_message: str
+) -> tuple[bool, int | None]:
+    """
+    Queues process_push unless the delivery was already queued.
+    Returns (queued, pipeline id of the earlier run for a duplicate).
+    """
+    claimed, pipeline_id = claim_delivery(redis_client, github_delivery_id)
+    if not claimed:
+        return False, pipeline_id
+    try:
+        process_push.delay(
+            config_id=route.config_id,
+            commit_sha=commit_sha,
+            github_delivery_id=github_delivery_id,
+            initial_logs=initial_log_message,
+            repo_url=route.repo_url,
+            main_branch=route.main_branch,
+            docker_username=route.docker_username
+        )
+    except Exception:
+        release_delivery(redis_client, github_delivery_id)
+        raise
+    return True, None
+
+
+def dispatch_event(
+    event_type: str | None,
+    delivery_id: str | None,
+    payload_json: dict
+) -> tuple[int, dict]:
+    """
+    Queues the task for one verified delivery. Blocking. Returns the HTTP
+    status and body to answer with; a 4xx status means the delivery can never
+    be dispatched. Errors of the database or broker are raised.
+    """
+    if event_type == "push":
+        pushed_ref = payload_json.get("ref")
+        commit_sha = payload_json.get("after")
+        repo_cloned_url = payload_json.get("repository", {}).get("clone_url")
+        pushed_branch = pushed_ref.split("refs/heads/", 1)[1]
+
+        route = config_routes.lookup(repo_cloned_url, pushed_branch, load_config_route)
+        if not route:
+            return 400, {"detail": "Config doesn't exist in database"}
+
+        expected_ref = f"refs/heads/{route.main_branch}"
+        if pushed_ref != expected_ref or repo_cloned_url != route.repo_url:
+            return 200, {"status": "Ignored, push does not match config"}
+
+        print(f"Detected push on {route.main_branch} {route.repo_url}.")
+        initial_log_message = (
+            f"Webhook received for config ID {route.config_id}. "
+            f"Queuing pipeline for commit {commit_sha[:7]}..."
+        )
+        print(initial_log_message)
+
+        queued, pipeline_id = enqueue_push(
+            route, commit_sha, delivery_id, initial_log_message
+        )
+        if not queued:
+            print(f"Delivery {delivery_id} was already processed.")
+            return 200, {
+                "message": "Duplicate delivery, pipeline already queued.",
+                "pipeline_id": pipeline_id
+            }
+        return 200, {"message": "Webhook processed. Pipeline task queued successfully."}
+
+    elif event_type == "installation":
+        installation_id = payload_json["installation"]["id"]
+        handle_installation.delay(payload_json, installation_id)
+        return 200, {"status": "Installation event queued for processing"}
+
+    elif event_type == "installation_repositories":
+        installation_id = payload_json["installation"]["id"]
+        handle_repos.delay(payload_json, installation_id)
+        return 200, {"status": "Installation repositories event queued for processing"}
+
+    return 200, {"message": f"Ignored event: {event_type}"}
+
+
+def dispatch_entry(entry: InboxEntry) -> tuple[bool, str]:
+    """
+    Dispatches one inbox entry. Returns (done, message); not done means it
+    failed for a reason that may pass, and should be tried again.
+    """
+    entry_id, fields = entry
+    try:
+        payload_json = json.loads(fields.get("payload", ""))
+    except json.JSONDecodeError:
+        return True, f"Entry {entry_id}: json cannot be parsed, dropped"
+    try:
+        status_code, body = dispatch_event(
+            fields.get("event") or None, fields.get("delivery") or None, payload_json
+        )
+    except (KeyError, IndexError, AttributeError, TypeError) as e:
+        return True, f"Entry {entry_id}: malformed payload ({e!r}), dropped"
+    except Exception as e:
+        return False, f"Entry {entry_id}: error dispatching: {e}"
+    return True, f"Entry {entry_id}: {status_code} {body}"
+
+
+def process_batch(stream_client, entries: list[InboxEntry]) -> int:
+    """
+    Dispatches a batch and acknowledges what is done with one XACK. Entries
+    that failed stay pending until claimed again, or go to the dead-letter
+    stream after INBOX_MAX_DELIVERIES attempts. Returns the acknowledged count.
+    """
+    done_ids, failed = [], []
+    for entry in entries:
+        done, message = dispatch_entry(entry)
+        print(message)
+        if done:
+            done_ids.append(entry[0])
+        else:
+            failed.append((entry, message))
+
+    webhook_inbox.acknowledge(stream_client, done_ids)
+    if failed:
+        counts = webhook_inbox.delivery_counts(
+            stream_client, [entry[0] for entry, _ in failed]
+        )
+        for entry, message in failed:
+            if counts.get(entry[0], 0) >= webhook_inbox.INBOX_MAX_DELIVERIES:
+                print(f"Entry {entry[0]} moved to the dead-letter stream")
+                webhook_inbox.dead_letter(stream_client, entry, message)
+    return len(done_ids)
+
+
+def run_dispatcher(stream_client, consumer: str):
+    webhook_inbox.ensure_group(stream_client)
+    print(f"Dispatcher {consumer} reading {webhook_inbox.INBOX_STREAM}")
+    batches = 0
+    while True:
+        if batches % CLAIM_EVERY_BATCHES == 0:
+            for stale in webhook_inbox.claim_stale(stream_client, consumer):
+                print(f"Claimed {len(stale)} stale inbox entries")
+                process_batch(stream_client, stale)
+        entries = webhook_inbox.read_batch(stream_client, consumer)
+        batches += 1
+        if entries:
+            process_batch(stream_client, entries)
+
+
+def replay(
+    stream_client,
+    start: str = "-",
+    end: str = "+",
+    delivery_id: str | None = None,
+    dead_letter: bool = False
+) -> int:
+    """Dispatches stored deliveries again, oldest first. Returns the count."""
+    stream = (
+        webhook_inbox.DEAD_LETTER_STREAM if dead_letter else webhook_inbox.INBOX_STREAM
+    )
+    replayed = 0
+    for batch in webhook_inbox.iter_range(stream_client, start, end, stream=stream):
+        for entry in batch:
+            if delivery_id and entry[1].get("delivery") != delivery_id:
+                continue
+            done, message = dispatch_entry(entry)
+            print(f"Replay {message}")
+            replayed += 1
+    return replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispatch webhooks from the inbox.")
+    parser.add_argument("--consumer", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--replay", action="store_true",
+                        help="dispatch stored deliveries again and exit")
+    parser.add_argument("--start", default="-", help="first entry id or ms timestamp")
+    parser.add_argument("--end", default="+", help="last entry id or ms timestamp")
+    parser.add_argument("--delivery", help="only replay this X-GitHub-Delivery")
+    parser.add_argument("--dead-letter", action="store_true",
+                        help="replay the dead-letter stream")
+    args = parser.parse_args()
+
+    stream_client = redis.from_url(REDIS_HOST, decode_responses=True)
+    cache_listener = CacheInvalidationListener(stream_client)
+    cache_listener.register(CONFIG_ROUTES_CACHE, config_routes.invalidate)
+    cache_listener.start()
+    try:
+        if args.replay:
+            count = replay(
+                stream_client, args.start, args.end, args.delivery, args.dead_letter
+            )
+            print(f"Replayed {count} deliveries")
+        else:
+            run_dispatcher(stream_client, args.consumer)
+    finally:
+        cache_listener.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,19 @@ import hmac
 import hashlib
 from dotenv import load_dotenv
 from cryptography.fernet import Fernet
-import time
 import logging
+from contextlib import asynccontextmanager
+
+import redis
 
 from fastapi import (
     FastAPI,
     HTTPException,
     Request,
     status,
-    Depends,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import JSONResponse
 
 from api.api_users import router as user_router
@@ -22,36 +24,46 @@ from api.api_main import router as main_router
 from api.api_config import router as config_router
 from api.api_pipeline import router as pipeline_router
 from api.api_docker import router as docker_router
+from api.api_metrics import router as metrics_router
 from notifications.websocket import router as websocket_router
 
-from api.api_users import get_db
-from models.repo_model import RepoConfig
+from auth.user_cache import AUTH_USERS_CACHE, token_users
+
+from helper.cache_bus import CacheInvalidationListener
+from helper.config_routes import CONFIG_ROUTES_CACHE, config_routes
+from helper.firewall import create_firewall_store
+from helper.signatures import SignatureMatcher
+from helper.webhook_inbox import WEBHOOK_INBOX, append_delivery
 
 import uvicorn
 
-from tasks import (
-    process_push,
-    handle_installation,
-    handle_repos
-)
+from tasks import redis_client
+from webhook_dispatcher import dispatch_event
 
 load_dotenv()
 
-webhook_app = FastAPI(version="0.4.0")
+cache_listener = CacheInvalidationListener(
+    redis.from_url(
+        os.getenv("REDIS_HOST", "redis://localhost:6379/0"),
+        decode_responses=True
+    )
+)
+cache_listener.register(CONFIG_ROUTES_CACHE, config_routes.invalidate)
+cache_listener.register(AUTH_USERS_CACHE, token_users.invalidate)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cache_listener.start()
+    yield
+    cache_listener.stop()
+
 
-ip_attempts = {}
-blacklist = {}
+webhook_app = FastAPI(version="0.4.0", lifespan=lifespan)
 
-MAX_ATTEMPTS = 5
-BLOCKTIME_SECONDS = 7200  # 2 sata
-WINDOW = 60
-bad_keywords = [
-    "eval", "phpunit", "call_user_func", "think\\app", "base64",
-    ".env", ".git", "index.php", "pearcmd", "containers/json",
-    "owa", "geoserver", "logon.aspx"
-]
+firewall_store = create_firewall_store()
 
-bad_agents = ["python-requests", "curl", "wget", "nmap", "masscan"]
+signatures = SignatureMatcher()
 
 
 webhook_app.include_router(user_router, prefix="/auth", tags=["Auth"])
@@ -60,6 +72,7 @@ webhook_app.include_router(docker_router, tags=["Docker"])
 webhook_app.include_router(pipeline_router, tags=["Pipeline"])
 webhook_app.include_router(config_router, tags=["RepoConfig", "Config"])
 webhook_app.include_router(websocket_router, prefix="/ws", tags=["ws"])
+webhook_app.include_router(metrics_router, tags=["Metrics"])
 
 ORIGINS = os.getenv("ORIGINS")
 
@@ -70,6 +83,7 @@ webhook_app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Log-Offset", "X-Log-Next-Offset", "X-Log-Size"],
 )
 
 WORKSPACE_DIR = "ci_workspace"
@@ -95,27 +109,18 @@ async def firewall_middleware(request: Request, call_next):
     path = request.url.path.lower()
     agent = request.headers.get("user-agent", "").lower()
 
-    if ip in blacklist and time.time() - blacklist[ip] < BLOCKTIME_SECONDS:
+    if await firewall_store.is_blocked(ip):
         return JSONResponse(
             status_code=403,
             content={"detail": "Access denied (blacklisted IP)"}
         )
 
-    is_malicious = (
-        any(bad in path for bad in bad_keywords) or
-        any(bot in agent for bot in bad_agents)
-    )
-
-    now = time.time()
-    ip_attempts.setdefault(ip, [])
-    ip_attempts[ip] = [ts for ts in ip_attempts[ip] if now - ts < WINDOW]
+    is_malicious = signatures.match_path(path) or signatures.match_agent(agent)
 
     if is_malicious:
         logging.info(f"Suspicious request from {ip} | Path: {path} | Agent: {agent}")
-        ip_attempts[ip].append(now)
 
-        if len(ip_attempts[ip]) >= MAX_ATTEMPTS:
-            blacklist[ip] = now
+        if await firewall_store.record_strike(ip):
             print(f"[FIREWALL] Blocked IP: {ip}")
             return JSONResponse(
                 status_code=403,
@@ -126,7 +131,7 @@ async def firewall_middleware(request: Request, call_next):
 
 
 @webhook_app.post("/webhook")
-async def receive_webhook(request: Request, db=Depends(get_db)):
+async def receive_webhook(request: Request):
     print("Received Webhook")
     if not GITHUB_APP_WEBHOOK_SECRET:
         print("Webhook secret not defined")
@@ -145,8 +150,6 @@ async def receive_webhook(request: Request, db=Depends(get_db)):
 
     try:
         payload_bytes = await request.body()
-        payload_string = payload_bytes.decode("utf-8")
-        payload_json = json.loads(payload_string)
 
         expected_signature = hmac.new(
             GITHUB_APP_WEBHOOK_SECRET.encode(),
@@ -157,64 +160,39 @@ async def receive_webhook(request: Request, db=Depends(get_db)):
         if not hmac.compare_digest(signature, expected_signature):
             raise HTTPException(status_code=403, detail="Invalid signature")
 
-        print("Received payload:")
         event_type = request.headers.get("X-GitHub-Event")
-        if event_type == "push":
-            pushed_ref = payload_json.get("ref")
-            commit_sha = payload_json.get("after")
-            github_delivery_id = request.headers.get("X-GitHub-Delivery")
-            repo_cloned_url = payload_json.get("repository", {}).get("clone_url")
-            pushed_branch = pushed_ref.split("refs/heads/", 1)[1]
-
-            config: RepoConfig | None = db.query(RepoConfig).filter(
-                RepoConfig.repo_url == repo_cloned_url,
-                RepoConfig.main_branch == pushed_branch
-            ).first()
-
-            if not config:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Config doesn't exist in database"
+        github_delivery_id = request.headers.get("X-GitHub-Delivery")
+
+        if WEBHOOK_INBOX and redis_client is not None:
+            try:
+                entry_id = await run_in_threadpool(
+                    append_delivery,
+                    redis_client,
+                    event_type,
+                    github_delivery_id,
+                    payload_bytes
+                )
+                return JSONResponse(
+                    status_code=status.HTTP_202_ACCEPTED,
+                    content={"status": "Webhook accepted", "inbox_id": entry_id}
                 )
+            except UnicodeDecodeError:
+                raise
+            except Exception as e:
+                print(f"Error storing webhook in the inbox, dispatching inline: {e}")
 
-            expected_ref = f"refs/heads/{config.main_branch}"
-            config_repo_url = str(config.repo_url)
+        payload_json = json.loads(payload_bytes.decode("utf-8"))
+        print("Received payload:")
+        status_code, body = await run_in_threadpool(
+            dispatch_event, event_type, github_delivery_id, payload_json
+        )
+        if status_code >= 400:
+            raise HTTPException(status_code=status_code, detail=body["detail"])
+        return body
 
-            if pushed_ref == expected_ref and repo_cloned_url == config_repo_url:
-                print(f"Detected push on {config.main_branch} {config.repo_url}.")
-                initial_log_message = (
-                    f"Webhook received for config ID {config.id}. "
-                    f"Queuing pipeline for commit {commit_sha[:7]}..."
-                )
-                print(initial_log_message)
-
-                process_push.delay(
-                    config_id=config.id,
-                    commit_sha=commit_sha,
-                    github_delivery_id=github_delivery_id,
-                    initial_logs=initial_log_message,
-                    repo_url=str(config.repo_url),
-                    main_branch=config.main_branch,
-                    docker_username=config.docker_username
-                )
-                return {
-                    "message": "Webhook processed. Pipeline task queued successfully."
-                }
-            else:
-                return {"status": "Ignored, push does not match config"}
-        elif event_type == "installation":
-            installation_id = payload_json["installation"]["id"]
-            handle_installation.delay(payload_json, installation_id)
-            return {"status": "Installation event queued for processing"}
-
-        elif event_type == "installation_repositories":
-            installation_id = payload_json["installation"]["id"]
-            handle_repos.delay(payload_json, installation_id)
-            return {"status": "Installation repositories event queued for processing"}
-        else:
-            return {"message": f"Ignored event: {event_type}"}
-
-    except json.JSONDecodeError:
+    except HTTPException:
+        raise
+    except (json.JSONDecodeError, UnicodeDecodeError):
         print("Error, json cannot be parsed!")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,